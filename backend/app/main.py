@@ -1,28 +1,84 @@
-from fastapi import FastAPI, HTTPException, Header
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+import asyncio
+import json
 import time
 import secrets
-from .services.db_service import DatabaseService
+from .models import AdminContext, CrossPostRequest
+from .services.env import load_local_env
+from .services.storage import create_storage
+from .services.token_store import TokenStore
+from .services.session_service import SessionService, DEFAULT_ADMIN_ID
+from .services.status_notifier import StatusNotifier
+from .services.telegram_webhook import DEFAULT_NOTIFY_ADDRESS, TelegramWebhook
+from .services.access_log import AccessLogMiddleware, setup_access_log, DEFAULT_SAMPLE_RATE, DEFAULT_MAX_BODY_BYTES
+from .services.metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware
 import logging
 import os
 
-# Create log directory if it doesn't exist
-os.makedirs('logs/backend', exist_ok=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/backend/server.log', mode='a'),
-        logging.StreamHandler()
-    ]
-)
+# Сервис AI (и пакет openai) импортируется при первом использовании:
+# импорт модуля не должен тянуть клиентов, которые нужны не каждому маршруту
+if TYPE_CHECKING:
+    from .services.ai_service import AIService
+
+# Переменные из .env нужны до чтения DATABASE_URL и остальных настроек
+load_local_env()
+
 logger = logging.getLogger('backend')
 
-app = FastAPI(title="AI Cross-Post API")
+def configure_logging() -> None:
+    """Настройка логирования процесса API (выполняется при старте приложения)"""
+    # Create log directory if it doesn't exist
+    os.makedirs('logs/backend', exist_ok=True)
+
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('logs/backend/server.log', mode='a'),
+            logging.StreamHandler()
+        ]
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка сервисов приложения.
+
+    Импорт модуля только создает объекты без ввода-вывода: логи,
+    проверка схемы БД и фоновые задачи запускаются здесь.
+    """
+    global telegram_webhook
+    configure_logging()
+    # Access-лог в JSON пишется в отдельном потоке, с ротацией файла
+    access_log_listener = setup_access_log('logs/backend/access.log')
+    await db.start()
+    token_store.start()
+
+    webhook_url = os.getenv("TELEGRAM_WEBHOOK_URL")
+    if webhook_url:
+        # Webhook регистрирует процесс бота, API только принимает обновления
+        telegram_webhook = TelegramWebhook(
+            token=os.getenv("TELEGRAM_BOT_TOKEN"),
+            secret=os.getenv("TELEGRAM_WEBHOOK_SECRET"),
+            notify_address=os.getenv("TELEGRAM_WEBHOOK_NOTIFY_ADDRESS", DEFAULT_NOTIFY_ADDRESS),
+        )
+        await telegram_webhook.start()
+    try:
+        yield
+    finally:
+        await token_store.stop()
+        if telegram_webhook:
+            await telegram_webhook.stop()
+            telegram_webhook = None
+        await db.close()
+        access_log_listener.stop()
+
+app = FastAPI(title="AI Cross-Post API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -35,8 +91,55 @@ app.add_middleware(
     max_age=3600,
 )
 
-# Инициализация сервиса базы данных
-db = DatabaseService()
+# Гистограммы длительности запросов по маршрутам для /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Логирование запросов (подключается последним, чтобы учитывать время всех middleware)
+app.add_middleware(
+    AccessLogMiddleware,
+    sample_rate=float(os.getenv("ACCESS_LOG_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)),
+    max_body_bytes=int(os.getenv("ACCESS_LOG_MAX_BODY_BYTES", DEFAULT_MAX_BODY_BYTES)),
+)
+
+# Хранилище по DATABASE_URL: файл SQLite, общий с ботом (запросы вне event loop).
+# Соединения и схема готовятся в lifespan (db.start())
+db = create_storage()
+token_store = TokenStore(db)
+# Зависимость защищенных маршрутов: токен запроса -> AdminContext
+sessions = SessionService(db, token_store)
+# Уведомления открытых потоков статуса об изменении привязок
+status_notifier = StatusNotifier()
+# Интервал, с которым поток статуса перечитывает состояние без уведомлений
+# (изменения из других процессов) и отправляет keep-alive
+STATUS_STREAM_HEARTBEAT = 15
+
+def bindings_changed(admin_id: int) -> None:
+    """Сброс кэша сессий и уведомление потоков статуса админа"""
+    sessions.invalidate()
+    status_notifier.publish(admin_id)
+
+def setup_status(session: AdminContext) -> dict:
+    """Состояние шагов настройки Telegram для потока статуса"""
+    return {
+        "connected": session.telegram_user_id is not None,
+        "telegram_user_id": session.telegram_user_id,
+        "hasChannel": session.has_channel,
+    }
+
+# Прием обновлений бота через webhook (если задан TELEGRAM_WEBHOOK_URL)
+telegram_webhook: Optional[TelegramWebhook] = None
+
+# Сервис AI создается при первом обращении: без OPENAI_API_KEY клиент
+# OpenAI не инициализируется, а остальные эндпоинты должны работать
+ai_service: Optional["AIService"] = None
+
+def get_ai_service() -> "AIService":
+    global ai_service
+    if ai_service is None:
+        from .services.ai_service import AIService
+        from .services.transform_cache import TransformCache
+        ai_service = AIService(cache=TransformCache(db))
+    return ai_service
 
 class TelegramVerification(BaseModel):
     token: str
@@ -54,14 +157,34 @@ class ChannelLink(BaseModel):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Метрики процесса API в текстовом формате Prometheus"""
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.post("/api/telegram/webhook")
+async def telegram_webhook_update(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+):
+    """Прием обновления от Telegram Bot API"""
+    if telegram_webhook is None:
+        raise HTTPException(status_code=404, detail="Webhook mode is disabled")
+    if not telegram_webhook.check_secret(x_telegram_bot_api_secret_token):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+
+    # Обновление обработает процесс бота, Telegram получает ответ сразу
+    await telegram_webhook.enqueue(await request.json())
+    return {"ok": True}
+
 @app.get("/api/telegram/setup")
 async def setup_telegram():
     """Генерирует токен и возвращает URL для настройки бота, или возвращает существующее подключение"""
     logger.info("Checking existing connection...")
     
     # Сначала проверяем существующую привязку
-    admin_id = 666  # В будущем здесь будет реальный admin_id
-    telegram_user = db.get_telegram_user_by_admin(admin_id)
+    admin_id = DEFAULT_ADMIN_ID  # В будущем здесь будет реальный admin_id
+    telegram_user = await db.get_telegram_user_by_admin(admin_id)
     
     if telegram_user:
         logger.info(f"Found existing connection for admin_id {admin_id}")
@@ -73,10 +196,10 @@ async def setup_telegram():
     # Если привязки нет, генерируем новый токен
     logger.info("No existing connection, generating new token...")
     token = secrets.token_urlsafe(16)
-    logger.info(f"Generated token: {token}")
+    logger.info(f"Generated token: {token[:8]}...")
     
     # Сохраняем токен с временем создания и admin_id
-    db.save_token(token, admin_id=666)
+    await token_store.issue(token, admin_id=admin_id)
     bot_url = f"https://t.me/feedsAIbot?start={token}"
     
     response_data = {
@@ -84,106 +207,93 @@ async def setup_telegram():
         "token": token,
         "bot_url": bot_url
     }
-    logger.info(f"Returning response: {response_data}")
+    logger.info(f"Returning setup URL for token: {token[:8]}...")
     return response_data
 
 @app.post("/api/telegram/verify")
 async def verify_telegram(data: TelegramVerification):
     """Проверяет токен и привязывает Telegram аккаунт"""
-    # Очищаем просроченные токены
-    db.cleanup_expired_tokens()
-    
-    # Получаем данные токена
-    token_data = db.get_token_data(data.token)
+    # Гасим токен одним запросом: повторно его использовать нельзя
+    token_data = await token_store.consume(data.token)
     if not token_data:
         raise HTTPException(status_code=400, detail="Invalid token")
         
     timestamp, admin_id = token_data
     
     # Проверяем не истек ли токен (10 минут)
-    if time.time() - timestamp > 600:
-        db.delete_token(data.token)
+    if token_store.is_expired(timestamp):
         raise HTTPException(status_code=400, detail="Token expired")
     
     # Привязываем telegram_user_id к admin_id
-    db.save_telegram_binding(data.telegram_user_id, admin_id)
-    
-    # Удаляем использованный токен
-    db.delete_token(data.token)
+    await db.save_telegram_binding(data.telegram_user_id, admin_id)
+    bindings_changed(admin_id)
     
     return {"status": "success"} 
 
-@app.middleware("http")
-async def log_requests(request, call_next):
-    # Log request
-    request_body = await request.body()
-    logger.info(f"""
-=== Incoming Request ===
-Method: {request.method}
-URL: {request.url}
-Headers: {dict(request.headers)}
-Origin: {request.headers.get('origin')}
-Body: {request_body.decode() if request_body else 'No body'}
-======================""")
-
-    response = await call_next(request)
-    
-    # Log response
-    logger.info(f"""
-=== Outgoing Response ===
-Status: {response.status_code}
-Headers: {dict(response.headers)}
-======================""")
-    return response
-
 @app.get("/api/telegram/check-connection")
-async def check_telegram_connection(authorization: str = Header(None)):
+async def check_telegram_connection(session: AdminContext = Depends(sessions)):
     """Проверяет статус подключения Telegram"""
-    logger.info("Checking Telegram connection...")
-    
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="No token provided")
-    
-    token = authorization.split(' ')[1]
-    logger.info(f"Checking connection for token: {token}")
+    logger.info(f"Checking Telegram connection for admin_id {session.admin_id}...")
     
     # Сначала проверяем временный токен
-    token_data = db.get_token_data(token)
-    if token_data:
-        timestamp, admin_id = token_data
-        if time.time() - timestamp > 600:
-            db.delete_token(token)
+    if session.token_timestamp is not None:
+        if token_store.is_expired(session.token_timestamp):
+            # Просроченный токен удалит фоновая очистка
             return {"connected": False}
         return {"connected": True}
     
     # Если временного токена нет, проверяем постоянную привязку
-    admin_id = 666  # В будущем здесь будет реальный admin_id
-    telegram_user = db.get_telegram_user_by_admin(admin_id)
-    if telegram_user:
-        return {"connected": True, "telegram_user_id": telegram_user}
+    if session.telegram_user_id:
+        return {"connected": True, "telegram_user_id": session.telegram_user_id}
     
     return {"connected": False}
 
+@app.get("/api/telegram/status/stream")
+async def stream_telegram_status(request: Request, token: Optional[str] = None):
+    """Поток статуса подключения (Server-Sent Events).
+
+    Сразу отправляет событие status с текущим состоянием, а затем новое
+    событие при каждом его изменении. Токен передается параметром token:
+    EventSource не отправляет заголовок Authorization.
+    """
+    session = await sessions.resolve(token)
+    admin_id = session.admin_id
+
+    async def events():
+        version = status_notifier.version(admin_id)
+        status = setup_status(session)
+        yield f"event: status\ndata: {json.dumps(status)}\n\n"
+        try:
+            while not await request.is_disconnected():
+                new_version = await status_notifier.wait(admin_id, version, STATUS_STREAM_HEARTBEAT)
+                current = setup_status(await sessions.resolve(token))
+                if current != status:
+                    status = current
+                    yield f"event: status\ndata: {json.dumps(status)}\n\n"
+                elif new_version == version:
+                    yield ": keep-alive\n\n"
+                version = new_version
+        except asyncio.CancelledError:
+            logger.info(f"Status stream closed for admin_id {admin_id}")
+            raise
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/telegram/disconnect")
-async def disconnect_telegram(authorization: str = Header(None)):
+async def disconnect_telegram(session: AdminContext = Depends(sessions)):
     """Отвязывает Telegram аккаунт"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="No token provided")
-    
-    admin_id = 666  # В будущем здесь будет реальный admin_id
-    db.remove_telegram_binding(admin_id)
+    await db.remove_telegram_binding(session.admin_id)
+    bindings_changed(session.admin_id)
     return {"status": "success"}
 
 @app.get("/api/telegram/check-permissions")
-async def check_telegram_permissions(authorization: str = Header(None)):
+async def check_telegram_permissions(session: AdminContext = Depends(sessions)):
     """Проверяет права бота в канале"""
-    logger.info("Checking Telegram permissions...")
-    
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="No token provided")
-    
-    token = authorization.split(' ')[1]
-    logger.info(f"Checking permissions for token: {token}")
+    logger.info(f"Checking Telegram permissions for admin_id {session.admin_id}...")
     
     # Здесь будет реальная проверка прав бота в канале
     # Пока возвращам заглушку
@@ -196,59 +306,71 @@ async def link_channel(data: ChannelLink):
     
     # Получаем admin_id по telegram_user_id
     logger.info(f"Getting admin_id for telegram_user_id: {data.telegram_user_id}")
-    admin_id = db.get_admin_id_by_telegram(data.telegram_user_id)
+    admin_id = await db.get_admin_id_by_telegram(data.telegram_user_id)
     if not admin_id:
         logger.error(f"Admin_id not found for telegram_user_id: {data.telegram_user_id}")
         raise HTTPException(status_code=400, detail="User not found")
     
     # Сохраняем привязку канала
     logger.info(f"Saving channel binding for admin_id: {admin_id}")
-    db.save_channel_binding(
+    await db.save_channel_binding(
         admin_id=admin_id,
         channel_id=data.channel_id,
         channel_title=data.channel_title
     )
+    bindings_changed(admin_id)
     
     return {"status": "success"}
 
 @app.get("/api/telegram/check-channel")
-async def check_telegram_channel(authorization: str = Header(None)):
+async def check_telegram_channel(session: AdminContext = Depends(sessions)):
     """Проверяет привязан ли канал к пользователю"""
-    logger.info("Checking if channel is linked...")
-    
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="No token provided")
-    
-    admin_id = 666  # В будущем здесь будет реальный admin_id
-    
-    # Проверяем наличие канала у админа
-    has_channel = db.has_channel_by_admin_id(admin_id)
-    logger.info(f"Channel check result for admin_id {admin_id}: {has_channel}")
-    
-    return {"hasChannel": has_channel}
+    logger.info(f"Channel check result for admin_id {session.admin_id}: {session.has_channel}")
+    return {"hasChannel": session.has_channel}
 
 @app.post("/api/telegram/disconnect-all")
-async def disconnect_all_telegram(authorization: str = Header(None)):
+async def disconnect_all_telegram(session: AdminContext = Depends(sessions)):
     """Отвязывает Telegram аккаунт и все каналы"""
     logger.info("Disconnecting all Telegram bindings...")
-    
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="No token provided")
-    
-    admin_id = 666  # В будущем здесь будет реальный admin_id
-    db.remove_all_telegram_bindings(admin_id)
+    await db.remove_all_telegram_bindings(session.admin_id)
+    bindings_changed(session.admin_id)
     
     return {"status": "success"}
 
 @app.post("/api/telegram/disconnect-channel")
-async def disconnect_channel(authorization: str = Header(None)):
+async def disconnect_channel(session: AdminContext = Depends(sessions)):
     """Отвязывает только Telegram канал"""
     logger.info("Disconnecting Telegram channel...")
+    await db.remove_channel_binding(session.admin_id)
+    bindings_changed(session.admin_id)
     
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="No token provided")
-    
-    admin_id = 666  # В будущем здесь будет реальный admin_id
-    db.remove_channel_binding(admin_id)
-    
-    return {"status": "success"}
\ No newline at end of file
+    return {"status": "success"}
+
+@app.post("/api/transform/stream")
+async def stream_transform(data: CrossPostRequest, request: Request,
+                           session: AdminContext = Depends(sessions)):
+    """Потоковая трансформация контента (Server-Sent Events)"""
+    logger.info(f"Streaming transform from {data.source_platform} to {data.target_platform}")
+    tokens = get_ai_service().stream_transform(data.content, data.source_platform, data.target_platform)
+
+    async def events():
+        try:
+            async for token in tokens:
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, stopping transform stream")
+                    break
+                yield f"data: {json.dumps({'delta': token})}\n\n"
+            else:
+                yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming transform: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Transform failed'})}\n\n"
+        finally:
+            # Закрытие генератора прерывает запрос к OpenAI, если ответ еще не дочитан
+            await tokens.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
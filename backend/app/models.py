@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 import uuid
@@ -10,8 +10,9 @@ class User(BaseModel):
     created_at: datetime
 
 class UserCreate(BaseModel):
-    setup_token: str = str(uuid.uuid4())
-    created_at: datetime = datetime.now()
+    # Значения по умолчанию вычисляются для каждого пользователя заново
+    setup_token: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    created_at: datetime = Field(default_factory=datetime.now)
 
 class Post(BaseModel):
     content: str
@@ -32,4 +33,17 @@ class TelegramChannel(BaseModel):
     id: int
     title: str
     user_id: str
-    verified: bool = False
\ No newline at end of file
+    verified: bool = False
+
+class AdminContext(BaseModel):
+    """Состояние админа, к которому относится токен запроса"""
+    admin_id: int
+    # Время выпуска токена, если это еще не погашенный токен настройки
+    token_timestamp: Optional[float] = None
+    telegram_user_id: Optional[int] = None
+    channel_id: Optional[int] = None
+    channel_title: Optional[str] = None
+
+    @property
+    def has_channel(self) -> bool:
+        return self.channel_id is not None
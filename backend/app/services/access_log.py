@@ -0,0 +1,164 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from typing import Optional
+
+DEFAULT_SAMPLE_RATE = 1.0
+DEFAULT_MAX_BODY_BYTES = 2048
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+MAX_FIELD_LENGTH = 256
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись; поля запроса берутся из record.access"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+        }
+        entry.update(getattr(record, "access", None) or {"message": record.getMessage()})
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _PassThroughQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке.
+
+    Записи access-лога не содержат аргументов для подстановки и исключений,
+    поэтому их можно передать в очередь как есть: форматирование в JSON
+    выполняет поток QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_access_log(
+    path: str = "logs/backend/access.log",
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    backup_count: int = DEFAULT_BACKUP_COUNT,
+) -> logging.handlers.QueueListener:
+    """Настройка логгера backend.access с записью в файл из отдельного потока.
+
+    Обработчики в event loop только кладут запись в очередь (QueueHandler),
+    форматирование и запись с ротацией файла выполняет QueueListener.
+    Возвращает запущенный listener; его нужно остановить при завершении.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    access_logger = logging.getLogger("backend.access")
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+    access_logger.handlers = [_PassThroughQueueHandler(log_queue)]
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def _truncate(value: Optional[str], limit: int = MAX_FIELD_LENGTH) -> Optional[str]:
+    if value is None or len(value) <= limit:
+        return value
+    return value[:limit] + "..."
+
+
+class AccessLogMiddleware:
+    """ASGI-middleware структурированного access-лога.
+
+    Пишет по одной JSON-записи на запрос: метод, путь, статус, время
+    обработки, размеры тела запроса и ответа. Успешные запросы
+    логируются с вероятностью sample_rate, ошибки (статус >= 400) —
+    всегда, вместе с первыми max_body_bytes тела запроса. Заголовки
+    (в том числе Authorization) не логируются. Тело не буферизуется
+    целиком: запоминается только префикс по мере чтения приложением.
+    """
+
+    def __init__(
+        self,
+        app,
+        logger: Optional[logging.Logger] = None,
+        sample_rate: float = DEFAULT_SAMPLE_RATE,
+        max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+    ):
+        self.app = app
+        self.logger = logger or logging.getLogger("backend.access")
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        request_bytes = 0
+        response_bytes = 0
+        body_prefix = bytearray()
+
+        async def receive_wrapper():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                request_bytes += len(chunk)
+                if len(body_prefix) < self.max_body_bytes:
+                    body_prefix.extend(chunk[:self.max_body_bytes - len(body_prefix)])
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            is_error = status >= 400
+            if is_error or self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+                self._log(scope, status, started, request_bytes, response_bytes,
+                          bytes(body_prefix) if is_error else None)
+
+    def _log(self, scope, status: int, started: float, request_bytes: int,
+             response_bytes: int, body: Optional[bytes]) -> None:
+        user_agent = None
+        for name, value in scope.get("headers") or ():
+            if name == b"user-agent":
+                user_agent = _truncate(value.decode("latin-1"))
+                break
+        client = scope.get("client")
+        entry = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "request_bytes": request_bytes,
+            "response_bytes": response_bytes,
+            "client": client[0] if client else None,
+            "user_agent": user_agent,
+        }
+        if self.sample_rate < 1.0 and status < 400:
+            entry["sample_rate"] = self.sample_rate
+        if body is not None:
+            entry["body"] = body.decode("utf-8", errors="replace")
+            entry["body_truncated"] = request_bytes > len(body)
+        level = logging.ERROR if status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+        if self.logger.isEnabledFor(level):
+            # makeRecord напрямую: без поиска вызывающего кадра стека, как в logger.log()
+            record = self.logger.makeRecord(
+                self.logger.name, level, "", 0, "access", (), None, extra={"access": entry}
+            )
+            self.logger.handle(record)
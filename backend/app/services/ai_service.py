@@ -1,14 +1,144 @@
-from openai import AsyncOpenAI
+import asyncio
+import json
+import logging
 import os
-from dotenv import load_dotenv
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional
+from .metrics import LLM_BUCKETS, REGISTRY
+from .transform_cache import TransformCache, make_cache_key
+
+# Пакет openai импортируется около полусекунды, поэтому загружается только
+# при создании клиента, а не при импорте модуля
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4"
+# Увеличивать при любом изменении промпта, чтобы не отдавать из кэша старые результаты
+PROMPT_VERSION = 1
+
+SYSTEM_PROMPT = "You are a social media expert who transforms content between platforms while maintaining the core message."
+
+# Ограничения длины текста поста на платформах
+PLATFORM_LIMITS = {
+    "twitter": 280,
+    "telegram": 4096,
+}
+
+llm_request_duration = REGISTRY.histogram(
+    "llm_request_duration_seconds", "LLM request latency", ("operation", "model"), buckets=LLM_BUCKETS
+)
+llm_time_to_first_token = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds", "Streaming LLM time to first token", ("model",), buckets=LLM_BUCKETS
+)
+llm_tokens = REGISTRY.counter("llm_tokens_total", "LLM tokens used", ("model", "kind"))
+llm_errors = REGISTRY.counter("llm_errors_total", "LLM request errors", ("operation", "model", "error"))
+
+
+def _record_usage(model: str, usage) -> None:
+    if usage is None:
+        return
+    llm_tokens.inc(model, "prompt", amount=getattr(usage, "prompt_tokens", 0) or 0)
+    llm_tokens.inc(model, "completion", amount=getattr(usage, "completion_tokens", 0) or 0)
 
-load_dotenv()
 
 class AIService:
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, client: Optional["AsyncOpenAI"] = None, model: str = DEFAULT_MODEL,
+                 cache: Optional[TransformCache] = None):
+        if client is None:
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = client
+        self.model = model
+        self.cache = cache
+
+    async def transform_content(self, content: str, source_platform: str, target_platform: str,
+                                use_cache: bool = True) -> str:
+        cache_key = None
+        if self.cache and use_cache:
+            cache_key = make_cache_key(content, source_platform, target_platform, self.model, PROMPT_VERSION)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        response = await self._complete(
+            "transform", self._build_messages(content, source_platform, target_platform)
+        )
+        
+        result = response.choices[0].message.content
+        if cache_key:
+            await self.cache.set(cache_key, result)
+        return result
+
+    async def stream_transform(self, content: str, source_platform: str, target_platform: str,
+                               use_cache: bool = True) -> AsyncIterator[str]:
+        """Потоковая трансформация: фрагменты текста отдаются по мере генерации.
+
+        Если генератор закрыт до конца ответа (например, клиент отключился),
+        запрос к модели прерывается. В кэш попадает только полный ответ.
+        """
+        cache_key = None
+        if self.cache and use_cache:
+            cache_key = make_cache_key(content, source_platform, target_platform, self.model, PROMPT_VERSION)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        started = time.perf_counter()
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self._build_messages(content, source_platform, target_platform),
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+        except Exception as e:
+            llm_errors.inc("stream", self.model, type(e).__name__)
+            raise
+        parts = []
+        completed = False
+        try:
+            async for chunk in stream:
+                # Расход токенов приходит последним фрагментом, без choices
+                _record_usage(self.model, getattr(chunk, "usage", None))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        llm_time_to_first_token.observe(time.perf_counter() - started, self.model)
+                    parts.append(delta)
+                    yield delta
+            completed = True
+        except Exception as e:
+            llm_errors.inc("stream", self.model, type(e).__name__)
+            raise
+        finally:
+            if not completed:
+                logger.info("Stream closed before completion, aborting upstream request")
+            llm_request_duration.observe(time.perf_counter() - started, "stream", self.model)
+            await stream.close()
 
-    async def transform_content(self, content: str, source_platform: str, target_platform: str) -> str:
+        if cache_key:
+            await self.cache.set(cache_key, "".join(parts))
+
+    async def _complete(self, operation: str, messages: List[dict]):
+        """Запрос к модели с замером времени, расхода токенов и ошибок"""
+        started = time.perf_counter()
+        try:
+            response = await self.client.chat.completions.create(model=self.model, messages=messages)
+        except Exception as e:
+            llm_errors.inc(operation, self.model, type(e).__name__)
+            raise
+        finally:
+            llm_request_duration.observe(time.perf_counter() - started, operation, self.model)
+        _record_usage(self.model, getattr(response, "usage", None))
+        return response
+
+    @staticmethod
+    def _build_messages(content: str, source_platform: str, target_platform: str) -> List[dict]:
         prompt = f"""
         Transform the following {source_platform} content to be suitable for {target_platform}.
         Maintain the core message while adapting to the target platform's style and constraints.
@@ -17,13 +147,89 @@ class AIService:
         
         Target Platform: {target_platform}
         """
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    async def transform_many(self, content: str, source_platform: str, targets: List[str],
+                             use_cache: bool = True) -> Dict[str, str]:
+        """Трансформация для нескольких платформ за один запрос к модели.
+
+        Модель возвращает JSON-объект с вариантом для каждой платформы.
+        Варианты, которые не удалось разобрать или которые не прошли
+        проверку, запрашиваются отдельно через transform_content.
+        """
+        results: Dict[str, str] = {}
+        missing = []
+        for target in targets:
+            if self.cache and use_cache:
+                cache_key = make_cache_key(content, source_platform, target, self.model, PROMPT_VERSION)
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    results[target] = cached
+                    continue
+            missing.append(target)
+
+        if len(missing) == 1:
+            results[missing[0]] = await self.transform_content(content, source_platform, missing[0], use_cache)
+            return results
+        if not missing:
+            return results
+
+        targets_list = ", ".join(f'"{target}"' for target in missing)
+        prompt = f"""
+        Transform the following {source_platform} content for each of these platforms: {targets_list}.
+        Maintain the core message while adapting to each target platform's style and constraints.
         
-        response = await self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a social media expert who transforms content between platforms while maintaining the core message."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        Content: {content}
         
-        return response.choices[0].message.content 
\ No newline at end of file
+        Respond with a single JSON object only. Use the platform names as keys and the
+        transformed text for that platform as string values.
+        """
+
+        response = await self._complete("transform_many", [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ])
+        variants = self._parse_variants(response.choices[0].message.content)
+
+        failed = []
+        for target in missing:
+            variant = variants.get(target)
+            if not self._is_valid_variant(variant, target):
+                failed.append(target)
+                continue
+            results[target] = variant.strip()
+            if self.cache and use_cache:
+                cache_key = make_cache_key(content, source_platform, target, self.model, PROMPT_VERSION)
+                await self.cache.set(cache_key, results[target])
+
+        if failed:
+            logger.warning(f"Falling back to per-target transforms for: {failed}")
+            fallbacks = await asyncio.gather(*(
+                self.transform_content(content, source_platform, target, use_cache) for target in failed
+            ))
+            results.update(zip(failed, fallbacks))
+        return results
+
+    @staticmethod
+    def _parse_variants(text: Optional[str]) -> dict:
+        """Извлечение JSON-объекта из ответа модели (в том числе обернутого в ```json)"""
+        if not text:
+            return {}
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            return {}
+        try:
+            data = json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @staticmethod
+    def _is_valid_variant(variant, target: str) -> bool:
+        if not isinstance(variant, str) or not variant.strip():
+            return False
+        limit = PLATFORM_LIMITS.get(target)
+        return limit is None or len(variant.strip()) <= limit
\ No newline at end of file
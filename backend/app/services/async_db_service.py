@@ -0,0 +1,113 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, List, Optional, Tuple, TypeVar
+import logging
+
+from .db_service import DatabaseService
+from .storage import Storage
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Количество потоков для работы с БД. В WAL-режиме чтения идут параллельно,
+# записи сериализуются самим SQLite через busy_timeout.
+DEFAULT_DB_THREADS = 4
+
+
+class AsyncDatabaseService(Storage):
+    """Асинхронная обертка над DatabaseService (хранилище SQLite).
+
+    Все обращения к SQLite выполняются в выделенном пуле потоков, поэтому
+    медленный fsync не блокирует event loop. Методы повторяют API
+    DatabaseService, но возвращают корутины.
+    """
+
+    def __init__(self, db: Optional[DatabaseService] = None, max_workers: int = DEFAULT_DB_THREADS):
+        self.db = db or DatabaseService()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        logger.info(f"Initialized AsyncDatabaseService with {max_workers} DB threads")
+
+    async def _run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def start(self) -> None:
+        """Проверка схемы БД и применение недостающих миграций"""
+        await self._run(self.db.init_db)
+
+    async def close(self) -> None:
+        """Остановка пула потоков и закрытие соединений"""
+        self._executor.shutdown(wait=True)
+        self.db.close()
+
+    async def save_token(self, token: str, admin_id: int) -> None:
+        await self._run(self.db.save_token, token, admin_id)
+
+    async def get_token_data(self, token: str) -> Optional[Tuple[float, int]]:
+        return await self._run(self.db.get_token_data, token)
+
+    async def consume_token(self, token: str) -> Optional[Tuple[float, int]]:
+        return await self._run(self.db.consume_token, token)
+
+    async def delete_token(self, token: str) -> None:
+        await self._run(self.db.delete_token, token)
+
+    async def cleanup_expired_tokens(self, expiry_seconds: int = 600) -> None:
+        await self._run(self.db.cleanup_expired_tokens, expiry_seconds)
+
+    async def save_telegram_binding(self, telegram_user_id: int, admin_id: int) -> None:
+        await self._run(self.db.save_telegram_binding, telegram_user_id, admin_id)
+
+    async def get_admin_id_by_telegram(self, telegram_user_id: int) -> Optional[int]:
+        return await self._run(self.db.get_admin_id_by_telegram, telegram_user_id)
+
+    async def get_telegram_user_by_admin(self, admin_id: int) -> Optional[int]:
+        return await self._run(self.db.get_telegram_user_by_admin, admin_id)
+
+    async def remove_telegram_binding(self, admin_id: int) -> None:
+        await self._run(self.db.remove_telegram_binding, admin_id)
+
+    async def save_channel_binding(self, admin_id: int, channel_id: int, channel_title: str) -> None:
+        await self._run(self.db.save_channel_binding, admin_id, channel_id, channel_title)
+
+    async def get_channel_by_id(self, channel_id: int) -> Optional[dict]:
+        return await self._run(self.db.get_channel_by_id, channel_id)
+
+    async def is_channel_linked(self, channel_id: int) -> bool:
+        return await self._run(self.db.is_channel_linked, channel_id)
+
+    async def has_linked_channel(self, telegram_user_id: int) -> bool:
+        return await self._run(self.db.has_linked_channel, telegram_user_id)
+
+    async def get_user_channels(self, telegram_user_id: int) -> list:
+        return await self._run(self.db.get_user_channels, telegram_user_id)
+
+    async def has_channel_by_admin_id(self, admin_id: int) -> bool:
+        return await self._run(self.db.has_channel_by_admin_id, admin_id)
+
+    async def get_admin_state(self, admin_id: int) -> dict:
+        return await self._run(self.db.get_admin_state, admin_id)
+
+    async def remove_all_telegram_bindings(self, admin_id: int) -> None:
+        await self._run(self.db.remove_all_telegram_bindings, admin_id)
+
+    async def remove_channel_binding(self, admin_id: int) -> None:
+        await self._run(self.db.remove_channel_binding, admin_id)
+
+    async def save_post(self, channel_id: int, message_id: int, content: str) -> None:
+        await self._run(self.db.save_post, channel_id, message_id, content)
+
+    async def get_channel_ids(self) -> List[int]:
+        return await self._run(self.db.get_channel_ids)
+
+    async def get_cached_transform(self, cache_key: str, min_created_at: float) -> Optional[str]:
+        return await self._run(self.db.get_cached_transform, cache_key, min_created_at)
+
+    async def save_cached_transform(self, cache_key: str, content: str) -> None:
+        await self._run(self.db.save_cached_transform, cache_key, content)
+
+    async def evict_cached_transforms(self, max_entries: int, min_created_at: float) -> int:
+        return await self._run(self.db.evict_cached_transforms, max_entries, min_created_at)
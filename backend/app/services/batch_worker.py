@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, List
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+class BatchWorker(ABC):
+    """Цикл воркера, обрабатывающего захваченную из БД работу.
+
+    run() забирает пачки через _claim() и передает каждый элемент в
+    _process() не более чем concurrency задачами одновременно. Если работы
+    нет (или захват не удался), воркер ждет poll_interval или сигнала
+    notify(). После stop() цикл завершается, дождавшись начатых задач.
+
+    Наследники реализуют _claim() и _process() и ведут счетчики processed
+    и failed; _on_start() вызывается один раз перед циклом.
+    """
+
+    def __init__(self, name: str, concurrency: int, poll_interval: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._semaphore = asyncio.BoundedSemaphore(concurrency)
+        self._tasks = set()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.processed = 0
+        self.failed = 0
+
+    @abstractmethod
+    async def _claim(self) -> List[Any]:
+        """Захват следующей пачки работы"""
+
+    @abstractmethod
+    async def _process(self, item: Any) -> None:
+        """Обработка одного элемента; ошибки обрабатывает сам наследник"""
+
+    async def _on_start(self) -> None:
+        """Подготовка перед циклом. По умолчанию ничего не делает"""
+
+    def notify(self) -> None:
+        """Сигнал о новой работе: не ждать окончания poll_interval"""
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        """Основной цикл воркера (до вызова stop())"""
+        logger.info(f"Started {self.name} (concurrency={self.concurrency})")
+        await self._on_start()
+        while not self._stopping:
+            try:
+                items = await self._claim()
+            except Exception as e:
+                logger.error(f"Error claiming work for {self.name}: {str(e)}")
+                items = []
+
+            if not items:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            for item in items:
+                # Ждем свободный слот: одновременно не больше concurrency задач
+                await self._semaphore.acquire()
+                task = asyncio.create_task(self._process(item))
+                self._tasks.add(task)
+                task.add_done_callback(self._on_task_done)
+
+            # Следующую пачку забираем только когда есть хотя бы один свободный слот
+            await self._semaphore.acquire()
+            self._semaphore.release()
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info(f"Stopped {self.name} (processed={self.processed}, failed={self.failed})")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._semaphore.release()
@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+from typing import Callable, FrozenSet, Optional
+
+from .db_service import DatabaseService
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Как часто сверять ревизию привязок каналов, секунд
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+class ChannelIndex:
+    """Кэш множества привязанных channel_id для горячего пути бота.
+
+    Множество перечитывается только если изменилась ревизия
+    DatabaseService.channels_revision. Ее увеличивает любое изменение
+    привязок каналов, в том числе из процесса API, а прочие записи в БД ее
+    не трогают. Ревизия сверяется не чаще раза в poll_interval, поэтому
+    посты из непривязанных каналов в остальное время отбрасываются без
+    обращений к БД, а новая привязка видна не позже чем через poll_interval.
+    """
+
+    def __init__(self, db: DatabaseService, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.db = db
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._channel_ids: FrozenSet[int] = frozenset()
+        self._version: Optional[int] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self, version: int) -> None:
+        with self._lock:
+            if self._version == version:
+                return
+            self._channel_ids = frozenset(self.db.get_channel_ids())
+            self._version = version
+        logger.info(f"Channel index refreshed: {len(self._channel_ids)} linked channels")
+
+    def invalidate(self) -> None:
+        """Принудительное перечитывание при следующем обращении"""
+        self._version = None
+
+    def get_channel_ids(self) -> FrozenSet[int]:
+        now = self._clock()
+        if self._version is None or now - self._last_check >= self.poll_interval:
+            self._last_check = now
+            version = self.db.channels_revision
+            if version != self._version:
+                self._refresh(version)
+        return self._channel_ids
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self.get_channel_ids()
+
+    def __len__(self) -> int:
+        return len(self.get_channel_ids())
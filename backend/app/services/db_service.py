@@ -1,92 +1,133 @@
+import json
 import sqlite3
 from contextlib import contextmanager
 import time
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import os
+import threading
 import logging
 
+from .metrics import REGISTRY, timed_methods
+from .migrations import apply_migrations
+from .text_utils import SIMHASH_BANDS, content_hash, from_signed64, simhash, simhash_bands, to_signed64
+
 # Настройка логгера
 logger = logging.getLogger(__name__)
 
+# Параметры соединений. Файл БД разделяют процессы API и бота, поэтому
+# используем WAL (читатели не блокируют писателя) и busy_timeout, чтобы
+# конкурентные записи из разных процессов ждали блокировку, а не падали.
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 16 * 1024
+MMAP_SIZE_BYTES = 64 * 1024 * 1024
+
+db_method_duration = REGISTRY.histogram(
+    "db_method_duration_seconds", "DatabaseService method latency", ("method",)
+)
+db_connections_opened = REGISTRY.counter("db_connections_opened_total", "SQLite connections opened")
+db_connections_closed = REGISTRY.counter("db_connections_closed_total", "SQLite connections closed")
+
+
+# get_db — служебный метод, его время входит в замеры вызывающих методов
+@timed_methods(db_method_duration, exclude=("get_db", "close"))
 class DatabaseService:
-    def __init__(self, db_path: str = "db/app.db"):
+    def __init__(self, db_path: str = "db/app.db", initialize: bool = True):
         logger.info(f"Initializing DatabaseService with db_path: {db_path}")
         self.db_path = db_path
-        # Создаем директорию, если её нет
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self.init_db()
+        # Пул соединений: одно долгоживущее соединение на поток
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pid = os.getpid()
+        # С initialize=False схему проверяет владелец сервиса через init_db()
+        # (AsyncDatabaseService.start()), а не конструктор
+        if initialize:
+            self.init_db()
 
-    @contextmanager
-    def get_db(self):
+    def _connect(self) -> sqlite3.Connection:
+        """Открытие нового соединения с настроенными PRAGMA"""
         logger.debug("Opening database connection")
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+        )
         conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        db_connections_opened.inc()
+        return conn
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Получение соединения текущего потока (создается при первом обращении)"""
+        if os.getpid() != self._pid:
+            # После fork соединения родителя использовать нельзя
+            self._reset_after_fork()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _reset_after_fork(self) -> None:
+        logger.debug("Process fork detected, dropping inherited connections")
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @contextmanager
+    def get_db(self):
+        conn = self._get_connection()
         try:
             yield conn
         finally:
-            logger.debug("Closing database connection")
-            conn.close()
+            # Незавершенная транзакция (например, после исключения) не должна
+            # остаться висеть на соединении, которое переиспользуется дальше
+            if conn.in_transaction:
+                logger.debug("Rolling back unfinished transaction")
+                conn.rollback()
+
+    def close(self) -> None:
+        """Закрытие всех соединений пула"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Error closing database connection: {str(e)}")
+        db_connections_closed.inc(amount=len(connections))
+        self._local = threading.local()
+        logger.debug(f"Closed {len(connections)} database connections")
+
+    @property
+    def channels_revision(self) -> int:
+        """Ревизия telegram_channels из table_revisions.
+
+        Растет при любом изменении привязок каналов, в том числе из других
+        процессов (ее увеличивают триггеры). Чтение одной строки по ключу.
+        """
+        with self.get_db() as conn:
+            return conn.execute(
+                "SELECT revision FROM table_revisions WHERE name = 'telegram_channels'"
+            ).fetchone()[0]
 
     def init_db(self):
-        """Инициализация всех необходимых таблиц"""
+        """Инициализация схемы БД через миграции"""
         logger.info("Initializing database tables")
         try:
+            # Создаем директорию, если её нет
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
             with self.get_db() as conn:
-                # Таблица временных токенов
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS temp_tokens (
-                        token TEXT PRIMARY KEY,
-                        timestamp FLOAT NOT NULL,
-                        admin_id INTEGER NOT NULL
-                    )
-                """)
-                
-                # Таблица привязок телеграм аккаунтов
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS telegram_bindings (
-                        telegram_user_id INTEGER PRIMARY KEY,
-                        admin_id INTEGER NOT NULL,
-                        created_at FLOAT NOT NULL
-                    )
-                """)
-                
-                # Таблица телеграм каналов
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS telegram_channels (
-                        channel_id INTEGER PRIMARY KEY,
-                        admin_id INTEGER NOT NULL,
-                        channel_title TEXT NOT NULL,
-                        created_at FLOAT NOT NULL
-                    )
-                """)
-                
-                # Таблица постов
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS posts (
-                        post_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        channel_id INTEGER NOT NULL,
-                        message_id INTEGER NOT NULL,
-                        content TEXT NOT NULL,
-                        created_at FLOAT NOT NULL,
-                        status TEXT NOT NULL DEFAULT 'pending',
-                        FOREIGN KEY (channel_id) REFERENCES telegram_channels (channel_id)
-                    )
-                """)
-                
-                # Таблица настроек каналов
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS channel_settings (
-                        channel_id INTEGER PRIMARY KEY,
-                        auto_posting BOOLEAN NOT NULL DEFAULT 0,
-                        post_interval INTEGER DEFAULT 3600,
-                        created_at FLOAT NOT NULL,
-                        last_updated_at FLOAT NOT NULL,
-                        FOREIGN KEY (channel_id) REFERENCES telegram_channels (channel_id)
-                    )
-                """)
-
-                conn.commit()
-            logger.info("Database tables initialized successfully")
+                version = apply_migrations(conn)
+            logger.info(f"Database tables initialized successfully (schema version {version})")
         except Exception as e:
             logger.error(f"Error initializing database: {str(e)}")
             raise
@@ -96,12 +137,13 @@ class DatabaseService:
         logger.warning("Resetting database - all data will be deleted")
         try:
             with self.get_db() as conn:
-                # Удаляем существующие таблицы
-                conn.execute("DROP TABLE IF EXISTS posts")
-                conn.execute("DROP TABLE IF EXISTS channel_settings")
-                conn.execute("DROP TABLE IF EXISTS telegram_channels")
-                conn.execute("DROP TABLE IF EXISTS telegram_bindings")
-                conn.execute("DROP TABLE IF EXISTS temp_tokens")
+                # Удаляем все таблицы, включая schema_version
+                tables = conn.execute(
+                    """SELECT name FROM sqlite_master 
+                       WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"""
+                ).fetchall()
+                for table in tables:
+                    conn.execute(f'DROP TABLE IF EXISTS "{table[0]}"')
                 conn.commit()
             
             # Создаем таблицы заново
@@ -164,6 +206,24 @@ class DatabaseService:
             logger.error(f"Error deleting token: {str(e)}")
             raise
 
+    def consume_token(self, token: str) -> Optional[Tuple[float, int]]:
+        """Атомарное получение и удаление токена (повторно использовать токен нельзя)"""
+        logger.info(f"Consuming token: {token[:8]}...")
+        try:
+            with self.get_db() as conn:
+                result = conn.execute(
+                    "DELETE FROM temp_tokens WHERE token = ? RETURNING timestamp, admin_id",
+                    (token,)
+                ).fetchone()
+                conn.commit()
+                if result:
+                    return result['timestamp'], result['admin_id']
+                logger.debug(f"No token data found for token: {token[:8]}...")
+                return None
+        except Exception as e:
+            logger.error(f"Error consuming token: {str(e)}")
+            raise
+
     def save_telegram_binding(self, telegram_user_id: int, admin_id: int) -> None:
         """Сохранение привязки Telegram к админу"""
         self._validate_admin_id(admin_id)
@@ -195,7 +255,7 @@ class DatabaseService:
                     logger.debug(f"Found admin_id: {result[0]} for telegram_user_id: {telegram_user_id}")
                 else:
                     logger.debug(f"No admin_id found for telegram_user_id: {telegram_user_id}")
-                return result[0] if isinstance(result[0], int) else None
+                return result[0] if result else None
         except Exception as e:
             logger.error(f"Error getting admin_id by telegram: {str(e)}")
             raise
@@ -255,14 +315,6 @@ class DatabaseService:
         logger.info(f"Saving channel binding for admin_id: {admin_id}, channel_id: {channel_id}")
         try:
             with self.get_db() as conn:
-                conn.execute(
-                    """CREATE TABLE IF NOT EXISTS telegram_channels (
-                        channel_id INTEGER PRIMARY KEY,
-                        admin_id INTEGER NOT NULL,
-                        channel_title TEXT NOT NULL,
-                        created_at FLOAT NOT NULL
-                    )"""
-                )
                 conn.execute(
                     """INSERT OR REPLACE INTO telegram_channels 
                        (channel_id, admin_id, channel_title, created_at) 
@@ -396,6 +448,28 @@ class DatabaseService:
             logger.error(f"Error checking channel existence for admin_id: {str(e)}")
             raise
 
+    def get_admin_state(self, admin_id: int) -> dict:
+        """Привязка Telegram и канал админа одним запросом.
+
+        Возвращает telegram_user_id, channel_id и channel_title (None, если
+        привязки или канала нет).
+        """
+        logger.debug(f"Getting binding state for admin_id: {admin_id}")
+        try:
+            with self.get_db() as conn:
+                row = conn.execute(
+                    """SELECT b.telegram_user_id, c.channel_id, c.channel_title
+                       FROM (SELECT ? AS admin_id) AS a
+                       LEFT JOIN telegram_bindings AS b ON b.admin_id = a.admin_id
+                       LEFT JOIN telegram_channels AS c ON c.admin_id = a.admin_id
+                       LIMIT 1""",
+                    (admin_id,)
+                ).fetchone()
+                return dict(row)
+        except Exception as e:
+            logger.error(f"Error getting admin state: {str(e)}")
+            raise
+
     def remove_all_telegram_bindings(self, admin_id: int) -> None:
         """Удаление всех привязок Telegram (аккаунт и каналы)"""
         logger.info(f"Removing all Telegram bindings for admin_id: {admin_id}")
@@ -433,30 +507,50 @@ class DatabaseService:
             raise
 
     def save_post(self, channel_id: int, message_id: int, content: str) -> None:
-        """Сохранение нового поста из канала"""
-        logger.info(f"Saving new post from channel {channel_id}, message_id: {message_id}")
+        """Сохранение нового или отредактированного поста из канала"""
+        logger.info(f"Saving post from channel {channel_id}, message_id: {message_id}")
+        self.save_posts([(channel_id, message_id, content, time.time())])
+
+    def save_posts(self, posts: List[Tuple[int, int, str, float]]) -> int:
+        """Пакетное сохранение постов (channel_id, message_id, content, created_at).
+
+        Новые посты вставляются, уже сохраненные (правки) обновляются только
+        при изменении хэша содержимого: ревизия поста увеличивается, и он
+        снова ставится в очередь на трансформацию. Повторы и правки без
+        изменения текста пропускаются. Вместе с постом сохраняется его
+        SimHash (индекс почти-дубликатов обновляют триггеры). Возвращает
+        количество новых и измененных постов.
+        """
+        logger.debug(f"Saving batch of {len(posts)} posts")
         try:
             with self.get_db() as conn:
-                # Проверяем, существует ли уже такой пост
-                existing = conn.execute(
-                    """SELECT 1 FROM posts 
-                       WHERE channel_id = ? AND message_id = ?""",
-                    (channel_id, message_id)
-                ).fetchone()
-                
-                if not existing:
-                    conn.execute(
-                        """INSERT INTO posts 
-                           (channel_id, message_id, content, created_at, status) 
-                           VALUES (?, ?, ?, ?, ?)""",
-                        (channel_id, message_id, content, time.time(), 'pending')
-                    )
-                    conn.commit()
-                    logger.info(f"New post saved: channel_id={channel_id}, message_id={message_id}")
-                else:
-                    logger.debug(f"Post already exists: channel_id={channel_id}, message_id={message_id}")
+                # rowcount не учитывает строки, которые вставляют триггеры
+                # индекса SimHash (total_changes их учитывает)
+                cursor = conn.executemany(
+                    """INSERT INTO posts 
+                       (channel_id, message_id, content, content_hash, simhash, created_at, status) 
+                       VALUES (?, ?, ?, ?, ?, ?, 'pending')
+                       ON CONFLICT (channel_id, message_id) DO UPDATE SET
+                           content = excluded.content,
+                           content_hash = excluded.content_hash,
+                           simhash = excluded.simhash,
+                           revision = revision + 1,
+                           status = 'pending',
+                           attempts = 0,
+                           next_attempt_at = 0,
+                           last_error = NULL,
+                           updated_at = excluded.created_at
+                       WHERE content_hash IS NOT excluded.content_hash""",
+                    [(channel_id, message_id, content, content_hash(content),
+                      to_signed64(simhash(content)), created_at)
+                     for channel_id, message_id, content, created_at in posts]
+                )
+                conn.commit()
+                written = cursor.rowcount
+            logger.info(f"Saved {written} new or edited posts ({len(posts) - written} unchanged skipped)")
+            return written
         except Exception as e:
-            logger.error(f"Error saving post: {str(e)}")
+            logger.error(f"Error saving posts: {str(e)}")
             raise
 
     def get_channel_ids(self) -> list[int]:
@@ -472,4 +566,671 @@ class DatabaseService:
                 return channel_ids
         except Exception as e:
             logger.error(f"Error getting channel IDs: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def claim_pending_posts(self, limit: int) -> List[dict]:
+        """Захват пачки постов, ожидающих трансформации (pending -> processing)"""
+        logger.debug(f"Claiming up to {limit} pending posts")
+        try:
+            with self.get_db() as conn:
+                now = time.time()
+                rows = conn.execute(
+                    """UPDATE posts SET status = 'processing', updated_at = ?
+                       WHERE post_id IN (
+                           SELECT post_id FROM posts
+                           WHERE status = 'pending' AND next_attempt_at <= ?
+                           ORDER BY created_at
+                           LIMIT ?
+                       )
+                       RETURNING post_id, channel_id, message_id, content, simhash, attempts, revision""",
+                    (now, now, limit)
+                ).fetchall()
+                conn.commit()
+                posts = [dict(row) for row in rows]
+                for post in posts:
+                    if post['simhash'] is not None:
+                        post['simhash'] = from_signed64(post['simhash'])
+                if posts:
+                    logger.info(f"Claimed {len(posts)} pending posts")
+                return posts
+        except Exception as e:
+            logger.error(f"Error claiming pending posts: {str(e)}")
+            raise
+
+    def complete_post(self, post_id: int, transforms: Dict[str, str], revision: int) -> bool:
+        """Сохранение результатов трансформации и перевод поста в done.
+
+        Результат записывается, только если пост не редактировался после
+        захвата (revision совпадает). Возвращает False, если результат
+        устарел: новая ревизия уже стоит в очереди.
+        """
+        logger.info(f"Completing post {post_id} (revision {revision}) with {len(transforms)} transforms")
+        try:
+            with self.get_db() as conn:
+                now = time.time()
+                cursor = conn.execute(
+                    """UPDATE posts SET status = 'done', last_error = NULL, updated_at = ?
+                       WHERE post_id = ? AND revision = ?""",
+                    (now, post_id, revision)
+                )
+                if not cursor.rowcount:
+                    logger.info(f"Post {post_id} was edited during transformation, result discarded")
+                    return False
+                conn.executemany(
+                    """INSERT OR REPLACE INTO post_transforms 
+                       (post_id, platform, content, created_at) 
+                       VALUES (?, ?, ?, ?)""",
+                    [(post_id, platform, content, now) for platform, content in transforms.items()]
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Error completing post: {str(e)}")
+            raise
+
+    def fail_post(self, post_id: int, error: str, revision: int, retry_at: Optional[float] = None) -> None:
+        """Фиксация ошибки трансформации: повтор в retry_at или статус failed.
+
+        Ошибка по устаревшей ревизии поста игнорируется.
+        """
+        logger.info(f"Post {post_id} failed: {error} (revision: {revision}, retry_at: {retry_at})")
+        try:
+            with self.get_db() as conn:
+                conn.execute(
+                    """UPDATE posts 
+                       SET status = ?, attempts = attempts + 1, last_error = ?,
+                           next_attempt_at = ?, updated_at = ?
+                       WHERE post_id = ? AND revision = ?""",
+                    ('pending' if retry_at is not None else 'failed', error,
+                     retry_at or 0, time.time(), post_id, revision)
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error marking post as failed: {str(e)}")
+            raise
+
+    def release_stale_posts(self, timeout: float) -> int:
+        """Возврат в pending постов, зависших в processing (например, после падения воркера)"""
+        logger.debug(f"Releasing posts stuck in processing for more than {timeout} seconds")
+        try:
+            with self.get_db() as conn:
+                cursor = conn.execute(
+                    """UPDATE posts SET status = 'pending', updated_at = ?
+                       WHERE status = 'processing' AND updated_at < ?""",
+                    (time.time(), time.time() - timeout)
+                )
+                conn.commit()
+                if cursor.rowcount:
+                    logger.warning(f"Released {cursor.rowcount} stale processing posts")
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error releasing stale posts: {str(e)}")
+            raise
+
+    def find_similar_posts(self, post_id: int, fingerprint: int, since: float) -> List[dict]:
+        """Кандидаты в почти-дубликаты поста по LSH-индексу SimHash.
+
+        Возвращает трансформированные посты (done или published), созданные
+        не раньше since и совпадающие с fingerprint хотя бы в одной полосе:
+        словари с post_id, content и simhash. Расстояние Хэмминга проверяет
+        вызывающий код.
+        """
+        try:
+            with self.get_db() as conn:
+                bands = " OR ".join(f"(band = {band} AND value = ?)" for band in range(SIMHASH_BANDS))
+                # CROSS JOIN фиксирует порядок: сначала полосы индекса, затем
+                # посты по первичному ключу (а не все посты в статусе done)
+                rows = conn.execute(
+                    f"""SELECT p.post_id, p.content, p.simhash
+                        FROM (
+                            SELECT DISTINCT post_id FROM post_simhash_bands
+                            WHERE ({bands}) AND created_at >= ?
+                        ) AS b
+                        CROSS JOIN posts AS p ON p.post_id = b.post_id
+                        WHERE p.post_id != ? AND p.status IN ('done', 'published')""",
+                    (*simhash_bands(fingerprint), since, post_id)
+                ).fetchall()
+                return [
+                    {'post_id': row['post_id'], 'content': row['content'],
+                     'simhash': from_signed64(row['simhash'])}
+                    for row in rows
+                ]
+        except Exception as e:
+            logger.error(f"Error finding similar posts: {str(e)}")
+            raise
+
+    def get_post_transforms(self, post_id: int) -> Dict[str, str]:
+        """Получение результатов трансформации поста по платформам"""
+        logger.debug(f"Getting transforms for post {post_id}")
+        try:
+            with self.get_db() as conn:
+                rows = conn.execute(
+                    "SELECT platform, content FROM post_transforms WHERE post_id = ?",
+                    (post_id,)
+                ).fetchall()
+                return {row['platform']: row['content'] for row in rows}
+        except Exception as e:
+            logger.error(f"Error getting post transforms: {str(e)}")
+            raise
+
+    def get_cached_transform(self, cache_key: str, min_created_at: float) -> Optional[str]:
+        """Получение результата трансформации из кэша (не старше min_created_at)"""
+        try:
+            with self.get_db() as conn:
+                result = conn.execute(
+                    """SELECT content FROM transform_cache 
+                       WHERE cache_key = ? AND created_at >= ?""",
+                    (cache_key, min_created_at)
+                ).fetchone()
+                if not result:
+                    return None
+                conn.execute(
+                    "UPDATE transform_cache SET last_used_at = ? WHERE cache_key = ?",
+                    (time.time(), cache_key)
+                )
+                conn.commit()
+                return result['content']
+        except Exception as e:
+            logger.error(f"Error getting cached transform: {str(e)}")
+            raise
+
+    def save_cached_transform(self, cache_key: str, content: str) -> None:
+        """Сохранение результата трансформации в кэш"""
+        try:
+            with self.get_db() as conn:
+                now = time.time()
+                conn.execute(
+                    """INSERT OR REPLACE INTO transform_cache 
+                       (cache_key, content, created_at, last_used_at) 
+                       VALUES (?, ?, ?, ?)""",
+                    (cache_key, content, now, now)
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving cached transform: {str(e)}")
+            raise
+
+    def evict_cached_transforms(self, max_entries: int, min_created_at: float) -> int:
+        """Удаление просроченных записей кэша и самых давно использованных сверх max_entries"""
+        try:
+            with self.get_db() as conn:
+                expired = conn.execute(
+                    "DELETE FROM transform_cache WHERE created_at < ?",
+                    (min_created_at,)
+                ).rowcount
+                excess = conn.execute(
+                    """DELETE FROM transform_cache WHERE cache_key IN (
+                           SELECT cache_key FROM transform_cache
+                           ORDER BY last_used_at DESC
+                           LIMIT -1 OFFSET ?
+                       )""",
+                    (max_entries,)
+                ).rowcount
+                conn.commit()
+            if expired or excess:
+                logger.info(f"Evicted {expired} expired and {excess} excess cached transforms")
+            return expired + excess
+        except Exception as e:
+            logger.error(f"Error evicting cached transforms: {str(e)}")
+            raise
+
+    def save_channel_settings(self, channel_id: int, auto_posting: bool, post_interval: int) -> None:
+        """Сохранение настроек автопостинга канала.
+
+        Строка получает следующую ревизию channel_settings: ревизия
+        увеличивается первой записью транзакции, поэтому до коммита другие
+        процессы не могут ни получить большую ревизию, ни увидеть эту.
+        """
+        logger.info(f"Saving channel settings for {channel_id}: "
+                    f"auto_posting={auto_posting}, post_interval={post_interval}")
+        try:
+            with self.get_db() as conn:
+                now = time.time()
+                revision = conn.execute(
+                    """UPDATE table_revisions SET revision = revision + 1
+                       WHERE name = 'channel_settings'
+                       RETURNING revision"""
+                ).fetchone()[0]
+                conn.execute(
+                    """INSERT INTO channel_settings 
+                       (channel_id, auto_posting, post_interval, created_at, last_updated_at, revision) 
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (channel_id) DO UPDATE SET
+                           auto_posting = excluded.auto_posting,
+                           post_interval = excluded.post_interval,
+                           last_updated_at = excluded.last_updated_at,
+                           revision = excluded.revision""",
+                    (channel_id, auto_posting, post_interval, now, now, revision)
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving channel settings: {str(e)}")
+            raise
+
+    def get_channel_settings_changes(self, since: int) -> List[dict]:
+        """Настройки каналов с ревизией больше since (включая выключенные)"""
+        logger.debug(f"Getting channel settings changed since revision {since}")
+        try:
+            with self.get_db() as conn:
+                rows = conn.execute(
+                    """SELECT channel_id, auto_posting, post_interval, last_updated_at, revision
+                       FROM channel_settings
+                       WHERE revision > ?
+                       ORDER BY revision""",
+                    (since,)
+                ).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting channel settings changes: {str(e)}")
+            raise
+
+    def queue_post_for_publishing(self, channel_id: int) -> Optional[dict]:
+        """Захват самого старого трансформированного поста канала (done -> published)
+        и постановка его вариантов в outbox (тема publish.<платформа>).
+
+        Захват и постановка выполняются в одной транзакции: пост не может
+        оказаться опубликованным без сообщений в очереди.
+        """
+        logger.debug(f"Queueing post for publishing from channel {channel_id}")
+        try:
+            with self.get_db() as conn:
+                now = time.time()
+                row = conn.execute(
+                    """UPDATE posts SET status = 'published', updated_at = ?
+                       WHERE post_id = (
+                           SELECT post_id FROM posts
+                           WHERE channel_id = ? AND status = 'done'
+                           ORDER BY created_at
+                           LIMIT 1
+                       )
+                       RETURNING post_id, message_id, content""",
+                    (now, channel_id)
+                ).fetchone()
+                if row is None:
+                    return None
+                post = dict(row)
+                post["transforms"] = {
+                    transform['platform']: transform['content']
+                    for transform in conn.execute(
+                        "SELECT platform, content FROM post_transforms WHERE post_id = ?",
+                        (post["post_id"],)
+                    ).fetchall()
+                }
+                post["outbox_ids"] = self._insert_outbox(conn, [
+                    (f"publish.{platform}", {
+                        "post_id": post["post_id"],
+                        "channel_id": channel_id,
+                        "message_id": post["message_id"],
+                        "platform": platform,
+                        "content": content,
+                    })
+                    for platform, content in post["transforms"].items()
+                ], now)
+                conn.commit()
+                return post
+        except Exception as e:
+            logger.error(f"Error queueing post for publishing: {str(e)}")
+            raise
+
+    def _insert_outbox(self, conn: sqlite3.Connection, messages: List[Tuple[str, dict]],
+                       visible_at: float) -> List[int]:
+        now = time.time()
+        return [
+            conn.execute(
+                """INSERT INTO outbox (topic, payload, visible_at, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (topic, json.dumps(payload), visible_at, now, now)
+            ).lastrowid
+            for topic, payload in messages
+        ]
+
+    def enqueue_outbox(self, messages: List[Tuple[str, dict]], delay: float = 0) -> List[int]:
+        """Постановка сообщений (тема, payload) в outbox. Возвращает их id"""
+        logger.debug(f"Enqueueing {len(messages)} outbox messages")
+        try:
+            with self.get_db() as conn:
+                ids = self._insert_outbox(conn, messages, time.time() + delay)
+                conn.commit()
+                return ids
+        except Exception as e:
+            logger.error(f"Error enqueueing outbox messages: {str(e)}")
+            raise
+
+    def claim_outbox(self, topic: str, limit: int, lease_seconds: float, lease: str,
+                     max_attempts: Optional[int] = None) -> List[dict]:
+        """Захват до limit доступных сообщений темы на lease_seconds.
+
+        Доступны сообщения, которые еще никто не захватил, и сообщения с
+        истекшей арендой (воркер упал или не успел). Захват — один UPDATE,
+        поэтому несколько процессов никогда не получат одно сообщение.
+        Доступные сообщения, уже захваченные max_attempts раз (воркер
+        падал или зависал, не вызвав nack), в той же транзакции переходят
+        в dead и не захватываются.
+        """
+        logger.debug(f"Claiming up to {limit} outbox messages from {topic}")
+        try:
+            with self.get_db() as conn:
+                now = time.time()
+                # Пустой опрос — только чтение: простаивающие воркеры не
+                # берут блокировку записи
+                ready = conn.execute(
+                    """SELECT 1 FROM outbox
+                       WHERE topic = ? AND status = 'ready' AND visible_at <= ?
+                       LIMIT 1""",
+                    (topic, now)
+                ).fetchone()
+                if not ready:
+                    return []
+                if max_attempts is not None:
+                    dead = conn.execute(
+                        """UPDATE outbox
+                           SET status = 'dead', lease = NULL, updated_at = ?,
+                               last_error = 'Lease expired after ' || attempts || ' attempts'
+                           WHERE topic = ? AND status = 'ready' AND visible_at <= ? AND attempts >= ?
+                           RETURNING id""",
+                        (now, topic, now, max_attempts)
+                    ).fetchall()
+                    if dead:
+                        logger.error(f"Moved {len(dead)} outbox messages from {topic} to dead letters "
+                                     f"after {max_attempts} attempts without ack: {[row['id'] for row in dead]}")
+                rows = conn.execute(
+                    """UPDATE outbox
+                       SET lease = ?, attempts = attempts + 1, visible_at = ?, updated_at = ?
+                       WHERE id IN (
+                           SELECT id FROM outbox
+                           WHERE topic = ? AND status = 'ready' AND visible_at <= ?
+                           ORDER BY visible_at
+                           LIMIT ?
+                       )
+                       RETURNING id, topic, payload, attempts, lease""",
+                    (lease, now + lease_seconds, now, topic, now, limit)
+                ).fetchall()
+                conn.commit()
+                messages = [dict(row, payload=json.loads(row["payload"])) for row in rows]
+                if messages:
+                    logger.info(f"Claimed {len(messages)} outbox messages from {topic}")
+                return messages
+        except Exception as e:
+            logger.error(f"Error claiming outbox messages: {str(e)}")
+            raise
+
+    def ack_outbox(self, message_id: int, lease: str) -> bool:
+        """Удаление обработанного сообщения. Возвращает False, если аренда
+        уже истекла и сообщение захватил другой воркер"""
+        try:
+            with self.get_db() as conn:
+                cursor = conn.execute(
+                    "DELETE FROM outbox WHERE id = ? AND lease = ?",
+                    (message_id, lease)
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Error acknowledging outbox message: {str(e)}")
+            raise
+
+    def ack_outbox_batch(self, message_ids: List[int], lease: str) -> int:
+        """Удаление обработанных сообщений одного захвата одной транзакцией.
+        Возвращает количество удаленных (без сообщений, аренда которых потеряна)"""
+        if not message_ids:
+            return 0
+        try:
+            with self.get_db() as conn:
+                cursor = conn.execute(
+                    f"""DELETE FROM outbox
+                        WHERE lease = ? AND id IN ({', '.join('?' * len(message_ids))})""",
+                    (lease, *message_ids)
+                )
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error acknowledging outbox messages: {str(e)}")
+            raise
+
+    def nack_outbox(self, message_id: int, lease: str, error: str, retry_at: Optional[float] = None) -> bool:
+        """Возврат сообщения в очередь к retry_at или, без retry_at, в dead.
+        Возвращает False, если аренда уже потеряна"""
+        logger.info(f"Outbox message {message_id} failed: {error} (retry_at: {retry_at})")
+        try:
+            with self.get_db() as conn:
+                now = time.time()
+                cursor = conn.execute(
+                    """UPDATE outbox
+                       SET status = ?, lease = NULL, last_error = ?, visible_at = ?, updated_at = ?
+                       WHERE id = ? AND lease = ?""",
+                    ('ready' if retry_at is not None else 'dead', error,
+                     retry_at if retry_at is not None else now, now, message_id, lease)
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Error returning outbox message: {str(e)}")
+            raise
+
+    def release_outbox_leases(self, topic: str) -> int:
+        """Снятие всех аренд темы: сообщения снова доступны в порядке постановки.
+
+        Только для темы с единственным потребителем, при его старте: аренды
+        прежнего процесса заведомо потеряны, а ждать их истечения значило бы
+        обработать более поздние сообщения раньше.
+        """
+        try:
+            with self.get_db() as conn:
+                cursor = conn.execute(
+                    """UPDATE outbox SET lease = NULL, visible_at = created_at, updated_at = ?
+                       WHERE topic = ? AND status = 'ready' AND lease IS NOT NULL""",
+                    (time.time(), topic)
+                )
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error releasing outbox leases: {str(e)}")
+            raise
+
+    def get_outbox_messages(self, topic: str, status: str = 'ready', limit: int = 100) -> List[dict]:
+        """Сообщения темы в статусе status (ready — очередь, dead — отброшенные)"""
+        try:
+            with self.get_db() as conn:
+                rows = conn.execute(
+                    """SELECT id, topic, payload, status, attempts, visible_at, last_error, created_at
+                       FROM outbox
+                       WHERE topic = ? AND status = ?
+                       ORDER BY visible_at
+                       LIMIT ?""",
+                    (topic, status, limit)
+                ).fetchall()
+                return [dict(row, payload=json.loads(row["payload"])) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting outbox messages: {str(e)}")
+            raise
+
+    def delete_outbox_message(self, message_id: int) -> None:
+        """Удаление сообщения из outbox независимо от статуса"""
+        try:
+            with self.get_db() as conn:
+                conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error deleting outbox message: {str(e)}")
+            raise
+
+    def requeue_dead_outbox(self, topic: str) -> int:
+        """Возврат отброшенных сообщений темы в очередь со сбросом попыток"""
+        logger.info(f"Requeueing dead outbox messages of {topic}")
+        try:
+            with self.get_db() as conn:
+                now = time.time()
+                cursor = conn.execute(
+                    """UPDATE outbox SET status = 'ready', attempts = 0, visible_at = ?, updated_at = ?
+                       WHERE topic = ? AND status = 'dead'""",
+                    (now, now, topic)
+                )
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error requeueing dead outbox messages: {str(e)}")
+            raise
+
+    def create_user(self, user_id: str, setup_token: str, created_at: float) -> None:
+        """Сохранение нового пользователя"""
+        logger.info(f"Creating user {user_id}")
+        try:
+            with self.get_db() as conn:
+                conn.execute(
+                    "INSERT INTO users (id, setup_token, created_at) VALUES (?, ?, ?)",
+                    (user_id, setup_token, created_at)
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error creating user: {str(e)}")
+            raise
+
+    def get_user(self, column: str, value) -> Optional[dict]:
+        """Пользователь по id, setup_token или telegram_id"""
+        if column not in ("id", "setup_token", "telegram_id"):
+            raise ValueError(f"Unsupported user lookup column: {column}")
+        try:
+            with self.get_db() as conn:
+                row = conn.execute(
+                    f"SELECT id, setup_token, telegram_id, created_at FROM users WHERE {column} = ?",
+                    (value,)
+                ).fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error getting user: {str(e)}")
+            raise
+
+    def link_user_telegram(self, setup_token: str, telegram_id: int) -> Tuple[Optional[dict], List[dict]]:
+        """Привязка telegram_id к пользователю с токеном setup_token.
+
+        Если аккаунт Telegram был привязан к другому пользователю, привязка
+        переносится. Возвращает обновленного пользователя (None, если
+        токена нет) и пользователей, у которых привязка снята.
+        """
+        logger.info(f"Linking Telegram user {telegram_id} by setup token {setup_token[:8]}...")
+        try:
+            with self.get_db() as conn:
+                user = conn.execute(
+                    "SELECT id FROM users WHERE setup_token = ?", (setup_token,)
+                ).fetchone()
+                if user is None:
+                    return None, []
+                displaced = conn.execute(
+                    """UPDATE users SET telegram_id = NULL
+                       WHERE telegram_id = ? AND id != ?
+                       RETURNING id, setup_token, telegram_id, created_at""",
+                    (telegram_id, user['id'])
+                ).fetchall()
+                row = conn.execute(
+                    """UPDATE users SET telegram_id = ? WHERE id = ?
+                       RETURNING id, setup_token, telegram_id, created_at""",
+                    (telegram_id, user['id'])
+                ).fetchone()
+                conn.commit()
+                return dict(row), [dict(other) for other in displaced]
+        except Exception as e:
+            logger.error(f"Error linking Telegram user: {str(e)}")
+            raise
+
+    def save_user_channel(self, user_id: str, channel_id: int, channel_title: Optional[str]) -> None:
+        """Сохранение подтвержденного канала пользователя"""
+        logger.info(f"Saving channel {channel_id} for user {user_id}")
+        try:
+            with self.get_db() as conn:
+                conn.execute(
+                    """INSERT OR REPLACE INTO user_channels (user_id, channel_id, channel_title, verified_at)
+                       VALUES (?, ?, ?, ?)""",
+                    (user_id, channel_id, channel_title, time.time())
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving user channel: {str(e)}")
+            raise
+
+    def get_user_channel_ids(self, user_id: str) -> List[int]:
+        """Подтвержденные каналы пользователя"""
+        try:
+            with self.get_db() as conn:
+                rows = conn.execute(
+                    "SELECT channel_id FROM user_channels WHERE user_id = ?", (user_id,)
+                ).fetchall()
+                return [row['channel_id'] for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting user channels: {str(e)}")
+            raise
+
+    def save_channel_verification(self, channel_id: int, user_id: int, code: str) -> None:
+        """Сохранение запроса на подтверждение канала (заменяет предыдущий)"""
+        logger.info(f"Saving verification request for channel {channel_id}")
+        try:
+            with self.get_db() as conn:
+                conn.execute(
+                    """INSERT OR REPLACE INTO channel_verifications (channel_id, user_id, code, created_at)
+                       VALUES (?, ?, ?, ?)""",
+                    (channel_id, user_id, code, time.time())
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving channel verification: {str(e)}")
+            raise
+
+    def get_channel_verification(self, channel_id: int) -> Optional[dict]:
+        """Запрос на подтверждение канала: user_id, code и created_at"""
+        try:
+            with self.get_db() as conn:
+                row = conn.execute(
+                    "SELECT user_id, code, created_at FROM channel_verifications WHERE channel_id = ?",
+                    (channel_id,)
+                ).fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error getting channel verification: {str(e)}")
+            raise
+
+    def publish_cache_invalidations(self, cache: str, keys: List[str]) -> None:
+        """Запись ключей, которые другие процессы должны удалить из кэша cache"""
+        try:
+            with self.get_db() as conn:
+                now = time.time()
+                conn.executemany(
+                    "INSERT INTO cache_invalidations (cache, cache_key, created_at) VALUES (?, ?, ?)",
+                    [(cache, key, now) for key in keys]
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error publishing cache invalidations: {str(e)}")
+            raise
+
+    def get_cache_invalidations(self, cache: str, after_id: int) -> Tuple[int, List[str]]:
+        """Ключи кэша cache, инвалидированные после записи after_id, и id
+        последней записи журнала"""
+        try:
+            with self.get_db() as conn:
+                rows = conn.execute(
+                    "SELECT id, cache, cache_key FROM cache_invalidations WHERE id > ? ORDER BY id",
+                    (after_id,)
+                ).fetchall()
+                last_id = rows[-1]['id'] if rows else after_id
+                return last_id, [row['cache_key'] for row in rows if row['cache'] == cache]
+        except Exception as e:
+            logger.error(f"Error getting cache invalidations: {str(e)}")
+            raise
+
+    def get_last_cache_invalidation_id(self) -> int:
+        try:
+            with self.get_db() as conn:
+                return conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error getting last cache invalidation: {str(e)}")
+            raise
+
+    def prune_cache_invalidations(self, before: float) -> int:
+        """Удаление записей журнала инвалидации старше before"""
+        try:
+            with self.get_db() as conn:
+                cursor = conn.execute("DELETE FROM cache_invalidations WHERE created_at < ?", (before,))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error pruning cache invalidations: {str(e)}")
+            raise
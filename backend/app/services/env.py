@@ -0,0 +1,24 @@
+import os
+
+# Каталог, с которого начинается поиск .env (как у load_dotenv() без аргументов)
+_SEARCH_START = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_local_env() -> None:
+    """Загрузка переменных из ближайшего .env выше каталога app.
+
+    В контейнерах переменные передаются через env_file, и .env внутри
+    образа нет: python-dotenv тогда не импортируется вовсе. Уже заданные
+    переменные окружения не перезаписываются.
+    """
+    directory = _SEARCH_START
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
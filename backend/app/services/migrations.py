@@ -0,0 +1,363 @@
+import logging
+import sqlite3
+import time
+from typing import Callable, List, Tuple, Union
+
+from .text_utils import content_hash, simhash, to_signed64
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Шаг миграции: SQL-выражение или функция, получающая соединение
+Step = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+def _backfill_content_hash(conn: sqlite3.Connection) -> None:
+    """Заполнение content_hash для уже сохраненных постов"""
+    rows = conn.execute("SELECT post_id, content FROM posts").fetchall()
+    conn.executemany(
+        "UPDATE posts SET content_hash = ? WHERE post_id = ?",
+        [(content_hash(row[1]), row[0]) for row in rows]
+    )
+
+
+def _backfill_simhash(conn: sqlite3.Connection) -> None:
+    """Заполнение отпечатков уже сохраненных постов (полосы индекса
+    заполняет триггер)"""
+    rows = conn.execute("SELECT post_id, content FROM posts").fetchall()
+    conn.executemany(
+        "UPDATE posts SET simhash = ? WHERE post_id = ?",
+        [(to_signed64(simhash(row[1])), row[0]) for row in rows]
+    )
+
+
+def _backfill_settings_revision(conn: sqlite3.Connection) -> None:
+    """Ревизии уже сохраненных настроек каналов в порядке их изменения"""
+    rows = conn.execute("SELECT channel_id FROM channel_settings ORDER BY last_updated_at, channel_id").fetchall()
+    conn.executemany(
+        "UPDATE channel_settings SET revision = ? WHERE channel_id = ?",
+        [(revision, row[0]) for revision, row in enumerate(rows, start=1)]
+    )
+
+
+def _revision_triggers(table: str) -> List[str]:
+    """Триггеры, увеличивающие ревизию table в table_revisions при любом
+    изменении ее строк"""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_revision_{event.lower()} AFTER {event} ON {table}
+        BEGIN
+            UPDATE table_revisions SET revision = revision + 1 WHERE name = '{table}';
+        END
+        """
+        for event in ("INSERT", "UPDATE", "DELETE")
+    ]
+
+
+def _simhash_band_rows(row: str) -> str:
+    """Строки post_simhash_bands для OLD или NEW в триггере: 8 полос по
+    8 бит, как SIMHASH_BANDS в text_utils на момент миграции"""
+    return ", ".join(
+        f"({band}, ({row}.simhash >> {band * 8}) & 255, {row}.created_at, {row}.post_id)" for band in range(8)
+    )
+
+
+def _simhash_band_match(row: str) -> str:
+    """Условие на строки post_simhash_bands поста OLD или NEW (каждая
+    полоса ищется по первичному ключу)"""
+    return " OR ".join(f"(band = {band} AND value = ({row}.simhash >> {band * 8}) & 255)" for band in range(8))
+
+
+# Упорядоченный список миграций схемы: (версия, описание, шаги).
+# Уже примененные миграции не изменяются — любое изменение схемы
+# оформляется новой миграцией в конце списка.
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "initial schema", [
+        # Таблица временных токенов
+        """
+        CREATE TABLE IF NOT EXISTS temp_tokens (
+            token TEXT PRIMARY KEY,
+            timestamp FLOAT NOT NULL,
+            admin_id INTEGER NOT NULL
+        )
+        """,
+        # Таблица привязок телеграм аккаунтов
+        """
+        CREATE TABLE IF NOT EXISTS telegram_bindings (
+            telegram_user_id INTEGER PRIMARY KEY,
+            admin_id INTEGER NOT NULL,
+            created_at FLOAT NOT NULL
+        )
+        """,
+        # Таблица телеграм каналов
+        """
+        CREATE TABLE IF NOT EXISTS telegram_channels (
+            channel_id INTEGER PRIMARY KEY,
+            admin_id INTEGER NOT NULL,
+            channel_title TEXT NOT NULL,
+            created_at FLOAT NOT NULL
+        )
+        """,
+        # Таблица постов
+        """
+        CREATE TABLE IF NOT EXISTS posts (
+            post_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            created_at FLOAT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            FOREIGN KEY (channel_id) REFERENCES telegram_channels (channel_id)
+        )
+        """,
+        # Таблица настроек каналов
+        """
+        CREATE TABLE IF NOT EXISTS channel_settings (
+            channel_id INTEGER PRIMARY KEY,
+            auto_posting BOOLEAN NOT NULL DEFAULT 0,
+            post_interval INTEGER DEFAULT 3600,
+            created_at FLOAT NOT NULL,
+            last_updated_at FLOAT NOT NULL,
+            FOREIGN KEY (channel_id) REFERENCES telegram_channels (channel_id)
+        )
+        """,
+    ]),
+    (2, "unique post per channel message", [
+        # Дубликаты, оставшиеся от старой проверки SELECT + INSERT,
+        # удаляем до создания индекса
+        """
+        DELETE FROM posts WHERE post_id NOT IN (
+            SELECT MIN(post_id) FROM posts GROUP BY channel_id, message_id
+        )
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_channel_message
+        ON posts (channel_id, message_id)
+        """,
+    ]),
+    (3, "lookup indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_telegram_bindings_admin ON telegram_bindings (admin_id)",
+        "CREATE INDEX IF NOT EXISTS idx_telegram_channels_admin ON telegram_channels (admin_id)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_status_created ON posts (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_temp_tokens_timestamp ON temp_tokens (timestamp)",
+    ]),
+    (4, "post transformation state", [
+        "ALTER TABLE posts ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE posts ADD COLUMN next_attempt_at FLOAT NOT NULL DEFAULT 0",
+        "ALTER TABLE posts ADD COLUMN last_error TEXT",
+        "ALTER TABLE posts ADD COLUMN updated_at FLOAT",
+        # Результаты трансформации поста для каждой целевой платформы
+        """
+        CREATE TABLE IF NOT EXISTS post_transforms (
+            post_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at FLOAT NOT NULL,
+            PRIMARY KEY (post_id, platform),
+            FOREIGN KEY (post_id) REFERENCES posts (post_id)
+        )
+        """,
+    ]),
+    (5, "transform cache", [
+        """
+        CREATE TABLE IF NOT EXISTS transform_cache (
+            cache_key TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            created_at FLOAT NOT NULL,
+            last_used_at FLOAT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_transform_cache_last_used ON transform_cache (last_used_at)",
+        "CREATE INDEX IF NOT EXISTS idx_transform_cache_created ON transform_cache (created_at)",
+    ]),
+    (6, "post content hash and revision", [
+        "ALTER TABLE posts ADD COLUMN content_hash TEXT",
+        "ALTER TABLE posts ADD COLUMN revision INTEGER NOT NULL DEFAULT 0",
+        _backfill_content_hash,
+    ]),
+    (7, "auto-posting lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_channel_settings_updated ON channel_settings (last_updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_channel_status_created ON posts (channel_id, status, created_at)",
+    ]),
+    (8, "publishing outbox", [
+        # Очередь сообщений на публикацию. Захваченное сообщение остается
+        # в статусе ready, но получает lease и visible_at в будущем: если
+        # воркер не подтвердит его до visible_at, сообщение снова доступно.
+        # Сообщения, исчерпавшие попытки, переходят в dead
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'ready',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            visible_at FLOAT NOT NULL,
+            lease TEXT,
+            last_error TEXT,
+            created_at FLOAT NOT NULL,
+            updated_at FLOAT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_outbox_topic_status_visible ON outbox (topic, status, visible_at)",
+    ]),
+    (9, "users, user channels and cache invalidations", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            setup_token TEXT NOT NULL UNIQUE,
+            telegram_id INTEGER UNIQUE,
+            created_at FLOAT NOT NULL
+        )
+        """,
+        # Каналы, подтвержденные пользователем через пересылку поста
+        """
+        CREATE TABLE IF NOT EXISTS user_channels (
+            user_id TEXT NOT NULL,
+            channel_id INTEGER NOT NULL,
+            channel_title TEXT,
+            verified_at FLOAT NOT NULL,
+            PRIMARY KEY (user_id, channel_id)
+        )
+        """,
+        # Запросы на подтверждение владения каналом кодом
+        """
+        CREATE TABLE IF NOT EXISTS channel_verifications (
+            channel_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            created_at FLOAT NOT NULL
+        )
+        """,
+        # Журнал инвалидации кэшей: процессы читают записи новее последней
+        # прочитанной и удаляют соответствующие ключи из своих кэшей
+        """
+        CREATE TABLE IF NOT EXISTS cache_invalidations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cache TEXT NOT NULL,
+            cache_key TEXT NOT NULL,
+            created_at FLOAT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_cache_invalidations_created ON cache_invalidations (created_at)",
+    ]),
+    (10, "post simhash index", [
+        "ALTER TABLE posts ADD COLUMN simhash INTEGER",
+        # LSH-индекс по полосам отпечатка: посты, совпадающие с данным хотя
+        # бы в одной полосе, — кандидаты в почти-дубликаты. created_at в
+        # ключе ограничивает поиск недавними постами
+        """
+        CREATE TABLE IF NOT EXISTS post_simhash_bands (
+            band INTEGER NOT NULL,
+            value INTEGER NOT NULL,
+            created_at FLOAT NOT NULL,
+            post_id INTEGER NOT NULL,
+            PRIMARY KEY (band, value, created_at, post_id)
+        ) WITHOUT ROWID
+        """,
+        # Индекс обновляется триггерами при любой записи отпечатка
+        f"""
+        CREATE TRIGGER IF NOT EXISTS posts_simhash_insert AFTER INSERT ON posts
+        WHEN NEW.simhash IS NOT NULL
+        BEGIN
+            INSERT INTO post_simhash_bands (band, value, created_at, post_id)
+            VALUES {_simhash_band_rows("NEW")};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS posts_simhash_update AFTER UPDATE OF simhash ON posts
+        WHEN NEW.simhash IS NOT OLD.simhash
+        BEGIN
+            DELETE FROM post_simhash_bands
+            WHERE ({_simhash_band_match("OLD")})
+                AND created_at = OLD.created_at AND post_id = OLD.post_id;
+            INSERT INTO post_simhash_bands (band, value, created_at, post_id)
+            SELECT * FROM (VALUES {_simhash_band_rows("NEW")}) WHERE NEW.simhash IS NOT NULL;
+        END
+        """,
+        _backfill_simhash,
+    ]),
+    (11, "table revisions", [
+        # Счетчики изменений таблиц, общие для всех процессов. Кэши сверяют
+        # ревизию (одно чтение по ключу) вместо перечитывания таблицы
+        """
+        CREATE TABLE IF NOT EXISTS table_revisions (
+            name TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+        "INSERT OR IGNORE INTO table_revisions (name, revision) VALUES ('telegram_channels', 0)",
+        *_revision_triggers("telegram_channels"),
+    ]),
+    (12, "channel settings change cursor", [
+        # Ревизия строки берется из table_revisions в транзакции записи.
+        # Записи сериализуются, поэтому порядок ревизий совпадает с
+        # порядком коммитов, в отличие от last_updated_at
+        "ALTER TABLE channel_settings ADD COLUMN revision INTEGER NOT NULL DEFAULT 0",
+        _backfill_settings_revision,
+        """
+        INSERT OR IGNORE INTO table_revisions (name, revision)
+        SELECT 'channel_settings', COALESCE(MAX(revision), 0) FROM channel_settings
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_channel_settings_revision ON channel_settings (revision)",
+        "DROP INDEX IF EXISTS idx_channel_settings_updated",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at FLOAT NOT NULL
+        )
+    """)
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы (0, если миграции еще не применялись)"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    if not exists:
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """Применение недостающих миграций. Возвращает итоговую версию схемы.
+
+    Миграции выполняются под BEGIN IMMEDIATE, поэтому при одновременном
+    старте API и бота схему обновляет только один процесс, а второй после
+    ожидания блокировки видит уже актуальную версию.
+    """
+    if get_schema_version(conn) >= LATEST_VERSION:
+        logger.debug(f"Database schema is up to date (version {LATEST_VERSION})")
+        return LATEST_VERSION
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _ensure_version_table(conn)
+        current = get_schema_version(conn)
+        for version, name, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            logger.info(f"Applying migration {version}: {name}")
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, time.time())
+            )
+            current = version
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Database schema migrated to version {current}")
+    return current
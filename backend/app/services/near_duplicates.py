@@ -0,0 +1,110 @@
+import logging
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Iterable, Optional
+
+from .ai_service import PLATFORM_LIMITS
+from .db_service import DatabaseService
+from .metrics import REGISTRY
+from .text_utils import SIMHASH_BANDS, WORD_RE, hamming_distance, simhash
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Правка пары слов в посте из ~50 слов дает расстояние 2-6, несвязанные
+# посты расходятся на 16 бит и больше. Расстояния до SIMHASH_BANDS - 1
+# индекс находит всегда, большие — только при совпадении какой-то полосы
+DEFAULT_MAX_DISTANCE = 6
+# Дубликаты ищутся среди постов за последние DEFAULT_WINDOW секунд
+DEFAULT_WINDOW = 3 * 24 * 3600
+
+near_duplicate_lookups = REGISTRY.counter(
+    "near_duplicate_lookups_total", "Near-duplicate lookups by result (reused, patched, miss)", ("result",)
+)
+
+
+def patch_transform(source: str, target: str, transformed: str) -> Optional[str]:
+    """Перенос правок исходного текста в готовую трансформацию.
+
+    Слова, замененные в target относительно source (дата, время, ссылка,
+    название), заменяются и в transformed. Если старый вариант встречается
+    в transformed не ровно один раз, правку нельзя перенести однозначно, и
+    возвращается None. Вставленные или удаленные слова («не», «отменено»)
+    могут поменять смысл поста на противоположный, а места для них в
+    transformed не найти, поэтому для таких правок тоже возвращается None,
+    как и для замены на другое число слов: она скрывает вставку или
+    удаление.
+    """
+    old_words = WORD_RE.findall(source)
+    new_words = WORD_RE.findall(target)
+    matcher = SequenceMatcher(None, old_words, new_words, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if tag != "replace" or i2 - i1 != j2 - j1:
+            return None
+        pattern = re.compile(r"(?<!\w)" + r"\W+".join(map(re.escape, old_words[i1:i2])) + r"(?!\w)")
+        if len(pattern.findall(transformed)) != 1:
+            return None
+        replacement = " ".join(new_words[j1:j2])
+        transformed = pattern.sub(lambda match: replacement, transformed)
+    return transformed
+
+
+class NearDuplicateIndex:
+    """Поиск уже трансформированных почти-дубликатов поста.
+
+    Кандидаты берутся из LSH-индекса по полосам SimHash (таблица
+    post_simhash_bands, заполняется при сохранении поста), затем
+    отбираются по расстоянию Хэмминга не больше max_distance. Результаты
+    ближайшего кандидата, у которого есть варианты для всех платформ,
+    переносятся на новый пост с заменой измененных слов.
+    """
+
+    def __init__(self, db: DatabaseService, max_distance: int = DEFAULT_MAX_DISTANCE,
+                 window: float = DEFAULT_WINDOW):
+        self.db = db
+        self.max_distance = max_distance
+        self.window = window
+        if max_distance >= SIMHASH_BANDS:
+            logger.warning(f"Near-duplicate distance {max_distance} exceeds guaranteed LSH recall "
+                           f"({SIMHASH_BANDS - 1}), some duplicates will be missed")
+
+    def find_duplicate(self, post: dict, platforms: Iterable[str]) -> Optional[dict]:
+        """Почти-дубликат поста (post_id, content и, если есть, simhash).
+
+        Возвращает словарь с post_id и distance найденного поста и
+        transforms — его трансформациями, перенесенными на пост, или None.
+        """
+        platforms = list(platforms)
+        fingerprint = post.get("simhash")
+        if fingerprint is None:
+            fingerprint = simhash(post["content"])
+        candidates = self.db.find_similar_posts(post["post_id"], fingerprint, time.time() - self.window)
+        ranked = sorted(
+            (hamming_distance(fingerprint, candidate["simhash"]), -candidate["post_id"], candidate)
+            for candidate in candidates
+        )
+        for distance, _, candidate in ranked:
+            if distance > self.max_distance:
+                break
+            transforms = self.db.get_post_transforms(candidate["post_id"])
+            if not all(platform in transforms for platform in platforms):
+                continue
+            patched = {
+                platform: patch_transform(candidate["content"], post["content"], transforms[platform])
+                for platform in platforms
+            }
+            if any(text is None for text in patched.values()):
+                # Правку нельзя перенести, трансформация кандидата не подходит
+                continue
+            if any(len(text) > PLATFORM_LIMITS.get(platform, len(text)) for platform, text in patched.items()):
+                continue
+            result = "reused" if all(patched[p] == transforms[p] for p in platforms) else "patched"
+            near_duplicate_lookups.inc(result)
+            logger.info(f"Post {post['post_id']} is a near-duplicate of post {candidate['post_id']} "
+                        f"(distance {distance}), transforms {result}")
+            return {"post_id": candidate["post_id"], "distance": distance, "transforms": patched}
+        near_duplicate_lookups.inc("miss")
+        return None
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from .batch_worker import BatchWorker
+from .db_service import DatabaseService
+from .metrics import REGISTRY
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_BACKOFF = 5.0
+MAX_BACKOFF = 600.0
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_CONCURRENCY = 4
+DEFAULT_POLL_INTERVAL = 2.0
+
+outbox_messages = REGISTRY.counter(
+    "outbox_messages_total", "Outbox messages by topic and outcome (acked, retry, dead, lost)", ("topic", "result")
+)
+
+
+class Outbox:
+    """Надежная очередь сообщений на публикацию поверх таблицы outbox.
+
+    claim_batch() захватывает сообщения на время аренды: пока она не
+    истекла, их не получит никто другой, а после истечения (воркер упал
+    или завис) они снова доступны любому процессу. Каждый захват получает
+    свой идентификатор аренды, поэтому ack() и nack() от воркера, чья
+    аренда уже истекла, ничего не меняют.
+
+    Сообщение, не обработанное за max_attempts захватов, переходит в dead
+    и ждет ручного requeue_dead().
+    """
+
+    def __init__(self, db: DatabaseService, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_backoff: float = DEFAULT_BASE_BACKOFF):
+        self.db = db
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+
+    async def enqueue(self, topic: str, payload: dict, delay: float = 0) -> int:
+        ids = await asyncio.to_thread(self.db.enqueue_outbox, [(topic, payload)], delay)
+        return ids[0]
+
+    async def enqueue_batch(self, messages: List[Tuple[str, dict]]) -> List[int]:
+        """Постановка нескольких сообщений (тема, payload) одной транзакцией"""
+        return await asyncio.to_thread(self.db.enqueue_outbox, messages)
+
+    async def claim_batch(self, topic: str, limit: int = DEFAULT_BATCH_SIZE,
+                          lease_seconds: float = DEFAULT_LEASE_SECONDS) -> List[dict]:
+        """Захват до limit сообщений: словари с id, payload, attempts и lease"""
+        return await asyncio.to_thread(self.db.claim_outbox, topic, limit, lease_seconds, uuid.uuid4().hex,
+                                       self.max_attempts)
+
+    async def ack(self, message: dict) -> bool:
+        """Подтверждение обработки (сообщение удаляется)"""
+        acked = await asyncio.to_thread(self.db.ack_outbox, message["id"], message["lease"])
+        outbox_messages.inc(message["topic"], "acked" if acked else "lost")
+        if not acked:
+            logger.warning(f"Lease of outbox message {message['id']} expired before ack, "
+                           f"it may be processed again")
+        return acked
+
+    async def ack_batch(self, messages: List[dict]) -> int:
+        """Подтверждение сообщений одного захвата одной транзакцией"""
+        if not messages:
+            return 0
+        acked = await asyncio.to_thread(self.db.ack_outbox_batch, [message["id"] for message in messages],
+                                        messages[0]["lease"])
+        topic = messages[0]["topic"]
+        outbox_messages.inc(topic, "acked", amount=acked)
+        if acked < len(messages):
+            outbox_messages.inc(topic, "lost", amount=len(messages) - acked)
+            logger.warning(f"Leases of {len(messages) - acked} outbox messages from {topic} expired "
+                           f"before ack, they may be processed again")
+        return acked
+
+    async def nack(self, message: dict, error: str, retry: bool = True) -> bool:
+        """Возврат сообщения с отложенным повтором или, после max_attempts
+        попыток или с retry=False, в dead"""
+        if retry and message["attempts"] < self.max_attempts:
+            delay = random.uniform(0, min(MAX_BACKOFF, self.base_backoff * 2 ** message["attempts"]))
+            retry_at = time.time() + delay
+            result = "retry"
+        else:
+            retry_at = None
+            result = "dead"
+            logger.error(f"Outbox message {message['id']} moved to dead letters "
+                         f"after {message['attempts']} attempts: {error}")
+        returned = await asyncio.to_thread(self.db.nack_outbox, message["id"], message["lease"], error, retry_at)
+        outbox_messages.inc(message["topic"], result if returned else "lost")
+        return returned
+
+    async def release_leases(self, topic: str) -> int:
+        """Возврат захваченных сообщений темы в очередь (см.
+        DatabaseService.release_outbox_leases)"""
+        return await asyncio.to_thread(self.db.release_outbox_leases, topic)
+
+    async def pending(self, topic: str, limit: int = 100) -> List[dict]:
+        return await asyncio.to_thread(self.db.get_outbox_messages, topic, 'ready', limit)
+
+    async def dead_letters(self, topic: str, limit: int = 100) -> List[dict]:
+        return await asyncio.to_thread(self.db.get_outbox_messages, topic, 'dead', limit)
+
+    async def requeue_dead(self, topic: str) -> int:
+        return await asyncio.to_thread(self.db.requeue_dead_outbox, topic)
+
+    async def delete(self, message_id: int) -> None:
+        await asyncio.to_thread(self.db.delete_outbox_message, message_id)
+
+
+class OutboxWorker(BatchWorker):
+    """Воркер, обрабатывающий сообщения одной темы outbox.
+
+    Забирает сообщения пачками и передает payload в handler не более чем
+    concurrency задачами одновременно. Успешно обработанные сообщения
+    подтверждаются, при исключении сообщение возвращается с повтором.
+    Воркеров одной темы можно запускать в нескольких процессах: каждое
+    сообщение получит один из них. lease_seconds должен превышать время
+    обработки одного сообщения, иначе оно может быть обработано дважды.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        topic: str,
+        handler: Callable[[dict], Awaitable[None]],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        super().__init__(f"outbox worker for {topic}", concurrency, poll_interval)
+        self.outbox = outbox
+        self.topic = topic
+        self.handler = handler
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+
+    async def _claim(self) -> List[dict]:
+        return await self.outbox.claim_batch(self.topic, self.batch_size, self.lease_seconds)
+
+    async def _process(self, message: dict) -> None:
+        try:
+            await self.handler(message["payload"])
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error processing outbox message {message['id']} "
+                         f"(attempt {message['attempts']}): {str(e)}")
+            try:
+                await self.outbox.nack(message, str(e))
+            except Exception as db_error:
+                # Сообщение вернется в очередь по истечении аренды
+                logger.error(f"Error returning outbox message {message['id']}: {str(db_error)}")
+            return
+        self.processed += 1
+        try:
+            await self.outbox.ack(message)
+        except Exception as e:
+            logger.error(f"Error acknowledging outbox message {message['id']}: {str(e)}")
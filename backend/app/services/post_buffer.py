@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from .db_service import DatabaseService
+from .metrics import REGISTRY
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_MAX_PENDING = 10000
+
+post_buffer_flush_duration = REGISTRY.histogram(
+    "post_buffer_flush_duration_seconds", "Post buffer batch write latency"
+)
+post_buffer_posts = REGISTRY.counter(
+    "post_buffer_posts_total", "Buffered posts written to the DB by outcome", ("result",)
+)
+
+
+class PostBuffer:
+    """Буфер входящих постов с отложенной пакетной записью в БД.
+
+    Посты копятся в памяти и сбрасываются одним executemany, когда
+    набирается batch_size постов или проходит flush_interval секунд с
+    момента запуска предыдущего сброса. При max_pending постов в буфере
+    put() дожидается записи, ограничивая потребление памяти.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseService,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[Tuple[int, int, str, float]] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Запуск фоновой задачи, сбрасывающей буфер по времени и размеру"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Post buffer started (batch_size={self.batch_size}, "
+                        f"flush_interval={self.flush_interval}s)")
+
+    async def put(self, channel_id: int, message_id: int, content: str) -> None:
+        """Добавление поста в буфер"""
+        if self._closed:
+            raise RuntimeError("Post buffer is closed")
+        self._pending.append((channel_id, message_id, content, time.time()))
+        if len(self._pending) >= self.max_pending:
+            logger.warning(f"Post buffer is full ({len(self._pending)} posts), flushing inline")
+            await self.flush()
+        elif len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Запись всех накопленных постов. Возвращает количество новых постов"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            try:
+                with post_buffer_flush_duration.time():
+                    written = await asyncio.to_thread(self.db.save_posts, batch)
+                post_buffer_posts.inc("written", amount=written)
+                post_buffer_posts.inc("unchanged", amount=len(batch) - written)
+                return written
+            except Exception as e:
+                # Возвращаем пакет в начало буфера, чтобы повторить при следующем сбросе
+                self._pending[:0] = batch
+                logger.error(f"Error flushing {len(batch)} buffered posts: {str(e)}")
+                raise
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Ошибка уже залогирована, посты остались в буфере
+                if not self._closed:
+                    await asyncio.sleep(self.flush_interval)
+
+    async def close(self) -> None:
+        """Остановка фоновой задачи и гарантированный сброс оставшихся постов"""
+        self._closed = True
+        if self._task is not None:
+            # Будим задачу, она выполнит последний сброс и завершится
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        logger.info("Post buffer closed")
@@ -0,0 +1,450 @@
+import logging
+import time
+from typing import List, Optional, Tuple
+
+import asyncpg
+
+from .db_service import db_method_duration
+from .metrics import timed_methods
+from .storage import Storage
+from .text_utils import content_hash, simhash, to_signed64
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_POOL_SIZE = 2
+DEFAULT_MAX_POOL_SIZE = 10
+# Размер кэша подготовленных выражений на соединение
+STATEMENT_CACHE_SIZE = 256
+# Ключ advisory-блокировки, под которой создается схема: узлы, стартующие
+# одновременно, не конфликтуют на CREATE TABLE
+SCHEMA_LOCK_KEY = 0x63726f7373
+
+# Схема соответствует таблицам SQLite, которые использует Storage.
+# Внешних ключей нет, как и в SQLite (там они не включены): посты приходят
+# и из каналов, привязка которых уже удалена
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS temp_tokens (
+        token TEXT PRIMARY KEY,
+        timestamp DOUBLE PRECISION NOT NULL,
+        admin_id BIGINT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_temp_tokens_timestamp ON temp_tokens (timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS telegram_bindings (
+        telegram_user_id BIGINT PRIMARY KEY,
+        admin_id BIGINT NOT NULL,
+        created_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_telegram_bindings_admin ON telegram_bindings (admin_id)",
+    """
+    CREATE TABLE IF NOT EXISTS telegram_channels (
+        channel_id BIGINT PRIMARY KEY,
+        admin_id BIGINT NOT NULL,
+        channel_title TEXT NOT NULL,
+        created_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_telegram_channels_admin ON telegram_channels (admin_id)",
+    """
+    CREATE TABLE IF NOT EXISTS posts (
+        post_id BIGSERIAL PRIMARY KEY,
+        channel_id BIGINT NOT NULL,
+        message_id BIGINT NOT NULL,
+        content TEXT NOT NULL,
+        content_hash TEXT,
+        simhash BIGINT,
+        revision INTEGER NOT NULL DEFAULT 0,
+        created_at DOUBLE PRECISION NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at DOUBLE PRECISION NOT NULL DEFAULT 0,
+        last_error TEXT,
+        updated_at DOUBLE PRECISION,
+        UNIQUE (channel_id, message_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_posts_status_created ON posts (status, created_at)",
+    # Отпечаток SimHash для поиска почти-дубликатов (для уже созданных баз)
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS simhash BIGINT",
+    """
+    CREATE TABLE IF NOT EXISTS transform_cache (
+        cache_key TEXT PRIMARY KEY,
+        content TEXT NOT NULL,
+        created_at DOUBLE PRECISION NOT NULL,
+        last_used_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_transform_cache_last_used ON transform_cache (last_used_at)",
+    "CREATE INDEX IF NOT EXISTS idx_transform_cache_created ON transform_cache (created_at)",
+]
+
+
+def _validate_admin_id(admin_id: int) -> None:
+    if not isinstance(admin_id, int) or admin_id <= 0:
+        logger.error(f"Invalid admin_id: {admin_id}")
+        raise ValueError(f"Invalid admin_id: {admin_id}. Must be a positive integer.")
+
+
+def _affected_rows(status: str) -> int:
+    """Число строк из статуса команды asyncpg ("DELETE 3")"""
+    return int(status.rsplit(" ", 1)[-1])
+
+
+@timed_methods(db_method_duration, exclude=("start", "close"))
+class PostgresStorage(Storage):
+    """Хранилище API в PostgreSQL для развертывания на нескольких узлах.
+
+    Запросы идут через пул соединений asyncpg. asyncpg подготавливает
+    каждое выражение на сервере при первом выполнении и держит его в кэше
+    соединения, поэтому повторные запросы не разбираются и не планируются
+    заново. Схема создается в start() под advisory-блокировкой.
+    """
+
+    def __init__(self, dsn: str, min_size: int = DEFAULT_MIN_POOL_SIZE,
+                 max_size: int = DEFAULT_MAX_POOL_SIZE):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool: Optional[asyncpg.Pool] = None
+
+    async def start(self) -> None:
+        """Создание пула соединений и схемы"""
+        if self._pool is not None:
+            return
+        logger.info(f"Connecting to PostgreSQL (pool {self.min_size}-{self.max_size})")
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=STATEMENT_CACHE_SIZE,
+        )
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_KEY)
+                    for statement in SCHEMA:
+                        await conn.execute(statement)
+            logger.info("PostgreSQL schema initialized successfully")
+        except Exception as e:
+            logger.error(f"Error initializing PostgreSQL schema: {str(e)}")
+            await self.close()
+            raise
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    @property
+    def pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            raise RuntimeError("PostgresStorage is not started")
+        return self._pool
+
+    async def save_token(self, token: str, admin_id: int) -> None:
+        """Сохранение временного токена"""
+        _validate_admin_id(admin_id)
+        logger.info(f"Saving temporary token for admin_id: {admin_id}")
+        try:
+            await self.pool.execute(
+                "INSERT INTO temp_tokens (token, timestamp, admin_id) VALUES ($1, $2, $3)",
+                token, time.time(), admin_id
+            )
+        except Exception as e:
+            logger.error(f"Error saving token: {str(e)}")
+            raise
+
+    async def get_token_data(self, token: str) -> Optional[Tuple[float, int]]:
+        """Получение данных токена"""
+        try:
+            row = await self.pool.fetchrow(
+                "SELECT timestamp, admin_id FROM temp_tokens WHERE token = $1", token
+            )
+            return (row['timestamp'], row['admin_id']) if row else None
+        except Exception as e:
+            logger.error(f"Error getting token data: {str(e)}")
+            raise
+
+    async def consume_token(self, token: str) -> Optional[Tuple[float, int]]:
+        """Атомарное получение и удаление токена"""
+        logger.info(f"Consuming token: {token[:8]}...")
+        try:
+            row = await self.pool.fetchrow(
+                "DELETE FROM temp_tokens WHERE token = $1 RETURNING timestamp, admin_id", token
+            )
+            return (row['timestamp'], row['admin_id']) if row else None
+        except Exception as e:
+            logger.error(f"Error consuming token: {str(e)}")
+            raise
+
+    async def delete_token(self, token: str) -> None:
+        """Удаление использованного токена"""
+        try:
+            await self.pool.execute("DELETE FROM temp_tokens WHERE token = $1", token)
+        except Exception as e:
+            logger.error(f"Error deleting token: {str(e)}")
+            raise
+
+    async def cleanup_expired_tokens(self, expiry_seconds: int = 600) -> None:
+        """Очистка просроченных токенов"""
+        try:
+            await self.pool.execute(
+                "DELETE FROM temp_tokens WHERE timestamp < $1", time.time() - expiry_seconds
+            )
+        except Exception as e:
+            logger.error(f"Error cleaning up expired tokens: {str(e)}")
+            raise
+
+    async def save_telegram_binding(self, telegram_user_id: int, admin_id: int) -> None:
+        """Сохранение привязки Telegram к админу"""
+        _validate_admin_id(admin_id)
+        logger.info(f"Saving Telegram binding for user_id: {telegram_user_id}, admin_id: {admin_id}")
+        try:
+            await self.pool.execute(
+                """INSERT INTO telegram_bindings (telegram_user_id, admin_id, created_at)
+                   VALUES ($1, $2, $3)
+                   ON CONFLICT (telegram_user_id) DO UPDATE SET
+                       admin_id = EXCLUDED.admin_id, created_at = EXCLUDED.created_at""",
+                telegram_user_id, admin_id, time.time()
+            )
+        except Exception as e:
+            logger.error(f"Error saving Telegram binding: {str(e)}")
+            raise
+
+    async def get_admin_id_by_telegram(self, telegram_user_id: int) -> Optional[int]:
+        """Получение admin_id по telegram_user_id"""
+        try:
+            return await self.pool.fetchval(
+                "SELECT admin_id FROM telegram_bindings WHERE telegram_user_id = $1", telegram_user_id
+            )
+        except Exception as e:
+            logger.error(f"Error getting admin_id by telegram: {str(e)}")
+            raise
+
+    async def get_telegram_user_by_admin(self, admin_id: int) -> Optional[int]:
+        """Получение telegram_user_id по admin_id"""
+        try:
+            return await self.pool.fetchval(
+                "SELECT telegram_user_id FROM telegram_bindings WHERE admin_id = $1 LIMIT 1", admin_id
+            )
+        except Exception as e:
+            logger.error(f"Error getting telegram user by admin: {str(e)}")
+            raise
+
+    async def remove_telegram_binding(self, admin_id: int) -> None:
+        """Удаление привязки Telegram"""
+        logger.info(f"Removing Telegram binding for admin_id: {admin_id}")
+        try:
+            await self.pool.execute("DELETE FROM telegram_bindings WHERE admin_id = $1", admin_id)
+        except Exception as e:
+            logger.error(f"Error removing telegram binding: {str(e)}")
+            raise
+
+    async def remove_all_telegram_bindings(self, admin_id: int) -> None:
+        """Удаление всех привязок Telegram (аккаунт и каналы)"""
+        logger.info(f"Removing all Telegram bindings for admin_id: {admin_id}")
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute("DELETE FROM telegram_bindings WHERE admin_id = $1", admin_id)
+                    await conn.execute("DELETE FROM telegram_channels WHERE admin_id = $1", admin_id)
+        except Exception as e:
+            logger.error(f"Error removing all telegram bindings: {str(e)}")
+            raise
+
+    async def get_admin_state(self, admin_id: int) -> dict:
+        """Привязка Telegram и канал админа одним запросом"""
+        try:
+            row = await self.pool.fetchrow(
+                """SELECT b.telegram_user_id, c.channel_id, c.channel_title
+                   FROM (SELECT $1::BIGINT AS admin_id) AS a
+                   LEFT JOIN telegram_bindings AS b ON b.admin_id = a.admin_id
+                   LEFT JOIN telegram_channels AS c ON c.admin_id = a.admin_id
+                   LIMIT 1""",
+                admin_id
+            )
+            return dict(row)
+        except Exception as e:
+            logger.error(f"Error getting admin state: {str(e)}")
+            raise
+
+    async def save_channel_binding(self, admin_id: int, channel_id: int, channel_title: str) -> None:
+        """Сохранение привязки канала"""
+        _validate_admin_id(admin_id)
+        logger.info(f"Saving channel binding for admin_id: {admin_id}, channel_id: {channel_id}")
+        try:
+            await self.pool.execute(
+                """INSERT INTO telegram_channels (channel_id, admin_id, channel_title, created_at)
+                   VALUES ($1, $2, $3, $4)
+                   ON CONFLICT (channel_id) DO UPDATE SET
+                       admin_id = EXCLUDED.admin_id,
+                       channel_title = EXCLUDED.channel_title,
+                       created_at = EXCLUDED.created_at""",
+                channel_id, admin_id, channel_title, time.time()
+            )
+        except Exception as e:
+            logger.error(f"Error saving channel binding: {str(e)}")
+            raise
+
+    async def get_channel_by_id(self, channel_id: int) -> Optional[dict]:
+        """Получение информации о канале по его ID"""
+        try:
+            row = await self.pool.fetchrow(
+                """SELECT channel_id, admin_id, channel_title, created_at
+                   FROM telegram_channels WHERE channel_id = $1""",
+                channel_id
+            )
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error getting channel by id: {str(e)}")
+            raise
+
+    async def is_channel_linked(self, channel_id: int) -> bool:
+        """Проверка, привязан ли канал"""
+        try:
+            return await self.pool.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM telegram_channels WHERE channel_id = $1)", channel_id
+            )
+        except Exception as e:
+            logger.error(f"Error checking channel link status: {str(e)}")
+            raise
+
+    async def has_linked_channel(self, telegram_user_id: int) -> bool:
+        """Проверка наличия привязанного канала у telegram пользователя"""
+        try:
+            return await self.pool.fetchval(
+                """SELECT EXISTS (
+                       SELECT 1 FROM telegram_bindings AS b
+                       JOIN telegram_channels AS c ON c.admin_id = b.admin_id
+                       WHERE b.telegram_user_id = $1
+                   )""",
+                telegram_user_id
+            )
+        except Exception as e:
+            logger.error(f"Error checking linked channel status: {str(e)}")
+            raise
+
+    async def get_user_channels(self, telegram_user_id: int) -> list:
+        """Получение списка всех каналов пользователя"""
+        try:
+            rows = await self.pool.fetch(
+                """SELECT c.channel_id, c.channel_title, c.created_at
+                   FROM telegram_bindings AS b
+                   JOIN telegram_channels AS c ON c.admin_id = b.admin_id
+                   WHERE b.telegram_user_id = $1""",
+                telegram_user_id
+            )
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting user channels: {str(e)}")
+            raise
+
+    async def has_channel_by_admin_id(self, admin_id: int) -> bool:
+        """Проверка наличия канала у админа по admin_id"""
+        try:
+            return await self.pool.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM telegram_channels WHERE admin_id = $1)", admin_id
+            )
+        except Exception as e:
+            logger.error(f"Error checking channel existence for admin_id: {str(e)}")
+            raise
+
+    async def remove_channel_binding(self, admin_id: int) -> None:
+        """Удаление привязки канала"""
+        logger.info(f"Removing channel binding for admin_id: {admin_id}")
+        try:
+            await self.pool.execute("DELETE FROM telegram_channels WHERE admin_id = $1", admin_id)
+        except Exception as e:
+            logger.error(f"Error removing channel binding: {str(e)}")
+            raise
+
+    async def get_channel_ids(self) -> List[int]:
+        """Получение списка всех привязанных channel_id"""
+        try:
+            rows = await self.pool.fetch("SELECT channel_id FROM telegram_channels")
+            return [row['channel_id'] for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting channel IDs: {str(e)}")
+            raise
+
+    async def save_post(self, channel_id: int, message_id: int, content: str) -> None:
+        """Сохранение нового или отредактированного поста из канала (правка
+        без изменения текста пропускается)"""
+        logger.info(f"Saving post from channel {channel_id}, message_id: {message_id}")
+        try:
+            await self.pool.execute(
+                """INSERT INTO posts (channel_id, message_id, content, content_hash, simhash, created_at, status)
+                   VALUES ($1, $2, $3, $4, $5, $6, 'pending')
+                   ON CONFLICT (channel_id, message_id) DO UPDATE SET
+                       content = EXCLUDED.content,
+                       content_hash = EXCLUDED.content_hash,
+                       simhash = EXCLUDED.simhash,
+                       revision = posts.revision + 1,
+                       status = 'pending',
+                       attempts = 0,
+                       next_attempt_at = 0,
+                       last_error = NULL,
+                       updated_at = EXCLUDED.created_at
+                   WHERE posts.content_hash IS DISTINCT FROM EXCLUDED.content_hash""",
+                channel_id, message_id, content, content_hash(content), to_signed64(simhash(content)), time.time()
+            )
+        except Exception as e:
+            logger.error(f"Error saving post: {str(e)}")
+            raise
+
+    async def get_cached_transform(self, cache_key: str, min_created_at: float) -> Optional[str]:
+        """Получение результата трансформации из кэша (не старше min_created_at)"""
+        try:
+            return await self.pool.fetchval(
+                """UPDATE transform_cache SET last_used_at = $3
+                   WHERE cache_key = $1 AND created_at >= $2
+                   RETURNING content""",
+                cache_key, min_created_at, time.time()
+            )
+        except Exception as e:
+            logger.error(f"Error getting cached transform: {str(e)}")
+            raise
+
+    async def save_cached_transform(self, cache_key: str, content: str) -> None:
+        """Сохранение результата трансформации в кэш"""
+        try:
+            now = time.time()
+            await self.pool.execute(
+                """INSERT INTO transform_cache (cache_key, content, created_at, last_used_at)
+                   VALUES ($1, $2, $3, $3)
+                   ON CONFLICT (cache_key) DO UPDATE SET
+                       content = EXCLUDED.content,
+                       created_at = EXCLUDED.created_at,
+                       last_used_at = EXCLUDED.last_used_at""",
+                cache_key, content, now
+            )
+        except Exception as e:
+            logger.error(f"Error saving cached transform: {str(e)}")
+            raise
+
+    async def evict_cached_transforms(self, max_entries: int, min_created_at: float) -> int:
+        """Удаление просроченных записей кэша и самых давно использованных сверх max_entries"""
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    expired = _affected_rows(await conn.execute(
+                        "DELETE FROM transform_cache WHERE created_at < $1", min_created_at
+                    ))
+                    excess = _affected_rows(await conn.execute(
+                        """DELETE FROM transform_cache WHERE cache_key IN (
+                               SELECT cache_key FROM transform_cache
+                               ORDER BY last_used_at DESC
+                               OFFSET $1
+                           )""",
+                        max_entries
+                    ))
+            if expired or excess:
+                logger.info(f"Evicted {expired} expired and {excess} excess cached transforms")
+            return expired + excess
+        except Exception as e:
+            logger.error(f"Error evicting cached transforms: {str(e)}")
+            raise
@@ -0,0 +1,184 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .db_service import DatabaseService
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+DEFAULT_PUBLISH_WORKERS = 4
+# Как часто перечитывать изменения channel_settings (их может менять API)
+DEFAULT_REFRESH_INTERVAL = 30.0
+
+
+class AutoPostScheduler:
+    """Планировщик автопостинга по настройкам channel_settings.
+
+    Каналы с auto_posting хранятся в min-куче по времени следующей
+    публикации: постановка и извлечение стоят O(log n), а цикл спит до
+    ближайшего срока, а не опрашивает все каналы. Измененные настройки
+    подхватываются инкрементально по ревизии строки; устаревшие записи
+    кучи не удаляются сразу, а пропускаются по номеру поколения.
+    Наступившие сроки передаются пулу из workers задач, вызывающих publish.
+
+    Время берется из clock, поэтому apply_settings/pop_due/next_deadline
+    можно проверять с подставными часами без event loop.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseService,
+        publish: Callable[[int], Awaitable[None]],
+        workers: int = DEFAULT_PUBLISH_WORKERS,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.db = db
+        self.publish = publish
+        self.workers = workers
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._heap: List[Tuple[float, int, int]] = []
+        # channel_id -> (интервал, поколение, время следующей публикации)
+        self._channels: Dict[int, Tuple[int, int, float]] = {}
+        self._generation = 0
+        self._since = 0
+        self._in_flight: Set[int] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.dispatched = 0
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def apply_settings(self, rows: Iterable[dict], now: Optional[float] = None) -> None:
+        """Применение измененных строк channel_settings"""
+        now = self.clock() if now is None else now
+        for row in rows:
+            channel_id = row["channel_id"]
+            interval = row["post_interval"] or 0
+            current = self._channels.get(channel_id)
+            if not row["auto_posting"] or interval <= 0:
+                self._channels.pop(channel_id, None)
+                continue
+            if current is None:
+                # Разносим первые публикации по интервалу, чтобы после
+                # запуска все каналы не срабатывали одновременно
+                fire_at = now + channel_id % interval
+            elif current[0] == interval:
+                continue
+            else:
+                fire_at = min(current[2], now + interval)
+            self._generation += 1
+            self._channels[channel_id] = (interval, self._generation, fire_at)
+            heapq.heappush(self._heap, (fire_at, channel_id, self._generation))
+
+        # Пересобираем кучу, если устаревших записей стало больше живых
+        if len(self._heap) > 2 * len(self._channels) + 1024:
+            self._heap = [(fire_at, channel_id, generation)
+                          for channel_id, (_, generation, fire_at) in self._channels.items()]
+            heapq.heapify(self._heap)
+
+    def _is_live(self, entry: Tuple[float, int, int]) -> bool:
+        current = self._channels.get(entry[1])
+        return current is not None and current[1] == entry[2]
+
+    def next_deadline(self) -> Optional[float]:
+        """Время ближайшей публикации или None, если каналов нет"""
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> List[int]:
+        """Каналы, срок публикации которых наступил, с переносом на следующий интервал"""
+        now = self.clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._is_live(entry):
+                continue
+            fire_at, channel_id, generation = entry
+            interval = self._channels[channel_id][0]
+            next_fire = fire_at + interval
+            if next_fire <= now:
+                # После простоя не наверстываем пропущенные публикации
+                next_fire = now + interval
+            self._channels[channel_id] = (interval, generation, next_fire)
+            heapq.heappush(self._heap, (next_fire, channel_id, generation))
+            due.append(channel_id)
+        return due
+
+    async def refresh(self) -> int:
+        """Загрузка настроек, измененных с прошлого обновления"""
+        rows = await asyncio.to_thread(self.db.get_channel_settings_changes, self._since)
+        if rows:
+            self.apply_settings(rows)
+            self._since = rows[-1]["revision"]
+            logger.info(f"Auto-posting settings updated for {len(rows)} channels, "
+                        f"{len(self._channels)} channels scheduled")
+        return len(rows)
+
+    def notify(self) -> None:
+        """Сигнал об изменении настроек: перечитать их, не дожидаясь refresh_interval"""
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        """Основной цикл планировщика (до вызова stop())"""
+        self._queue = asyncio.Queue()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Auto-posting scheduler started ({self.workers} publish workers)")
+        next_refresh = 0.0
+        try:
+            while not self._stopping:
+                if self._wakeup.is_set() or self.clock() >= next_refresh:
+                    self._wakeup.clear()
+                    try:
+                        await self.refresh()
+                    except Exception as e:
+                        logger.error(f"Error refreshing auto-posting settings: {str(e)}")
+                    next_refresh = self.clock() + self.refresh_interval
+
+                for channel_id in self.pop_due():
+                    if channel_id in self._in_flight:
+                        # Предыдущая публикация еще идет, этот срок пропускаем
+                        self.skipped += 1
+                        continue
+                    self._in_flight.add(channel_id)
+                    self._queue.put_nowait(channel_id)
+                    self.dispatched += 1
+
+                wake_at = next_refresh
+                deadline = self.next_deadline()
+                if deadline is not None:
+                    wake_at = min(wake_at, deadline)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, wake_at - self.clock()))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for _ in workers:
+                self._queue.put_nowait(None)
+            await asyncio.gather(*workers, return_exceptions=True)
+            logger.info(f"Auto-posting scheduler stopped (dispatched={self.dispatched}, "
+                        f"skipped={self.skipped})")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while True:
+            channel_id = await self._queue.get()
+            if channel_id is None:
+                return
+            try:
+                await self.publish(channel_id)
+            except Exception as e:
+                logger.error(f"Error publishing to channel {channel_id}: {str(e)}")
+            finally:
+                self._in_flight.discard(channel_id)
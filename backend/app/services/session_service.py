@@ -0,0 +1,71 @@
+import logging
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from ..models import AdminContext
+from .storage import Storage
+from .token_store import TokenStore
+from .ttl_cache import TTLCache
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Пока аккаунтов нет, все токены относятся к одному админу
+DEFAULT_ADMIN_ID = 666
+SESSION_TTL = 5
+SESSION_CACHE_SIZE = 10000
+
+
+class SessionService:
+    """Разрешение bearer-токена запроса в состояние админа.
+
+    Экземпляр используется как зависимость FastAPI: Depends(sessions) один
+    раз за запрос разбирает заголовок Authorization и возвращает
+    AdminContext. Контекст (привязка Telegram и канал) загружается одним
+    запросом к БД и кэшируется по токену на ttl секунд, поэтому частый
+    опрос check-connection и check-channel обходится попаданием в кэш.
+
+    После изменения привязок нужно вызвать invalidate(), иначе ответы
+    этого процесса отстанут от БД не больше чем на ttl.
+    """
+
+    def __init__(self, db: Storage, token_store: TokenStore,
+                 ttl: float = SESSION_TTL, maxsize: int = SESSION_CACHE_SIZE):
+        self.db = db
+        self.token_store = token_store
+        self._cache = TTLCache(maxsize, ttl=ttl)
+
+    async def __call__(self, authorization: Optional[str] = Header(None)) -> AdminContext:
+        if not authorization or not authorization.startswith('Bearer '):
+            raise HTTPException(status_code=401, detail="No token provided")
+        return await self.resolve(authorization[len('Bearer '):])
+
+    async def resolve(self, token: Optional[str]) -> AdminContext:
+        """Контекст админа для токена (из кэша или из БД).
+
+        Вызывается напрямую там, где токен приходит не в заголовке
+        (EventSource не умеет передавать Authorization).
+        """
+        if not token:
+            raise HTTPException(status_code=401, detail="No token provided")
+        context = self._cache.get(token)
+        if context is not None:
+            return context
+
+        # Еще не погашенный токен настройки указывает на своего админа
+        token_data = await self.token_store.peek(token)
+        if token_data:
+            timestamp, admin_id = token_data
+        else:
+            timestamp, admin_id = None, DEFAULT_ADMIN_ID
+
+        state = await self.db.get_admin_state(admin_id)
+        context = AdminContext(admin_id=admin_id, token_timestamp=timestamp, **state)
+        self._cache.set(token, context)
+        logger.debug(f"Resolved session for token {token[:8]}... to admin_id {admin_id}")
+        return context
+
+    def invalidate(self) -> None:
+        """Сброс кэша после изменения привязок или токенов"""
+        self._cache.clear()
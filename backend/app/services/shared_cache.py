@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+from .db_service import DatabaseService
+from .metrics import REGISTRY
+from .ttl_cache import TTLCache
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAXSIZE = 10000
+DEFAULT_TTL = 300.0
+DEFAULT_POLL_INTERVAL = 1.0
+# Сколько хранятся записи журнала инвалидации. Процесс, не проверявший
+# журнал дольше, очищает кэш целиком
+INVALIDATION_RETENTION = 3600.0
+PRUNE_INTERVAL = 60.0
+
+_MISSING = object()
+
+shared_cache_lookups = REGISTRY.counter(
+    "shared_cache_lookups_total", "Shared cache lookups by cache and result (hit, miss)", ("cache", "result")
+)
+
+
+class SharedCache:
+    """Кэш поверх БД, согласованный между процессами.
+
+    Локально это TTLCache: чтение из него не обращается к БД. Запись идет
+    в БД, после чего writer вызывает invalidate(): ключи удаляются из
+    локального кэша и записываются в журнал cache_invalidations. Каждый
+    процесс не чаще раза в poll_interval читает из журнала новые записи и
+    удаляет перечисленные ключи, так что чужие изменения видны не позже
+    чем через poll_interval. ttl ограничивает устаревание, если запись в
+    журнал не удалась.
+
+    Ключи приводятся к строке: в журнале они хранятся в текстовом виде.
+    """
+
+    def __init__(self, db: DatabaseService, name: str, maxsize: int = DEFAULT_MAXSIZE,
+                 ttl: Optional[float] = DEFAULT_TTL, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.db = db
+        self.name = name
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._cache = TTLCache(maxsize, ttl, clock)
+        self._lock = threading.Lock()
+        self._last_id = db.get_last_cache_invalidation_id()
+        self._last_poll = clock()
+        self._last_prune = clock()
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Значение из кэша или, при промахе, из loader() с сохранением.
+
+        Кэшируется и None, поэтому повторные запросы отсутствующих ключей
+        тоже не доходят до БД.
+        """
+        self._sync()
+        key = str(key)
+        value = self._cache.get(key, _MISSING)
+        if value is not _MISSING:
+            shared_cache_lookups.inc(self.name, "hit")
+            return value
+        shared_cache_lookups.inc(self.name, "miss")
+        value = loader()
+        self._cache.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Запись в локальный кэш значения, только что сохраненного в БД"""
+        self._cache.set(str(key), value)
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        """Удаление ключей из кэшей всех процессов"""
+        keys = [str(key) for key in keys]
+        for key in keys:
+            self._cache.pop(key)
+        try:
+            self.db.publish_cache_invalidations(self.name, keys)
+            if self._clock() - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = self._clock()
+                self.db.prune_cache_invalidations(time.time() - INVALIDATION_RETENTION)
+        except Exception as e:
+            # Другие процессы увидят изменение по истечении ttl
+            logger.error(f"Error publishing invalidation of {self.name} cache: {str(e)}")
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def _sync(self) -> None:
+        """Применение записей журнала инвалидации, появившихся с прошлой проверки"""
+        now = self._clock()
+        if now - self._last_poll < self.poll_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            # Журнал уже читает другой поток
+            return
+        try:
+            if now - self._last_poll >= INVALIDATION_RETENTION:
+                # Нужные записи могли быть уже удалены из журнала
+                self._cache.clear()
+                self._last_id = self.db.get_last_cache_invalidation_id()
+            else:
+                self._last_id, keys = self.db.get_cache_invalidations(self.name, self._last_id)
+                for key in keys:
+                    self._cache.pop(key)
+            self._last_poll = now
+        except Exception as e:
+            logger.error(f"Error reading invalidations of {self.name} cache: {str(e)}")
+        finally:
+            self._lock.release()
+
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import Dict
+
+from .metrics import REGISTRY
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+status_waiters = REGISTRY.gauge("telegram_status_waiters", "Open connection status streams")
+
+
+class StatusNotifier:
+    """Уведомления об изменении привязок админа внутри процесса API.
+
+    Эндпоинты, меняющие привязки, вызывают publish(admin_id), а открытые
+    потоки статуса ждут в wait() и сразу перечитывают состояние. Ожидающим
+    одного админа достается общее событие, которое при публикации
+    срабатывает и заменяется новым, поэтому уведомление не теряется между
+    проверкой состояния и началом ожидания, если передать version из
+    предыдущего wait().
+
+    Изменения, сделанные другими процессами, сюда не попадают: поток
+    статуса дополнительно перечитывает состояние по таймауту ожидания.
+    """
+
+    def __init__(self):
+        self._events: Dict[int, asyncio.Event] = {}
+        self._versions: Dict[int, int] = {}
+        self._waiters: Dict[int, int] = {}
+        status_waiters.set_function(lambda: {(): self.waiting()})
+
+    def version(self, admin_id: int) -> int:
+        return self._versions.get(admin_id, 0)
+
+    def publish(self, admin_id: int) -> None:
+        """Сообщение ожидающим, что состояние админа изменилось"""
+        self._versions[admin_id] = self.version(admin_id) + 1
+        event = self._events.pop(admin_id, None)
+        if event is not None:
+            event.set()
+            logger.debug(f"Notified {self._waiters.get(admin_id, 0)} status waiters for admin_id {admin_id}")
+
+    async def wait(self, admin_id: int, version: int, timeout: float) -> int:
+        """Ожидание публикации после version (не дольше timeout секунд).
+        Возвращает текущую версию: совпадает с version, если истек таймаут"""
+        if self.version(admin_id) != version:
+            return self.version(admin_id)
+        event = self._events.get(admin_id)
+        if event is None:
+            event = self._events[admin_id] = asyncio.Event()
+        self._waiters[admin_id] = self._waiters.get(admin_id, 0) + 1
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            remaining = self._waiters[admin_id] - 1
+            if remaining:
+                self._waiters[admin_id] = remaining
+            else:
+                del self._waiters[admin_id]
+                # Событие без ожидающих не держим
+                if self._events.get(admin_id) is event:
+                    del self._events[admin_id]
+        return self.version(admin_id)
+
+    def waiting(self) -> int:
+        """Число открытых ожиданий (для метрик)"""
+        return sum(self._waiters.values())
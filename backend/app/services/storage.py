@@ -0,0 +1,137 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PATH = "db/app.db"
+
+
+class Storage(ABC):
+    """Асинхронный интерфейс хранилища API.
+
+    Набор методов повторяет DatabaseService в части токенов, привязок,
+    каналов, приема постов и кэша трансформаций. Реализации:
+    AsyncDatabaseService (SQLite, один хост) и PostgresStorage (общая БД
+    для нескольких узлов). Поведение реализаций проверяет
+    tests/test_storage_contract.py.
+
+    PostgresStorage пока не выбирается через DATABASE_URL: процесс бота
+    (индекс каналов, буфер постов, планировщик, outbox, воркер
+    трансформаций) работает только с файлом SQLite и не увидел бы
+    привязки и настройки каналов, записанные API в PostgreSQL.
+    """
+
+    async def start(self) -> None:
+        """Подготовка к работе (пул соединений, схема). По умолчанию ничего не делает"""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Освобождение соединений"""
+
+    # Временные токены настройки
+
+    @abstractmethod
+    async def save_token(self, token: str, admin_id: int) -> None: ...
+
+    @abstractmethod
+    async def get_token_data(self, token: str) -> Optional[Tuple[float, int]]: ...
+
+    @abstractmethod
+    async def consume_token(self, token: str) -> Optional[Tuple[float, int]]: ...
+
+    @abstractmethod
+    async def delete_token(self, token: str) -> None: ...
+
+    @abstractmethod
+    async def cleanup_expired_tokens(self, expiry_seconds: int = 600) -> None: ...
+
+    # Привязки Telegram
+
+    @abstractmethod
+    async def save_telegram_binding(self, telegram_user_id: int, admin_id: int) -> None: ...
+
+    @abstractmethod
+    async def get_admin_id_by_telegram(self, telegram_user_id: int) -> Optional[int]: ...
+
+    @abstractmethod
+    async def get_telegram_user_by_admin(self, admin_id: int) -> Optional[int]: ...
+
+    @abstractmethod
+    async def remove_telegram_binding(self, admin_id: int) -> None: ...
+
+    @abstractmethod
+    async def remove_all_telegram_bindings(self, admin_id: int) -> None: ...
+
+    @abstractmethod
+    async def get_admin_state(self, admin_id: int) -> dict: ...
+
+    # Каналы
+
+    @abstractmethod
+    async def save_channel_binding(self, admin_id: int, channel_id: int, channel_title: str) -> None: ...
+
+    @abstractmethod
+    async def get_channel_by_id(self, channel_id: int) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def is_channel_linked(self, channel_id: int) -> bool: ...
+
+    @abstractmethod
+    async def has_linked_channel(self, telegram_user_id: int) -> bool: ...
+
+    @abstractmethod
+    async def get_user_channels(self, telegram_user_id: int) -> list: ...
+
+    @abstractmethod
+    async def has_channel_by_admin_id(self, admin_id: int) -> bool: ...
+
+    @abstractmethod
+    async def remove_channel_binding(self, admin_id: int) -> None: ...
+
+    @abstractmethod
+    async def get_channel_ids(self) -> List[int]: ...
+
+    # Посты и кэш трансформаций
+
+    @abstractmethod
+    async def save_post(self, channel_id: int, message_id: int, content: str) -> None: ...
+
+    @abstractmethod
+    async def get_cached_transform(self, cache_key: str, min_created_at: float) -> Optional[str]: ...
+
+    @abstractmethod
+    async def save_cached_transform(self, cache_key: str, content: str) -> None: ...
+
+    @abstractmethod
+    async def evict_cached_transforms(self, max_entries: int, min_created_at: float) -> int: ...
+
+
+def is_postgres_url(url: Optional[str]) -> bool:
+    return bool(url) and url.startswith(("postgres://", "postgresql://"))
+
+
+def create_storage(url: Optional[str] = None) -> Storage:
+    """Хранилище по DATABASE_URL.
+
+    sqlite:///путь или пустое значение — AsyncDatabaseService над файлом
+    SQLite. postgresql://... отклоняется, пока бот не переведен на Storage
+    (см. описание Storage): иначе состояние API и бота разойдется.
+    """
+    url = url or os.getenv("DATABASE_URL", "")
+    if is_postgres_url(url):
+        raise ValueError(
+            "PostgreSQL DATABASE_URL is not supported yet: the bot keeps channels, "
+            "posts and the outbox in SQLite"
+        )
+
+    from .async_db_service import AsyncDatabaseService
+    from .db_service import DatabaseService
+    if url and not url.startswith("sqlite:///"):
+        raise ValueError(f"Unsupported DATABASE_URL scheme: {url.split(':', 1)[0]}")
+    path = url[len("sqlite:///"):] or DEFAULT_SQLITE_PATH
+    logger.info(f"Using SQLite storage at {path}")
+    # Схема проверяется в start(), при старте приложения
+    return AsyncDatabaseService(DatabaseService(path, initialize=False))
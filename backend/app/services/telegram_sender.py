@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import random
+import statistics
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from .metrics import REGISTRY
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Лимиты Bot API: ~30 сообщений в секунду на бота, 1 в секунду в один чат,
+# 20 в минуту в группу или канал. Общий лимит взят с небольшим запасом:
+# время прихода запросов к Telegram плавает на величину сетевой задержки.
+# Корзины без запаса на всплеск (емкость 1): лимиты Telegram считаются
+# скользящим окном, и всплеск сверх темпа дает 429
+GLOBAL_RATE = 29.0
+CHAT_RATE = 1.0
+GROUP_RATE_PER_MINUTE = 20
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+# Количество последних замеров задержки в очереди для статистики
+LATENCY_SAMPLES = 1000
+# В канал уходит не больше 20 сообщений в минуту, так что очередь
+# канала может ждать минутами
+QUEUE_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Сетевые и серверные ошибки python-telegram-bot и aiogram, после которых
+# отправку имеет смысл повторить
+TRANSIENT_ERRORS = {
+    "NetworkError", "TimedOut",
+    "TelegramNetworkError", "TelegramServerError", "RestartingTelegram",
+}
+
+
+telegram_send_queue_latency = REGISTRY.histogram(
+    "telegram_send_queue_seconds", "Time from TelegramSender.send() to the first send slot",
+    buckets=QUEUE_LATENCY_BUCKETS
+)
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Значение retry_after из ошибки 429 (RetryAfter, TelegramRetryAfter)"""
+    retry_after = getattr(error, "retry_after", None)
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    if isinstance(retry_after, (int, float)):
+        return float(retry_after)
+    return None
+
+
+def is_transient_error(error: Exception) -> bool:
+    if isinstance(error, (ConnectionError, asyncio.TimeoutError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    """Корзина токенов с резервированием.
+
+    reserve() сразу списывает токен (баланс может уйти в минус) и
+    возвращает, сколько нужно подождать до отправки. Так конкурирующие
+    отправители получают слоты строго по очереди, без повторных проверок.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self) -> float:
+        self._refill()
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def delay(self) -> float:
+        """Сколько ждать до появления токена (без списания)"""
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def is_idle(self) -> bool:
+        """Корзина полна: ее состояние можно забыть"""
+        return self._tokens + (self.clock() - self._updated_at) * self.rate >= self.capacity
+
+
+class TelegramSender:
+    """Отправка исходящих сообщений Bot API с учетом лимитов Telegram.
+
+    Каждое сообщение проходит через общую корзину (global_rate в секунду)
+    и корзины своего чата: chat_rate в секунду, а для групп и каналов
+    (отрицательный chat_id) еще и group_rate_per_minute в минуту. Сообщения
+    одного чата отправляются по порядку одной задачей, которая завершается,
+    когда очередь чата пуста.
+
+    На 429 чат приостанавливается на retry_after из ответа, сетевые ошибки
+    повторяются с экспоненциальной задержкой и джиттером, остальные ошибки
+    (BadRequest, Forbidden и т.п.) сразу возвращаются вызывающему.
+
+    send_func — корутина отправки, например bot.send_message.
+    """
+
+    def __init__(
+        self,
+        send_func: Callable[..., Awaitable[Any]],
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = CHAT_RATE,
+        group_rate_per_minute: int = GROUP_RATE_PER_MINUTE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_backoff: float = DEFAULT_BASE_BACKOFF,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.send_func = send_func
+        self.chat_rate = chat_rate
+        self.group_rate_per_minute = group_rate_per_minute
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.clock = clock
+        self._global = TokenBucket(global_rate, 1, clock)
+        self._chat_buckets: Dict[int, List[TokenBucket]] = {}
+        self._queues: Dict[int, Deque[Tuple[dict, asyncio.Future, float]]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._paused_until: Dict[int, float] = {}
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.sent = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.errors = 0
+
+    def _buckets_for(self, chat_id: Union[int, str]) -> List[TokenBucket]:
+        buckets = self._chat_buckets.get(chat_id)
+        if buckets is None:
+            buckets = [TokenBucket(self.chat_rate, 1, self.clock)]
+            # Отрицательные id и @username — группы и каналы
+            if isinstance(chat_id, str) or chat_id < 0:
+                rate = self.group_rate_per_minute / 60
+                buckets.append(TokenBucket(rate, 1, self.clock))
+            self._chat_buckets[chat_id] = buckets
+        return buckets
+
+    async def send(self, chat_id: Union[int, str], text: str, **kwargs) -> Any:
+        """Постановка сообщения в очередь чата и ожидание отправки"""
+        future = asyncio.get_running_loop().create_future()
+        kwargs.update(chat_id=chat_id, text=text)
+        self._queues.setdefault(chat_id, deque()).append((kwargs, future, self.clock()))
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._worker(chat_id))
+        return await future
+
+    async def _worker(self, chat_id: int) -> None:
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                kwargs, future, queued_at = queue.popleft()
+                if future.done():
+                    continue
+                try:
+                    result = await self._send_with_retry(chat_id, kwargs, queued_at)
+                except Exception as e:
+                    self.errors += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            del self._queues[chat_id]
+            del self._workers[chat_id]
+            # Корзины простаивающих чатов не храним, иначе словарь растет
+            # с числом чатов, в которые бот когда-либо писал
+            buckets = self._chat_buckets.get(chat_id)
+            if buckets and all(bucket.is_idle() for bucket in buckets):
+                del self._chat_buckets[chat_id]
+
+    async def _wait_for_slot(self, chat_id: int) -> None:
+        paused_for = self._paused_until.get(chat_id, 0) - self.clock()
+        if paused_for > 0:
+            await asyncio.sleep(paused_for)
+        self._paused_until.pop(chat_id, None)
+        # Сначала ждем лимит чата, затем резервируем общий слот, чтобы не
+        # занимать его, пока чат еще ограничен. Токены чата списываются
+        # в момент отправки: корзины чата использует только его задача
+        buckets = self._buckets_for(chat_id)
+        delay = max(bucket.delay() for bucket in buckets)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        delay = self._global.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        for bucket in buckets:
+            bucket.reserve()
+
+    async def _send_with_retry(self, chat_id: int, kwargs: dict, queued_at: float) -> Any:
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_slot(chat_id)
+            if attempt == 0:
+                latency = self.clock() - queued_at
+                self._latencies.append(latency)
+                telegram_send_queue_latency.observe(latency)
+            try:
+                result = await self.send_func(**kwargs)
+                self.sent += 1
+                return result
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = get_retry_after(e)
+                if retry_after is not None:
+                    self.rate_limited += 1
+                    self._paused_until[chat_id] = self.clock() + retry_after
+                    logger.warning(f"Flood limit for chat {chat_id}, retrying in {retry_after:.1f}s")
+                elif is_transient_error(e):
+                    delay = random.uniform(0, min(MAX_BACKOFF, self.base_backoff * 2 ** attempt))
+                    logger.warning(f"Error sending to chat {chat_id}: {str(e)}, retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                else:
+                    raise
+                self.retries += 1
+
+    def stats(self) -> dict:
+        """Счетчики отправки и задержка в очереди (с момента send() до слота)"""
+        latencies = sorted(self._latencies)
+        return {
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "active_chats": len(self._workers),
+            "sent": self.sent,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "queue_latency_p50": statistics.median(latencies) if latencies else 0.0,
+            "queue_latency_p99": latencies[int(0.99 * (len(latencies) - 1))] if latencies else 0.0,
+        }
+
+    async def close(self) -> None:
+        """Ожидание отправки уже поставленных сообщений"""
+        if self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
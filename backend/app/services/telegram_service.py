@@ -12,7 +12,11 @@ import logging
 from aiogram import Router
 from .log_service import LogService
 from .user_service import UserService
-from .database_service import DatabaseService
+from .db_service import DatabaseService
+from .telegram_sender import TelegramSender
+from .outbox import Outbox
+from .shared_cache import SharedCache
+from typing import List, Optional
 
 load_dotenv()
 
@@ -28,6 +32,9 @@ console_handler = logging.StreamHandler()
 console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 
+# Тема outbox с постами для публикации в Telegram
+TELEGRAM_TOPIC = "publish.telegram"
+
 class TelegramService:
     def __init__(self, ai_service: AIService, user_service: UserService, log_service: LogService):
         self.bot = Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
@@ -36,9 +43,14 @@ class TelegramService:
         self.user_service = user_service
         self.log = log_service
         self.db = DatabaseService()
-        self.posts_queue = []
-        self.user_channels = {}
-        self.verification_requests = {}
+        # Все исходящие сообщения идут через отправитель с лимитами Bot API
+        self.sender = TelegramSender(self.bot.send_message)
+        # Очередь постов хранится в outbox и переживает перезапуск
+        self.outbox = Outbox(self.db)
+        # Каналы пользователей и запросы на верификацию хранятся в БД,
+        # кэши согласованы между процессами бота
+        self.user_channels = SharedCache(self.db, "user_channels")
+        self.verification_requests = SharedCache(self.db, "channel_verifications")
         self.setup_handlers()
 
     def setup_handlers(self):
@@ -100,10 +112,8 @@ class TelegramService:
                     return
 
                 # Всё ок, сохраняем канал
-                if user.id not in self.user_channels:
-                    self.user_channels[user.id] = {}
-
-                self.user_channels[user.id][channel_id] = True
+                self.db.save_user_channel(user.id, channel_id, channel_title)
+                self.user_channels.invalidate([user.id])
                 self.log.channel_verified(user.id, channel_id, channel_title)
 
                 await message.answer(
@@ -130,11 +140,11 @@ class TelegramService:
 
     async def get_posts(self):
         """Получить все посты из очереди"""
-        return self.posts_queue
+        return await self.outbox.pending(TELEGRAM_TOPIC)
 
-    async def remove_post(self, post_id: int):
-        """Удалить пост из очереди"""
-        self.posts_queue = [p for p in self.posts_queue if p['id'] != post_id]
+    async def cancel_outbox_message(self, message_id: int):
+        """Удалить сообщение из очереди публикации (id из get_posts)"""
+        await self.outbox.delete(message_id)
 
     async def start(self):
         """Start the bot polling"""
@@ -151,12 +161,13 @@ class TelegramService:
 
     async def stop(self):
         """Stop the bot"""
+        await self.sender.close()
         await self.bot.session.close()
 
     async def send_message(self, chat_id: str, message: str):
         """Send a message to a specific chat"""
         try:
-            await self.bot.send_message(chat_id=chat_id, text=message)
+            await self.sender.send(chat_id, message)
             return True
         except Exception as e:
             logger.error(f"Error sending message: {e}")
@@ -172,18 +183,32 @@ class TelegramService:
         verification_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
         # 3. Сохраняем запрос на верификацию
-        self.verification_requests[channel_id] = {
-            'user_id': user_id,
-            'code': verification_code,
-            'timestamp': datetime.now()
-        }
+        self.db.save_channel_verification(channel_id, user_id, verification_code)
+        self.verification_requests.invalidate([channel_id])
 
         # 4. Просим пользователя отправить код через канал
-        await self.bot.send_message(
+        await self.sender.send(
             user_id,
             f"To verify channel ownership, please post this code in your channel:\n"
             f"`{verification_code}`\n"
             f"The code will expire in 10 minutes."
         )
 
-        return True
\ No newline at end of file
+        return True
+
+    def get_user_channel_ids(self, user_id: str) -> List[int]:
+        """Каналы, подтвержденные пользователем"""
+        return self.user_channels.get(user_id, lambda: self.db.get_user_channel_ids(user_id))
+
+    def get_verification_request(self, channel_id: int) -> Optional[dict]:
+        """Запрос на верификацию канала: user_id, code и timestamp"""
+        def load() -> Optional[dict]:
+            request = self.db.get_channel_verification(channel_id)
+            if request is None:
+                return None
+            return {
+                'user_id': request['user_id'],
+                'code': request['code'],
+                'timestamp': datetime.fromtimestamp(request['created_at'])
+            }
+        return self.verification_requests.get(channel_id, load)
@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import logging
+import secrets
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from .batch_worker import BatchWorker
+from .db_service import DatabaseService
+from .outbox import DEFAULT_BATCH_SIZE, DEFAULT_LEASE_SECONDS, Outbox
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Тема outbox, через которую обновления из API попадают в процесс бота
+UPDATES_TOPIC = "telegram.updates"
+# Адрес (host:port), на который API шлет датаграмму после записи
+# обновлений, чтобы бот забрал их сразу, а не при следующем опросе outbox
+DEFAULT_NOTIFY_ADDRESS = "127.0.0.1:8765"
+# Опрос outbox ботом на случай потерянной датаграммы, секунд
+DEFAULT_POLL_INTERVAL = 5.0
+# Пауза перед повторной попыткой открыть сокет уведомлений, секунд
+NOTIFY_RETRY_INTERVAL = 10.0
+
+
+def webhook_secret(token: str, secret: Optional[str] = None) -> str:
+    """Секрет webhook. По умолчанию выводится из токена, чтобы совпадать в
+    процессе бота (регистрирует webhook) и во всех воркерах API"""
+    return secret or hashlib.sha256(f"webhook:{token}".encode()).hexdigest()[:32]
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class TelegramWebhook:
+    """Прием обновлений бота через webhook в процессе API.
+
+    API только проверяет секрет и кладет обновление в outbox (тема
+    UPDATES_TOPIC). Обработчики, буфер постов и фоновые воркеры работают
+    в одном процессе бота (bot.main в режиме webhook): он регистрирует
+    webhook и забирает обновления через UpdateConsumer. Обновление, на
+    которое API ответил 200, переживает перезапуск бота.
+
+    Одновременные запросы записываются одной транзакцией: пока идет
+    запись, новые обновления копятся и уходят следующей. После записи
+    бот получает датаграмму на notify_address (пустой — не уведомлять).
+
+    Outbox — файл SQLite бота (путь DatabaseService по умолчанию).
+    """
+
+    def __init__(self, token: str, secret: Optional[str] = None, db: Optional[DatabaseService] = None,
+                 notify_address: Optional[str] = DEFAULT_NOTIFY_ADDRESS):
+        self.secret = webhook_secret(token, secret)
+        # Схема проверяется в start(), при старте приложения
+        self.db = db or DatabaseService(initialize=False)
+        self.outbox = Outbox(self.db)
+        self.notify_address = notify_address
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._writer: Optional[asyncio.Task] = None
+        self._notify_transport: Optional[asyncio.DatagramTransport] = None
+        self._notify_failed_at = 0.0
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.db.init_db)
+        logger.info(f"Telegram webhook updates are queued to {UPDATES_TOPIC}")
+
+    async def stop(self) -> None:
+        if self._writer:
+            await self._writer
+        if self._notify_transport:
+            self._notify_transport.close()
+            self._notify_transport = None
+        self.db.close()
+
+    def check_secret(self, secret: Optional[str]) -> bool:
+        return secret is not None and secrets.compare_digest(secret, self.secret)
+
+    async def enqueue(self, payload: dict) -> None:
+        """Передача обновления процессу бота. Возвращается после записи в outbox"""
+        written = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, written))
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_pending())
+        await written
+
+    async def _write_pending(self) -> None:
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    await self.outbox.enqueue_batch([(UPDATES_TOPIC, payload) for payload, _ in batch])
+                except Exception as e:
+                    logger.error(f"Error queueing {len(batch)} webhook updates: {str(e)}")
+                    for _, written in batch:
+                        if not written.done():
+                            written.set_exception(e)
+                    continue
+                for _, written in batch:
+                    if not written.done():
+                        written.set_result(None)
+                await self._notify()
+        finally:
+            self._writer = None
+
+    async def _notify(self) -> None:
+        """Датаграмма боту о новых обновлениях. Ошибки не мешают приему:
+        бот заберет обновления при следующем опросе outbox"""
+        if not self.notify_address:
+            return
+        if self._notify_transport is None:
+            if time.monotonic() - self._notify_failed_at < NOTIFY_RETRY_INTERVAL:
+                return
+            try:
+                self._notify_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                    asyncio.DatagramProtocol, remote_addr=parse_address(self.notify_address)
+                )
+            except OSError as e:
+                self._notify_failed_at = time.monotonic()
+                logger.warning(f"Cannot notify the bot at {self.notify_address}: {str(e)}")
+                return
+        self._notify_transport.sendto(b"\x01")
+
+
+class _Wakeup(asyncio.DatagramProtocol):
+    def __init__(self, callback: Callable[[], None]):
+        self.callback = callback
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.callback()
+
+
+class UpdateConsumer(BatchWorker):
+    """Передача обновлений из outbox обработчикам бота (процесс бота).
+
+    Единственный потребитель UPDATES_TOPIC: обновления забираются пачками
+    в порядке записи, передаются в feed по одному и подтверждаются одной
+    транзакцией. Обновление, которое не удалось передать, сразу уходит в
+    dead: повтор с задержкой пропустил бы вперед более поздние обновления
+    того же чата. По той же причине при старте снимаются аренды, которые
+    остались от прежнего процесса.
+
+    API будит потребителя датаграммой на notify_address; опрос outbox раз
+    в poll_interval нужен, только если датаграмма потерялась.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseService,
+        feed: Callable[[dict], Awaitable[None]],
+        notify_address: Optional[str] = DEFAULT_NOTIFY_ADDRESS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        # Пачки обрабатываются строго по одной, иначе порядок не сохранится
+        super().__init__("telegram update consumer", 1, poll_interval)
+        self.outbox = Outbox(db)
+        self.feed = feed
+        self.notify_address = notify_address
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    async def _on_start(self) -> None:
+        released = await self.outbox.release_leases(UPDATES_TOPIC)
+        if released:
+            logger.warning(f"Released {released} webhook updates claimed by a previous bot process")
+        if not self.notify_address:
+            return
+        try:
+            self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _Wakeup(self.notify), local_addr=parse_address(self.notify_address)
+            )
+            logger.info(f"Listening for webhook notifications on {self.notify_address}")
+        except OSError as e:
+            logger.error(f"Cannot listen for webhook notifications on {self.notify_address}: {str(e)}, "
+                         f"polling the outbox every {self.poll_interval}s")
+
+    async def _claim(self) -> List[List[dict]]:
+        messages = await self.outbox.claim_batch(UPDATES_TOPIC, self.batch_size, self.lease_seconds)
+        return [messages] if messages else []
+
+    async def _process(self, messages: List[dict]) -> None:
+        fed = []
+        for message in messages:
+            try:
+                await self.feed(message["payload"])
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error feeding webhook update {message['id']}: {str(e)}")
+                try:
+                    await self.outbox.nack(message, str(e), retry=False)
+                except Exception as db_error:
+                    logger.error(f"Error moving webhook update {message['id']} to dead letters: "
+                                 f"{str(db_error)}")
+                continue
+            self.processed += 1
+            fed.append(message)
+        try:
+            await self.outbox.ack_batch(fed)
+        except Exception as e:
+            # Обновления будут переданы повторно по истечении аренды
+            logger.error(f"Error acknowledging {len(fed)} webhook updates: {str(e)}")
+
+    async def stop(self) -> None:
+        if self._transport:
+            self._transport.close()
+            self._transport = None
+        await super().stop()
@@ -0,0 +1,73 @@
+import hashlib
+import re
+import unicodedata
+from collections import Counter
+from typing import List
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_content(content: str) -> str:
+    """Нормализация текста поста: NFC, схлопывание пробелов, обрезка краев.
+
+    Тексты, отличающиеся только пробелами и переносами строк, дают
+    одинаковый результат.
+    """
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", content)).strip()
+
+
+def content_hash(content: str) -> str:
+    """Хэш нормализованного текста поста: правки, не меняющие текст по
+    существу (пробелы, переносы строк), дают тот же хэш"""
+    return hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()
+
+
+SIMHASH_BITS = 64
+# Число полос LSH-индекса по отпечатку. Отпечатки на расстоянии Хэмминга
+# меньше числа полос совпадают хотя бы в одной полосе целиком
+SIMHASH_BANDS = 8
+SIMHASH_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_SIMHASH_MASK = (1 << SIMHASH_BITS) - 1
+# Слова текста: из них строится SimHash, по ним же near_duplicates
+# переносит правки в трансформацию
+WORD_RE = re.compile(r"\w+")
+
+
+def _simhash_features(content: str) -> List[str]:
+    """Признаки текста: слова и пары соседних слов без учета регистра"""
+    words = WORD_RE.findall(normalize_content(content).casefold())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def simhash(content: str) -> int:
+    """64-битный SimHash текста поста (беззнаковый).
+
+    Небольшие правки (замена слова, даты, пунктуация) меняют лишь
+    несколько бит, поэтому близость текстов оценивается расстоянием
+    Хэмминга между отпечатками.
+    """
+    weights = [0] * SIMHASH_BITS
+    for feature, count in Counter(_simhash_features(content)).items():
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def simhash_bands(fingerprint: int) -> List[int]:
+    """Полосы отпечатка для LSH-индекса, младшие биты — полоса 0"""
+    band_mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [fingerprint >> (band * SIMHASH_BAND_BITS) & band_mask for band in range(SIMHASH_BANDS)]
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return bin((first ^ second) & _SIMHASH_MASK).count("1")
+
+
+def to_signed64(value: int) -> int:
+    """Беззнаковое 64-битное число в диапазоне INTEGER SQLite"""
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def from_signed64(value: int) -> int:
+    return value & _SIMHASH_MASK
@@ -0,0 +1,91 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .storage import Storage
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+TOKEN_TTL = 600
+SWEEP_INTERVAL = 60
+
+
+class TokenStore:
+    """Хранилище временных токенов настройки Telegram.
+
+    Токены держатся в памяти (словарь + куча по времени истечения) и
+    сквозной записью сохраняются в temp_tokens, чтобы их видели другие
+    процессы. Погашение токена — один запрос DELETE ... RETURNING, поэтому
+    токен нельзя использовать дважды даже при нескольких воркерах API.
+    Просроченные токены удаляет фоновая задача, а не каждый verify.
+    """
+
+    def __init__(self, db: Storage, ttl: float = TOKEN_TTL,
+                 sweep_interval: float = SWEEP_INTERVAL):
+        self.db = db
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._tokens: Dict[str, Tuple[float, int]] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def is_expired(self, timestamp: float) -> bool:
+        return time.time() - timestamp > self.ttl
+
+    def _remember(self, token: str, timestamp: float, admin_id: int) -> None:
+        self._tokens[token] = (timestamp, admin_id)
+        heapq.heappush(self._expiry_heap, (timestamp + self.ttl, token))
+
+    async def issue(self, token: str, admin_id: int) -> None:
+        """Сохранение нового токена"""
+        await self.db.save_token(token, admin_id)
+        self._remember(token, time.time(), admin_id)
+
+    async def peek(self, token: str) -> Optional[Tuple[float, int]]:
+        """Данные токена (timestamp, admin_id) без погашения"""
+        token_data = self._tokens.get(token)
+        if token_data:
+            return token_data
+        # Токен мог быть выпущен другим процессом
+        return await self.db.get_token_data(token)
+
+    async def consume(self, token: str) -> Optional[Tuple[float, int]]:
+        """Погашение токена. Возвращает (timestamp, admin_id) или None,
+        если токена нет или он уже использован"""
+        self._tokens.pop(token, None)
+        return await self.db.consume_token(token)
+
+    async def sweep(self) -> None:
+        """Удаление просроченных токенов из памяти и из БД"""
+        now = time.time()
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, token = heapq.heappop(self._expiry_heap)
+            if self._tokens.pop(token, None):
+                removed += 1
+        await self.db.cleanup_expired_tokens(int(self.ttl))
+        logger.debug(f"Token sweep removed {removed} expired tokens from memory")
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping expired tokens: {str(e)}")
+
+    def start(self) -> None:
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
@@ -0,0 +1,89 @@
+import hashlib
+import logging
+import time
+from typing import Optional
+
+from .storage import Storage
+from .text_utils import normalize_content
+from .ttl_cache import TTLCache
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_SIZE = 1024
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_TTL = 30 * 24 * 3600
+# Как часто (в записях) запускать вытеснение из хранилища
+EVICT_EVERY = 100
+
+
+def make_cache_key(content: str, source_platform: str, target_platform: str,
+                   model: str, prompt_version: int) -> str:
+    """Ключ кэша: хэш нормализованного текста, пары платформ, модели и версии промпта"""
+    parts = (normalize_content(content), source_platform, target_platform, model, str(prompt_version))
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class TransformCache:
+    """Двухуровневый кэш результатов трансформации.
+
+    Первый уровень — LRU в памяти процесса, второй — таблица
+    transform_cache в хранилище с TTL и ограничением по количеству записей
+    (вытесняются давно не использованные).
+    """
+
+    def __init__(
+        self,
+        db: Storage,
+        memory_size: int = DEFAULT_MEMORY_SIZE,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+    ):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = TTLCache(memory_size, ttl=ttl)
+        self._writes = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+
+        try:
+            value = await self.db.get_cached_transform(key, time.time() - self.ttl)
+        except Exception as e:
+            # Ошибка кэша не должна ломать трансформацию
+            logger.warning(f"Transform cache lookup failed: {str(e)}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        self._memory.set(key, value)
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self._memory.set(key, value)
+        try:
+            await self.db.save_cached_transform(key, value)
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                await self.db.evict_cached_transforms(self.max_entries, time.time() - self.ttl)
+        except Exception as e:
+            logger.warning(f"Transform cache write failed: {str(e)}")
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+from .ai_service import AIService
+from .batch_worker import BatchWorker
+from .db_service import DatabaseService
+from .metrics import REGISTRY
+from .near_duplicates import NearDuplicateIndex
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RATE_LIMIT_RETRIES = 5
+DEFAULT_BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+# Пост в processing дольше этого времени считается брошенным упавшим воркером
+STALE_PROCESSING_TIMEOUT = 600
+
+transform_posts = REGISTRY.counter(
+    "transform_posts_total", "Transformed posts by outcome (done, reused, stale, retry, failed)", ("result",)
+)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Ошибка 429 от OpenAI (openai.RateLimitError и совместимые)"""
+    return getattr(error, "status_code", None) == 429
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Значение заголовка Retry-After из ответа, если он есть"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BASE_BACKOFF) -> float:
+    """Экспоненциальная задержка с полным джиттером"""
+    return random.uniform(0, min(MAX_BACKOFF, base * 2 ** attempt))
+
+
+class TransformWorker(BatchWorker):
+    """Воркер, трансформирующий посты в статусе pending.
+
+    Забирает посты пачками (pending -> processing), трансформирует их сразу
+    для всех целевых платформ через AIService.transform_many не более чем
+    concurrency задачами одновременно и сохраняет результат (done). При ошибках пост
+    возвращается в pending с отложенным повтором, после max_attempts
+    попыток получает статус failed. Ответы 429 повторяются внутри задачи
+    с учетом Retry-After. Запись результата защищена ревизией поста, так что
+    правка во время трансформации не затирается устаревшим результатом.
+
+    Если задан near_duplicates, перед запросом к модели ищется уже
+    трансформированный почти-дубликат поста, и его результат переносится
+    без обращения к модели.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseService,
+        ai_service: AIService,
+        target_platforms: Iterable[str] = ("twitter",),
+        source_platform: str = "telegram",
+        concurrency: int = DEFAULT_CONCURRENCY,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        rate_limit_retries: int = DEFAULT_RATE_LIMIT_RETRIES,
+        base_backoff: float = DEFAULT_BASE_BACKOFF,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+    ):
+        super().__init__(f"transform worker (targets={list(target_platforms)})", concurrency, poll_interval)
+        self.db = db
+        self.ai_service = ai_service
+        self.target_platforms = list(target_platforms)
+        self.source_platform = source_platform
+        self.max_attempts = max_attempts
+        self.rate_limit_retries = rate_limit_retries
+        self.base_backoff = base_backoff
+        self.near_duplicates = near_duplicates
+
+    async def _on_start(self) -> None:
+        await asyncio.to_thread(self.db.release_stale_posts, STALE_PROCESSING_TIMEOUT)
+
+    async def _claim(self) -> List[dict]:
+        return await asyncio.to_thread(self.db.claim_pending_posts, self.concurrency)
+
+    async def _process(self, post: dict) -> None:
+        post_id = post["post_id"]
+        try:
+            transforms = await self._find_near_duplicate(post)
+            reused = transforms is not None
+            if not reused:
+                transforms = await self._transform_with_retry(post["content"])
+            # Если пост отредактировали во время трансформации, результат
+            # отбрасывается: новую ревизию обработает следующий захват
+            if await asyncio.to_thread(self.db.complete_post, post_id, transforms, post["revision"]):
+                self.processed += 1
+                transform_posts.inc("reused" if reused else "done")
+            else:
+                transform_posts.inc("stale")
+        except Exception as e:
+            attempts = post["attempts"] + 1
+            retry_at = None
+            if attempts < self.max_attempts:
+                retry_at = time.time() + backoff_delay(attempts, self.base_backoff)
+                transform_posts.inc("retry")
+            else:
+                self.failed += 1
+                transform_posts.inc("failed")
+            logger.error(f"Error transforming post {post_id} (attempt {attempts}): {str(e)}")
+            try:
+                await asyncio.to_thread(self.db.fail_post, post_id, str(e), post["revision"], retry_at)
+            except Exception as db_error:
+                # Пост останется в processing и будет возвращен release_stale_posts
+                logger.error(f"Error saving failure for post {post_id}: {str(db_error)}")
+
+    async def _find_near_duplicate(self, post: dict) -> Optional[Dict[str, str]]:
+        if self.near_duplicates is None:
+            return None
+        try:
+            duplicate = await asyncio.to_thread(self.near_duplicates.find_duplicate, post, self.target_platforms)
+        except Exception as e:
+            # Без индекса пост просто трансформируется моделью
+            logger.error(f"Error looking up near-duplicates of post {post['post_id']}: {str(e)}")
+            return None
+        return duplicate["transforms"] if duplicate else None
+
+    async def _transform_with_retry(self, content: str) -> Dict[str, str]:
+        for attempt in range(self.rate_limit_retries + 1):
+            try:
+                return await self.ai_service.transform_many(
+                    content, self.source_platform, self.target_platforms
+                )
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.rate_limit_retries:
+                    raise
+                delay = get_retry_after(e) or backoff_delay(attempt, self.base_backoff)
+                logger.warning(f"Rate limited by AI provider, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from .metrics import REGISTRY
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARDS = 8
+DEFAULT_MAX_PENDING = 10000
+DEFAULT_HIGH_WATER = 100
+
+update_queue_depth = REGISTRY.gauge("bot_update_queue_depth", "Queued updates per shard", ("shard",))
+updates_processed = REGISTRY.counter("bot_updates_processed_total", "Processed updates per shard", ("shard",))
+
+
+class ShardedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+    Обновления раскладываются по shards очередям по id чата, каждую очередь
+    разбирает один воркер. Разные каналы обрабатываются параллельно (не
+    больше shards обновлений одновременно), а пост и его правки из одного
+    канала попадают в одну очередь и выполняются строго по порядку.
+
+    max_pending ограничивает общее число принятых, но не обработанных
+    обновлений: сверх него Application ждет на семафоре. При глубине очереди
+    шарда high_water и выше пишется предупреждение.
+    """
+
+    def __init__(
+        self,
+        shards: int = DEFAULT_SHARDS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        high_water: int = DEFAULT_HIGH_WATER,
+    ):
+        if shards < 1:
+            raise ValueError("shards must be a positive integer")
+        # Семафор базового класса должен пропускать обновления сразу: иначе
+        # ожидающие на нем задачи могли бы попасть в очередь не по порядку
+        super().__init__(max_concurrent_updates=max(max_pending, shards + 1))
+        self.shards = shards
+        self.high_water = high_water
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._processed = [0] * shards
+        self._max_depth = [0] * shards
+        self._overloaded = [False] * shards
+
+    def shard_for(self, update: object) -> int:
+        """Номер шарда для обновления: по id чата, без чата — нулевой"""
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            return 0
+        return chat.id % self.shards
+
+    async def initialize(self) -> None:
+        """Создание очередей и запуск воркеров"""
+        if self._workers:
+            return
+        self._queues = [asyncio.Queue() for _ in range(self.shards)]
+        self._workers = [
+            asyncio.create_task(self._worker(shard), name=f"update-shard-{shard}")
+            for shard in range(self.shards)
+        ]
+        update_queue_depth.set_function(
+            lambda: {(shard,): queue.qsize() for shard, queue in enumerate(self._queues)}
+        )
+        logger.info(f"Sharded update processor started ({self.shards} shards)")
+
+    async def shutdown(self) -> None:
+        """Обработка уже принятых обновлений и остановка воркеров"""
+        if not self._workers:
+            return
+        for queue in self._queues:
+            queue.put_nowait(None)
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info(f"Sharded update processor stopped, processed {sum(self._processed)} updates")
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Постановка обновления в очередь его шарда и ожидание обработки"""
+        shard = self.shard_for(update)
+        queue = self._queues[shard]
+        future = asyncio.get_running_loop().create_future()
+        # put_nowait без await: обновления встают в очередь в порядке получения
+        queue.put_nowait((coroutine, future))
+
+        depth = queue.qsize()
+        if depth > self._max_depth[shard]:
+            self._max_depth[shard] = depth
+        if depth >= self.high_water and not self._overloaded[shard]:
+            self._overloaded[shard] = True
+            logger.warning(f"Update shard {shard} is backed up: {depth} updates queued")
+
+        await future
+
+    async def _worker(self, shard: int) -> None:
+        """Последовательная обработка очереди одного шарда"""
+        queue = self._queues[shard]
+        while True:
+            item: Optional[Tuple[Awaitable[Any], asyncio.Future]] = await queue.get()
+            if item is None:
+                return
+            coroutine, future = item
+            try:
+                await coroutine
+            except Exception as e:
+                # Application сам вызывает обработчики ошибок, сюда доходят
+                # только сбои самой обработки
+                logger.error(f"Error processing update in shard {shard}: {str(e)}")
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(None)
+            finally:
+                self._processed[shard] += 1
+                updates_processed.inc(shard)
+                if self._overloaded[shard] and queue.qsize() < self.high_water // 2:
+                    self._overloaded[shard] = False
+                    logger.info(f"Update shard {shard} recovered: {queue.qsize()} updates queued")
+
+    def stats(self) -> List[Dict[str, int]]:
+        """Глубина очереди, максимум глубины и число обработанных обновлений по шардам"""
+        return [
+            {
+                "shard": shard,
+                "depth": self._queues[shard].qsize() if self._queues else 0,
+                "max_depth": self._max_depth[shard],
+                "processed": self._processed[shard],
+            }
+            for shard in range(self.shards)
+        ]
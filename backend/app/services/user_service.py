@@ -2,13 +2,23 @@ from ..models import User, UserCreate
 import uuid
 from datetime import datetime
 from typing import Optional
+from .db_service import DatabaseService
 from .log_service import LogService
+from .shared_cache import SharedCache
 
 class UserService:
-    def __init__(self, log_service: LogService):
-        self.users = {}  # user_id -> User
-        self.tokens = {}  # setup_token -> user_id
-        self.telegram_ids = {}  # telegram_id -> user_id
+    """Пользователи веб-интерфейса и их привязки к Telegram.
+
+    Данные хранятся в таблице users, поиск идет через SharedCache, поэтому
+    повторные запросы не обращаются к БД, а изменения из других процессов
+    становятся видны не позже чем через poll_interval кэша.
+    """
+
+    def __init__(self, log_service: LogService, db: Optional[DatabaseService] = None,
+                 cache: Optional[SharedCache] = None):
+        self.db = db or DatabaseService()
+        # Ключи кэша: id:<user_id>, token:<setup_token>, tg:<telegram_id>
+        self.cache = cache or SharedCache(self.db, "users")
         self.log = log_service
 
     def create_user(self) -> User:
@@ -18,33 +28,53 @@ class UserService:
             setup_token=user_create.setup_token,
             created_at=user_create.created_at
         )
-        self.users[user.id] = user
-        self.tokens[user.setup_token] = user.id
-        
+        self.db.create_user(user.id, user.setup_token, user.created_at.timestamp())
+        # Другие процессы могли закэшировать отсутствие этих ключей
+        self.cache.invalidate([f"id:{user.id}", f"token:{user.setup_token}"])
+        self.cache.set(f"id:{user.id}", user)
+        self.cache.set(f"token:{user.setup_token}", user)
+
         self.log.user_connected(user.id, user.setup_token)
         return user
 
+    def get_user(self, user_id: str) -> Optional[User]:
+        return self._lookup("id", "id", user_id)
+
     def get_user_by_token(self, token: str) -> Optional[User]:
-        user_id = self.tokens.get(token)
-        if user_id:
-            return self.users.get(user_id)
-        return None
+        return self._lookup("token", "setup_token", token)
 
     def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
-        user_id = self.telegram_ids.get(telegram_id)
-        if user_id:
-            return self.users.get(user_id)
-        return None
+        return self._lookup("tg", "telegram_id", telegram_id)
 
     def link_telegram(self, setup_token: str, telegram_id: int) -> Optional[User]:
-        user_id = self.tokens.get(setup_token)
-        if not user_id:
+        row, displaced = self.db.link_user_telegram(setup_token, telegram_id)
+        if row is None:
             self.log.error(f"Failed to link Telegram: token {setup_token} not found")
             return None
-        
-        user = self.users[user_id]
-        user.telegram_id = telegram_id
-        self.telegram_ids[telegram_id] = user_id
-        
+
+        user = self._to_user(row)
+        keys = [f"tg:{telegram_id}"]
+        for changed in [user] + [self._to_user(other) for other in displaced]:
+            keys += [f"id:{changed.id}", f"token:{changed.setup_token}"]
+        self.cache.invalidate(keys)
+        self.cache.set(f"id:{user.id}", user)
+        self.cache.set(f"token:{user.setup_token}", user)
+        self.cache.set(f"tg:{telegram_id}", user)
+
         self.log.telegram_linked(user.id, telegram_id, setup_token)
-        return user 
\ No newline at end of file
+        return user
+
+    def _lookup(self, prefix: str, column: str, value) -> Optional[User]:
+        def load() -> Optional[User]:
+            row = self.db.get_user(column, value)
+            return self._to_user(row) if row else None
+        return self.cache.get(f"{prefix}:{value}", load)
+
+    @staticmethod
+    def _to_user(row: dict) -> User:
+        return User(
+            id=row['id'],
+            setup_token=row['setup_token'],
+            telegram_id=row['telegram_id'],
+            created_at=datetime.fromtimestamp(row['created_at'])
+        )
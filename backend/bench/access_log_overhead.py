@@ -0,0 +1,122 @@
+"""Накладные расходы логирования запросов на один запрос.
+
+Сравнивает голое ASGI-приложение, прежнюю схему (чтение всего тела,
+многострочный f-string с заголовками, синхронный FileHandler) и
+AccessLogMiddleware с разной долей сэмплирования.
+
+Запуск (из каталога backend):
+    python -m bench.access_log_overhead --requests 20000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from app.services.access_log import AccessLogMiddleware, setup_access_log
+
+BODY = b'{"telegram_user_id": 123456789, "channel_id": -1001234567890, "channel_title": "Bench"}'
+HEADERS = [
+    (b"host", b"localhost:8000"),
+    (b"user-agent", b"bench/1.0"),
+    (b"authorization", b"Bearer secret-token"),
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(BODY)).encode()),
+]
+
+
+async def endpoint(scope, receive, send):
+    while (await receive()).get("more_body"):
+        pass
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"status": "success"}'})
+
+
+class LegacyLogMiddleware:
+    """Прежнее поведение log_requests"""
+
+    def __init__(self, app, logger):
+        self.app = app
+        self.logger = logger
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = {k.decode(): v.decode() for k, v in scope["headers"]}
+        self.logger.info(f"""
+=== Incoming Request ===
+Method: {scope['method']}
+URL: {scope['path']}
+Headers: {headers}
+Body: {body.decode() if body else 'No body'}
+======================""")
+
+        async def replay():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        status = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status.update(message)
+            await send(message)
+
+        await self.app(scope, replay, send_wrapper)
+        self.logger.info(f"""
+=== Outgoing Response ===
+Status: {status.get('status')}
+Headers: {status.get('headers')}
+======================""")
+
+
+async def drive(app, requests: int) -> float:
+    scope = {"type": "http", "method": "POST", "path": "/api/telegram/link-channel",
+             "headers": HEADERS, "client": ("127.0.0.1", 12345)}
+
+    async def receive():
+        return {"type": "http.request", "body": BODY, "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_logger = logging.getLogger("bench.legacy")
+        legacy_logger.propagate = False
+        legacy_logger.setLevel(logging.INFO)
+        legacy_logger.addHandler(logging.FileHandler(os.path.join(tmp, "legacy.log")))
+        listener = setup_access_log(os.path.join(tmp, "access.log"))
+
+        variants = [
+            ("no logging", endpoint),
+            ("legacy log_requests", LegacyLogMiddleware(endpoint, legacy_logger)),
+            ("access log, sample=1.0", AccessLogMiddleware(endpoint, sample_rate=1.0)),
+            ("access log, sample=0.1", AccessLogMiddleware(endpoint, sample_rate=0.1)),
+        ]
+        baseline = None
+        for name, app in variants:
+            per_request = asyncio.run(drive(app, args.requests))
+            baseline = per_request if baseline is None else baseline
+            print(f"{name:>24}: {per_request:8.2f} us/request "
+                  f"(overhead {per_request - baseline:8.2f} us)")
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Нагрузочный прогон эндпоинтов подключения Telegram.
+
+Поднимает app.main:app в процессе (через httpx.ASGITransport) или под
+uvicorn (--uvicorn) на временном SQLite и гоняет сценарии setup,
+check-connection, verify, link-channel и их смесь на фиксированных уровнях
+конкурентности. Перед каждым прогоном БД пересоздается и заполняется
+токенами и привязками, нужными сценарию. Печатает req/s и p50/p95/p99 и
+сохраняет результаты в JSON (по умолчанию в bench/results/), --compare
+сравнивает с предыдущим файлом результатов.
+
+Запуск (из каталога backend):
+    python -m bench.api_load --requests 2000 --concurrency 1,8,32
+    python -m bench.api_load --uvicorn --compare bench/results/api_load-20260101-120000.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from app.services.db_service import DatabaseService
+
+ADMIN_ID = 666
+WARMUP_REQUESTS = 50
+SERVER_LOG = "uvicorn.log"
+DEFAULT_SCENARIOS = ["setup", "check-connection", "verify", "link-channel", "mixed"]
+# Доли запросов в смешанном сценарии
+MIX = [("setup", 0.2), ("check-connection", 0.4), ("verify", 0.2), ("link-channel", 0.2)]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def prepare_db(db: DatabaseService, tokens: int, users: int) -> dict:
+    """Чистая БД с tokens временными токенами и users привязанными аккаунтами"""
+    db.reset_db()
+    db.init_db()
+    now = time.time()
+    state = {
+        "tokens": [f"bench-token-{i}" for i in range(tokens)],
+        "users": [100000 + i for i in range(users)],
+    }
+    with db.get_db() as conn:
+        conn.executemany(
+            "INSERT INTO temp_tokens (token, timestamp, admin_id) VALUES (?, ?, ?)",
+            [(token, now, ADMIN_ID) for token in state["tokens"]]
+        )
+        conn.executemany(
+            "INSERT INTO telegram_bindings (telegram_user_id, admin_id, created_at) VALUES (?, ?, ?)",
+            [(user_id, 1000 + i, now) for i, user_id in enumerate(state["users"])]
+        )
+        conn.commit()
+    return state
+
+
+def make_request(scenario: str, state: dict, i: int, rng: random.Random) -> Callable:
+    """Запрос сценария в виде функции от httpx-клиента"""
+    if scenario == "setup":
+        return lambda client: client.get("/api/telegram/setup")
+    if scenario == "check-connection":
+        headers = {"Authorization": f"Bearer {rng.choice(state['tokens'])}"}
+        return lambda client: client.get("/api/telegram/check-connection", headers=headers)
+    if scenario == "verify":
+        # Каждый токен гасится один раз
+        body = {"token": state["tokens"][i % len(state["tokens"])], "telegram_user_id": 200000 + i}
+        return lambda client: client.post("/api/telegram/verify", json=body)
+    if scenario == "link-channel":
+        body = {
+            "telegram_user_id": rng.choice(state["users"]),
+            "channel_id": -1000000000 - i,
+            "channel_title": f"Bench channel {i}",
+        }
+        return lambda client: client.post("/api/telegram/link-channel", json=body)
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def build_requests(scenario: str, state: dict, count: int, seed: int) -> List[tuple]:
+    rng = random.Random(seed)
+    names, weights = zip(*MIX)
+    requests = []
+    for i in range(count):
+        name = rng.choices(names, weights)[0] if scenario == "mixed" else scenario
+        requests.append((name, make_request(name, state, i, rng)))
+    return requests
+
+
+async def drive(client: httpx.AsyncClient, requests: List[tuple], concurrency: int) -> dict:
+    """Прогон запросов concurrency параллельными клиентами (замкнутый цикл)"""
+    latencies: Dict[str, List[float]] = {}
+    errors = 0
+    queue = iter(requests)
+
+    async def worker() -> None:
+        nonlocal errors
+        for name, request in queue:
+            started = time.perf_counter()
+            response = await request(client)
+            latencies.setdefault(name, []).append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    every = [value for values in latencies.values() for value in values]
+    result = summarize(every, elapsed)
+    result["errors"] = errors
+    if len(latencies) > 1:
+        result["endpoints"] = {name: summarize(values, elapsed) for name, values in sorted(latencies.items())}
+    return result
+
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while True:
+            try:
+                if (await client.get("/api/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if process.poll() is not None:
+                with open(SERVER_LOG) as f:
+                    raise RuntimeError(f"uvicorn exited with code {process.returncode}:\n{f.read()[-2000:]}")
+            if time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not start in time")
+            await asyncio.sleep(0.1)
+
+
+async def run_suite(args: argparse.Namespace, backend_dir: str) -> List[dict]:
+    db = DatabaseService("db/app.db")
+    results = []
+    server = None
+    if args.uvicorn:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server_log = open(SERVER_LOG, "w")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            env={**os.environ, "PYTHONPATH": backend_dir},
+            # Логи сервера пишутся в файл: вывод в терминал заметно замедляет API
+            stdout=subprocess.DEVNULL,
+            stderr=server_log,
+        )
+        client_factory = lambda concurrency: httpx.AsyncClient(
+            base_url=base_url, limits=httpx.Limits(max_connections=concurrency)
+        )
+        lifespan = None
+    else:
+        from app import main as api
+        client_factory = lambda concurrency: httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api.app), base_url="http://api"
+        )
+        lifespan = api.app.router.lifespan_context(api.app)
+
+    try:
+        if server is not None:
+            await wait_for_server(base_url, server)
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                total = args.requests + WARMUP_REQUESTS
+                state = prepare_db(db, tokens=total, users=100)
+                requests = build_requests(scenario, state, total, args.seed)
+                async with client_factory(concurrency) as client:
+                    await drive(client, requests[:WARMUP_REQUESTS], concurrency)
+                    result = await drive(client, requests[WARMUP_REQUESTS:], concurrency)
+                result.update(scenario=scenario, concurrency=concurrency)
+                results.append(result)
+                print(f"{scenario:>16} c={concurrency:<4} {result['rps']:9.1f} req/s  "
+                      f"p50={result['p50_ms']:7.2f}ms p95={result['p95_ms']:7.2f}ms "
+                      f"p99={result['p99_ms']:7.2f}ms errors={result['errors']}")
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        if server is not None:
+            server.terminate()
+            server.wait()
+            server_log.close()
+        db.close()
+    return results
+
+
+def git_revision(backend_dir: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], previous_path: str) -> None:
+    with open(previous_path) as f:
+        previous = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {previous_path}:")
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if not before:
+            continue
+        print(f"{result['scenario']:>16} c={result['concurrency']:<4} "
+              f"req/s {(result['rps'] / before['rps'] - 1) * 100:+6.1f}%  "
+              f"p99 {(result['p99_ms'] / before['p99_ms'] - 1) * 100:+6.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на прогон")
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[1, 8, 32])
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=DEFAULT_SCENARIOS)
+    parser.add_argument("--uvicorn", action="store_true", help="запускать API отдельным процессом uvicorn")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="файл результатов (по умолчанию bench/results/api_load-<время>.json)")
+    parser.add_argument("--compare", help="файл предыдущих результатов для сравнения")
+    args = parser.parse_args()
+
+    backend_dir = os.getcwd()
+    output = args.output or os.path.join(
+        backend_dir, "bench", "results", f"api_load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    # app.main пишет БД и логи относительно текущего каталога
+    sys.path.insert(0, backend_dir)
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            results = asyncio.run(run_suite(args, backend_dir))
+        finally:
+            os.chdir(backend_dir)
+
+    report = {
+        "benchmark": "api_load",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(backend_dir),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mode": "uvicorn" if args.uvicorn else "in-process",
+        "requests": args.requests,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if compare_path:
+        compare(results, compare_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Сравнение пропускной способности DatabaseService: пул соединений против
+открытия нового соединения на каждый вызов.
+
+Запуск (из каталога backend):
+    python -m bench.db_pool --ops 5000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+from app.services.db_service import DatabaseService
+
+
+class ConnectPerCallDatabaseService(DatabaseService):
+    """Прежнее поведение: новое соединение на каждый вызов get_db()"""
+
+    @contextmanager
+    def get_db(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def run_workload(db: DatabaseService, ops: int) -> float:
+    """Смешанная нагрузка: запись поста и два чтения на операцию. Возвращает ops/sec"""
+    db.save_channel_binding(admin_id=1, channel_id=-100, channel_title="bench")
+    db.save_telegram_binding(telegram_user_id=42, admin_id=1)
+    started = time.perf_counter()
+    for i in range(ops):
+        db.save_post(-100, i, f"post {i}")
+        db.get_telegram_user_by_admin(1)
+        db.is_channel_linked(-100)
+    elapsed = time.perf_counter() - started
+    return ops / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, cls in (("connect-per-call", ConnectPerCallDatabaseService),
+                      ("pooled", DatabaseService)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = cls(os.path.join(tmp, "bench.db"))
+            results[name] = run_workload(db, args.ops)
+            db.close()
+        print(f"{name:>18}: {results[name]:10.1f} ops/sec")
+
+    print(f"{'speedup':>18}: {results['pooled'] / results['connect-per-call']:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
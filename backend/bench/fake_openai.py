@@ -0,0 +1,147 @@
+"""Локальный сервер, имитирующий OpenAI Chat Completions API.
+
+Отвечает на POST /v1/chat/completions с заданной задержкой и может
+возвращать 429 с заданной вероятностью. Используется бенчмарками вместо
+настоящего API, чтобы не тратить токены и не зависеть от сети.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Optional
+
+CHUNK_DELAY = 0.02
+
+
+class FakeOpenAIServer:
+    def __init__(self, latency: float = 0.2, rate_limit_ratio: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, reply: Optional[str] = None):
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.host = host
+        self.port = port
+        self.reply = reply
+        self.requests = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def make_reply(self, body: dict) -> str:
+        if self.reply is not None:
+            return self.reply
+        prompt = body["messages"][-1]["content"]
+        if "JSON object" in prompt:
+            # Запрос transform_many: по варианту на каждую платформу из промпта
+            platforms_line = prompt.split("platforms:", 1)[1].split("\n", 1)[0]
+            platforms = re.findall(r'"([^"]+)"', platforms_line)
+            return json.dumps({platform: f"Transformed for {platform}" for platform in platforms})
+        return f"Transformed: {prompt.strip()[:200]}"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # Keep-alive: обрабатываем запросы, пока клиент не закроет соединение
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                raw = await reader.readexactly(int(headers.get("content-length", 0)))
+                body = json.loads(raw or b"{}")
+                await self._respond(body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, body: dict, writer: asyncio.StreamWriter) -> None:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if random.random() < self.rate_limit_ratio:
+                self.rate_limited += 1
+                payload = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}})
+                self._write(writer, "429 Too Many Requests", "application/json", payload.encode(),
+                            extra="retry-after: 0.05\r\n")
+                return
+
+            reply = self.make_reply(body)
+            if body.get("stream"):
+                await self._stream(body, reply, writer)
+                return
+
+            await asyncio.sleep(self.latency)
+            payload = json.dumps({
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150},
+            })
+            self._write(writer, "200 OK", "application/json", payload.encode())
+        finally:
+            self.in_flight -= 1
+
+    async def _stream(self, body: dict, reply: str, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\n"
+                     b"transfer-encoding: chunked\r\n\r\n")
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(CHUNK_DELAY)
+            chunk = {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4"),
+                "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")},
+                             "finish_reason": None}],
+            }
+            self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        self._write_chunk(writer, b"")
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, status: str, content_type: str,
+               payload: bytes, extra: str = "") -> None:
+        writer.write(
+            f"HTTP/1.1 {status}\r\ncontent-type: {content_type}\r\n"
+            f"content-length: {len(payload)}\r\n{extra}\r\n".encode() + payload
+        )
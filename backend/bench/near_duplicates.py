@@ -0,0 +1,158 @@
+"""Экономия запросов к модели на потоке постов с почти-дубликатами.
+
+Генерирует --groups объявлений, каждое из которых публикуется еще
+--copies раз с небольшими правками (дата, время, замена слова, приписка),
+и --unique несвязанных постов. Посты поступают по одному с интервалом
+--arrival и трансформируются TransformWorker через локальный
+FakeOpenAIServer — с поиском почти-дубликатов и без него. Выводятся
+число запросов к модели, задержка от сохранения поста до результата и
+ошибки поиска: пост, сопоставленный с объявлением из другой группы.
+
+Запуск (из каталога backend):
+    python -m bench.near_duplicates --groups 20 --copies 4 --unique 40
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from openai import AsyncOpenAI
+
+from app.services.ai_service import AIService
+from app.services.db_service import DatabaseService
+from app.services.near_duplicates import DEFAULT_MAX_DISTANCE, NearDuplicateIndex
+from app.services.transform_worker import TransformWorker
+from bench.fake_openai import FakeOpenAIServer
+
+CHANNELS = [-1001, -1002, -1003, -1004]
+WORDS = (
+    "meetup webinar release course sale hiring podcast digest workshop conference python data "
+    "design growth marketing backend frontend mobile cloud security analytics community startup "
+    "product launch update feature beta discount ticket speaker agenda venue online offline "
+    "free early bird register link bio comments channel team remote office friday monday weekend "
+    "pizza coffee networking demo talk panel interview guide tips tricks best practices new"
+).split()
+MONTHS = ["March", "April", "May", "June"]
+EDITS = [
+    lambda text, rng: text.replace(f"{rng.choice(MONTHS)}", rng.choice(MONTHS), 1),
+    lambda text, rng: text.replace(":00", ":30", 1),
+    lambda text, rng: text + " See you there!",
+    lambda text, rng: "🔥 " + text,
+    lambda text, rng: text.replace("Join", "Come and join", 1),
+]
+
+
+def announcement(rng: random.Random) -> str:
+    topic = " ".join(rng.choices(WORDS, k=rng.randint(25, 45)))
+    return (f"Join our {rng.choice(WORDS)} {rng.choice(WORDS)} on {rng.choice(MONTHS)} "
+            f"{rng.randint(1, 28)} at {rng.randint(10, 20)}:00. {topic.capitalize()}. "
+            f"Details via the link in bio.")
+
+
+def workload(groups: int, copies: int, unique: int, seed: int) -> list:
+    """Посты в порядке поступления: (группа или None, текст)"""
+    rng = random.Random(seed)
+    originals = [(group, announcement(rng)) for group in range(groups)]
+    posts = list(originals)
+    for group, text in originals:
+        for _ in range(copies):
+            edited = text
+            for edit in rng.sample(EDITS, rng.randint(1, 2)):
+                edited = edit(edited, rng)
+            posts.append((group, edited))
+    posts += [(None, announcement(rng)) for _ in range(unique)]
+    # Оригинал каждой группы приходит раньше копий
+    head, tail = posts[:groups], posts[groups:]
+    rng.shuffle(tail)
+    return head + tail
+
+
+class RecordingIndex(NearDuplicateIndex):
+    """Индекс, запоминающий найденные пары для проверки точности"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.matches = {}
+
+    def find_duplicate(self, post, platforms):
+        duplicate = super().find_duplicate(post, platforms)
+        if duplicate:
+            self.matches[post["post_id"]] = (duplicate["post_id"], duplicate["distance"])
+        return duplicate
+
+
+async def run(posts: list, use_index: bool, max_distance: int, latency: float, arrival: float,
+              concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseService(os.path.join(tmp, "bench.db"))
+        index = RecordingIndex(db, max_distance=max_distance) if use_index else None
+        async with FakeOpenAIServer(latency=latency) as server:
+            client = AsyncOpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+            worker = TransformWorker(db, AIService(client=client), target_platforms=["twitter"],
+                                     concurrency=concurrency, poll_interval=0.05,
+                                     near_duplicates=index)
+            task = asyncio.create_task(worker.run())
+            for message_id, (_, text) in enumerate(posts, start=1):
+                await asyncio.to_thread(db.save_post, CHANNELS[message_id % len(CHANNELS)], message_id, text)
+                worker.notify()
+                await asyncio.sleep(arrival)
+            while worker.processed + worker.failed < len(posts):
+                await asyncio.sleep(0.01)
+            await worker.stop()
+            await task
+            await client.close()
+
+        with db.get_db() as conn:
+            rows = conn.execute("SELECT post_id, updated_at - created_at FROM posts ORDER BY post_id").fetchall()
+        db.close()
+
+    # post_id совпадает с порядком поступления
+    groups = {post_id: posts[post_id - 1][0] for post_id in range(1, len(posts) + 1)}
+    matches = index.matches if index else {}
+    wrong = sum(1 for post_id, (source, _) in matches.items()
+                if groups[post_id] is None or groups[post_id] != groups[source])
+    delays = [row[1] for row in rows]
+    return {
+        "llm_requests": server.requests,
+        "reused": len(matches),
+        "wrong": wrong,
+        "distances": [distance for _, distance in matches.values()],
+        "mean_delay": statistics.mean(delays),
+        "p95_delay": sorted(delays)[int(len(delays) * 0.95)],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--copies", type=int, default=4)
+    parser.add_argument("--unique", type=int, default=40)
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE)
+    parser.add_argument("--latency", type=float, default=0.5, help="задержка ответа модели, секунд")
+    parser.add_argument("--arrival", type=float, default=0.05, help="интервал между постами, секунд")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    posts = workload(args.groups, args.copies, args.unique, args.seed)
+    duplicates = args.groups * args.copies
+    print(f"{len(posts)} posts, {duplicates} near-duplicates")
+    for use_index in (False, True):
+        result = asyncio.run(run(posts, use_index, args.max_distance, args.latency, args.arrival,
+                                 args.concurrency))
+        line = (f"{'simhash index' if use_index else 'no index':>13}: {result['llm_requests']:4d} LLM requests, "
+                f"delay mean {result['mean_delay']:.2f}s p95 {result['p95_delay']:.2f}s")
+        if use_index:
+            distances = result["distances"] or [0]
+            line += (f", reused {result['reused']}/{duplicates} (wrong {result['wrong']}), "
+                     f"distance max {max(distances)} mean {statistics.mean(distances):.1f}")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Пропускная способность outbox в зависимости от числа процессов-воркеров.
+
+Заполняет outbox на временном SQLite и разбирает его 1, 2, 4... процессами
+с OutboxWorker, обработчик которого имитирует запрос к платформе
+(--latency). Обработанные id пишутся в отдельную таблицу, после прогона
+проверяется, что каждое сообщение обработано ровно один раз. Перед
+прогонами отдельный процесс захватывает часть сообщений и завершается без
+подтверждения: их должны подобрать воркеры после истечения аренды.
+
+Запуск (из каталога backend):
+    python -m bench.outbox --messages 2000 --processes 1,2,4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from app.services.db_service import DatabaseService
+from app.services.outbox import Outbox, OutboxWorker
+
+TOPIC = "publish.bench"
+LEASE_SECONDS = 2.0
+
+
+def worker_process(db_path: str, latency: float, concurrency: int) -> None:
+    logging.disable(logging.WARNING)
+    db = DatabaseService(db_path)
+
+    async def handle(payload: dict) -> None:
+        await asyncio.sleep(latency)
+        await asyncio.to_thread(record, payload["n"])
+
+    def record(n: int) -> None:
+        with db.get_db() as conn:
+            conn.execute("INSERT INTO handled (n) VALUES (?)", (n,))
+            conn.commit()
+
+    async def run() -> None:
+        worker = OutboxWorker(Outbox(db), TOPIC, handle, concurrency=concurrency,
+                              batch_size=concurrency, lease_seconds=LEASE_SECONDS, poll_interval=0.2)
+        task = asyncio.create_task(worker.run())
+        # Воркер останавливается, когда очередь пуста (с учетом арендованных сообщений)
+        while await asyncio.to_thread(remaining, db):
+            await asyncio.sleep(0.2)
+        await worker.stop()
+        await task
+
+    asyncio.run(run())
+    db.close()
+
+
+def remaining(db: DatabaseService) -> int:
+    with db.get_db() as conn:
+        return conn.execute("SELECT COUNT(*) FROM outbox WHERE topic = ?", (TOPIC,)).fetchone()[0]
+
+
+def crashed_process(db_path: str, count: int) -> None:
+    """Захват сообщений без подтверждения — как у упавшего воркера"""
+    db = DatabaseService(db_path)
+    db.claim_outbox(TOPIC, count, LEASE_SECONDS, "crashed")
+    os._exit(0)
+
+
+def run(db_path: str, messages: int, processes: int, latency: float, concurrency: int, crashed: int) -> dict:
+    db = DatabaseService(db_path)
+    db.reset_db()
+    db.init_db()
+    with db.get_db() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS handled (n INTEGER NOT NULL)")
+        conn.execute("DELETE FROM handled")
+        conn.commit()
+    db.enqueue_outbox([(TOPIC, {"n": n}) for n in range(messages)])
+
+    crash = multiprocessing.Process(target=crashed_process, args=(db_path, crashed))
+    crash.start()
+    crash.join()
+
+    started = time.perf_counter()
+    workers = [
+        multiprocessing.Process(target=worker_process, args=(db_path, latency, concurrency))
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    with db.get_db() as conn:
+        handled = conn.execute("SELECT COUNT(*), COUNT(DISTINCT n) FROM handled").fetchone()
+    db.close()
+    return {"elapsed": elapsed, "handled": handled[0], "distinct": handled[1]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--processes", type=lambda value: [int(v) for v in value.split(",")], default=[1, 2, 4])
+    parser.add_argument("--latency", type=float, default=0.05, help="время обработки сообщения, секунд")
+    parser.add_argument("--concurrency", type=int, default=8, help="задач на процесс")
+    parser.add_argument("--crashed", type=int, default=20, help="сообщений, захваченных упавшим воркером")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "outbox.db")
+        for processes in args.processes:
+            result = run(db_path, args.messages, processes, args.latency, args.concurrency, args.crashed)
+            status = "ok" if result["distinct"] == args.messages else "LOST MESSAGES"
+            print(f"processes={processes:<3} {args.messages / result['elapsed']:8.1f} msg/s "
+                  f"in {result['elapsed']:.2f}s, handled {result['handled']} "
+                  f"({result['distinct']} distinct) {status}")
+
+
+if __name__ == "__main__":
+    main()
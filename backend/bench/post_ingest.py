@@ -0,0 +1,81 @@
+"""Пропускная способность приема постов: save_post на каждый пост против
+пакетной записи через PostBuffer.
+
+Нагрузка — всплески по --rate постов в секунду (по умолчанию 10k/s),
+часть постов повторяется, как при повторной доставке апдейтов.
+--rate 0 снимает ограничение и показывает предельную пропускную способность.
+
+Запуск (из каталога backend):
+    python -m bench.post_ingest --posts 20000 --rate 10000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from app.services.db_service import DatabaseService
+from app.services.post_buffer import PostBuffer
+
+CHANNELS = [-1001, -1002, -1003, -1004]
+BURST_SIZE = 1000
+
+
+def synthetic_posts(count: int, duplicate_ratio: float = 0.05):
+    rng = random.Random(42)
+    for i in range(count):
+        message_id = rng.randrange(i) if i and rng.random() < duplicate_ratio else i
+        yield rng.choice(CHANNELS), message_id, f"Synthetic post {message_id} " * 8
+
+
+async def feed(put, count: int, rate: float) -> None:
+    """Подача постов всплесками по BURST_SIZE с целевой средней частотой rate"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for i, post in enumerate(synthetic_posts(count)):
+        await put(*post)
+        if rate and i % BURST_SIZE == BURST_SIZE - 1:
+            await asyncio.sleep(max(0.0, started + (i + 1) / rate - loop.time()))
+
+
+async def run_direct(db: DatabaseService, count: int, rate: float) -> float:
+    async def put(channel_id, message_id, content):
+        db.save_post(channel_id, message_id, content)
+
+    started = time.perf_counter()
+    await feed(put, count, rate)
+    return count / (time.perf_counter() - started)
+
+
+async def run_buffered(db: DatabaseService, count: int, rate: float) -> float:
+    buffer = PostBuffer(db)
+    buffer.start()
+    started = time.perf_counter()
+    await feed(buffer.put, count, rate)
+    await buffer.close()
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=10000)
+    args = parser.parse_args()
+
+    # Логи на каждый пост исказили бы результат
+    import logging
+    logging.disable(logging.INFO)
+
+    for name, runner in (("save_post", run_direct), ("PostBuffer", run_buffered)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseService(os.path.join(tmp, "bench.db"))
+            throughput = asyncio.run(runner(db, args.posts, args.rate))
+            with db.get_db() as conn:
+                stored = conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+            db.close()
+        print(f"{name:>12}: {throughput:10.1f} posts/sec, {stored} unique posts stored")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Стоимость планирования автопостинга на большом числе каналов.
+
+Загружает --channels каналов с интервалами от 10 минут до суток, затем
+прогоняет --hours часов по подставным часам: каждую секунду извлекаются
+наступившие сроки, а часть настроек меняется, как при правках из API.
+Печатает время загрузки, среднюю стоимость одной публикации и число
+срабатываний.
+
+Запуск (из каталога backend):
+    python -m bench.scheduler --channels 100000 --hours 6
+"""
+import argparse
+import random
+import time
+
+from app.services.scheduler import AutoPostScheduler
+
+INTERVALS = [600, 1800, 3600, 6 * 3600, 24 * 3600]
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=100000)
+    parser.add_argument("--hours", type=float, default=6)
+    parser.add_argument("--changes-per-second", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    clock = FakeClock()
+    scheduler = AutoPostScheduler(db=None, publish=None, clock=clock)
+    rows = [{"channel_id": -1000000 - i, "auto_posting": True, "post_interval": rng.choice(INTERVALS)}
+            for i in range(args.channels)]
+
+    started = time.perf_counter()
+    scheduler.apply_settings(rows)
+    load_time = time.perf_counter() - started
+
+    fired = 0
+    changes = 0
+    started = time.perf_counter()
+    for second in range(int(args.hours * 3600)):
+        clock.now = float(second)
+        fired += len(scheduler.pop_due())
+        changed = [{"channel_id": -1000000 - rng.randrange(args.channels),
+                    "auto_posting": rng.random() > 0.1,
+                    "post_interval": rng.choice(INTERVALS)}
+                   for _ in range(args.changes_per_second)]
+        scheduler.apply_settings(changed)
+        changes += len(changed)
+        scheduler.next_deadline()
+    run_time = time.perf_counter() - started
+
+    print(f"load:     {args.channels} channels in {load_time * 1000:.1f}ms")
+    print(f"simulate: {args.hours:g}h, {fired} publications, {changes} setting changes "
+          f"in {run_time:.2f}s ({run_time / max(1, fired + changes) * 1e6:.2f}us per event)")
+    print(f"state:    {len(scheduler)} channels scheduled, heap size {len(scheduler._heap)}")
+
+
+if __name__ == "__main__":
+    main()
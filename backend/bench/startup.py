@@ -0,0 +1,102 @@
+"""Бюджет времени холодного старта процессов API и бота.
+
+Каждый модуль импортируется в отдельном интерпретаторе под
+python -X importtime из пустого временного каталога. Проверяется, что:
+- импорт укладывается в бюджет (берется лучший из --runs запусков);
+- при импорте не загружаются тяжелые пакеты, которые нужны не каждому
+  маршруту (openai, aiogram, dotenv);
+- импорт не создает файлов (логи, БД) — это делает lifespan/post_init.
+Для API дополнительно измеряется время lifespan до приема запросов на
+пустой SQLite. Завершается с кодом 1, если бюджет превышен.
+
+Запуск (из каталога backend):
+    python -m bench.startup --import-budget-ms 700 --lifespan-budget-ms 200
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ("app.main", "bot.main")
+FORBIDDEN = ("openai", "aiogram", "dotenv")
+
+LIFESPAN_SCRIPT = """
+import asyncio, time
+started = time.perf_counter()
+from app import main as api
+imported = time.perf_counter()
+async def run():
+    async with api.app.router.lifespan_context(api.app):
+        ready = time.perf_counter()
+    return ready
+ready = asyncio.run(run())
+print(f"{(imported - started) * 1000:.1f} {(ready - imported) * 1000:.1f}")
+"""
+
+
+def run_python(args: list, cwd: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, DATABASE_URL="")
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def measure_import(module: str) -> dict:
+    """Импорт модуля под -X importtime: общее время, загруженные пакеты и созданные файлы"""
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run_python(["-X", "importtime", "-c", f"import {module}"], tmp)
+        created = sorted(os.listdir(tmp))
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # заголовок
+        imports[name.strip()] = int(cumulative) / 1000
+    return {"total_ms": imports[module], "modules": set(imports), "created": created}
+
+
+def measure_lifespan() -> float:
+    """Время от окончания импорта app.main до готовности приложения, мс"""
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run_python(["-c", LIFESPAN_SCRIPT], tmp)
+    return float(result.stdout.split()[1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=700)
+    parser.add_argument("--lifespan-budget-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    failures = 0
+    for module in MODULES:
+        runs = [measure_import(module) for _ in range(args.runs)]
+        best = min(runs, key=lambda run: run["total_ms"])
+        heavy = sorted({name.split(".")[0] for name in best["modules"]} & set(FORBIDDEN))
+        problems = []
+        if best["total_ms"] > args.import_budget_ms:
+            problems.append(f"over budget {args.import_budget_ms:.0f}ms")
+        if heavy:
+            problems.append(f"imports {', '.join(heavy)}")
+        if best["created"]:
+            problems.append(f"creates {', '.join(best['created'])}")
+        failures += bool(problems)
+        print(f"[{'FAIL' if problems else 'ok':>4}] import {module:<10} {best['total_ms']:7.1f}ms "
+              f"(median {sorted(run['total_ms'] for run in runs)[len(runs) // 2]:.1f}ms)"
+              + (f"  {'; '.join(problems)}" if problems else ""))
+
+    lifespan_ms = min(measure_lifespan() for _ in range(args.runs))
+    over = lifespan_ms > args.lifespan_budget_ms
+    failures += over
+    print(f"[{'FAIL' if over else 'ok':>4}] lifespan app.main {lifespan_ms:7.1f}ms"
+          + (f"  over budget {args.lifespan_budget_ms:.0f}ms" if over else ""))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
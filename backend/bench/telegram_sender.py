@@ -0,0 +1,106 @@
+"""Исходящая отправка в Bot API: без ограничений против TelegramSender.
+
+Имитация Bot API отвечает 429 с retry_after, если за последнюю секунду боту
+отправлено больше 30 сообщений или в чат больше одного, а в группу больше
+20 за минуту, как настоящий Telegram. Печатает достигнутую скорость,
+число 429 и задержку в очереди.
+
+Запуск (из каталога backend):
+    python -m bench.telegram_sender --messages 300 --chats 100
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict, deque
+
+from app.services.telegram_sender import TelegramSender
+
+
+class FakeRetryAfter(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Flood control exceeded. Retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class FakeBotAPI:
+    """Bot API со скользящими окнами лимитов и задержкой ответа"""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.sent = deque()
+        self.per_chat = defaultdict(deque)
+        self.rate_limited = 0
+        self.delivered = 0
+
+    @staticmethod
+    def _count(window: deque, now: float, period: float) -> int:
+        while window and window[0] <= now - period:
+            window.popleft()
+        return len(window)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> dict:
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        chat = self.per_chat[chat_id]
+        over_limit = (
+            self._count(self.sent, now, 1.0) >= 30
+            or (chat and chat[-1] > now - 1.0)
+            or (chat_id < 0 and self._count(chat, now, 60.0) >= 20)
+        )
+        if over_limit:
+            self.rate_limited += 1
+            raise FakeRetryAfter(1)
+        self.sent.append(now)
+        chat.append(now)
+        self.delivered += 1
+        return {"chat_id": chat_id, "text": text}
+
+
+async def run_naive(api: FakeBotAPI, messages: list) -> None:
+    async def send(chat_id: int, text: str) -> None:
+        # Старое поведение: ошибка логируется и сообщение теряется
+        try:
+            await api.send_message(chat_id=chat_id, text=text)
+        except Exception:
+            pass
+
+    await asyncio.gather(*(send(chat_id, text) for chat_id, text in messages))
+
+
+async def run_sender(api: FakeBotAPI, messages: list) -> TelegramSender:
+    sender = TelegramSender(api.send_message)
+    await asyncio.gather(*(sender.send(chat_id, text) for chat_id, text in messages))
+    return sender
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    chats = [rng.choice([1, -1]) * (1000 + i) for i in range(args.chats)]
+    messages = [(rng.choice(chats), f"message {i}") for i in range(args.messages)]
+
+    api = FakeBotAPI(args.latency)
+    started = time.perf_counter()
+    asyncio.run(run_naive(api, messages))
+    elapsed = time.perf_counter() - started
+    print(f"naive:  delivered {api.delivered}/{len(messages)} in {elapsed:.2f}s, "
+          f"429s {api.rate_limited}")
+
+    api = FakeBotAPI(args.latency)
+    started = time.perf_counter()
+    sender = asyncio.run(run_sender(api, messages))
+    elapsed = time.perf_counter() - started
+    stats = sender.stats()
+    print(f"sender: delivered {api.delivered}/{len(messages)} in {elapsed:.2f}s "
+          f"({api.delivered / elapsed:.1f} msg/s), 429s {api.rate_limited}, "
+          f"queue latency p50={stats['queue_latency_p50']:.2f}s p99={stats['queue_latency_p99']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Пропускная способность TransformWorker в зависимости от concurrency.
+
+Воркер работает с локальным FakeOpenAIServer (задержка ответа --latency,
+доля ответов 429 --rate-limit-ratio) и временной SQLite.
+
+Запуск (из каталога backend):
+    python -m bench.transform_worker --posts 200 --concurrency 1 4 16
+    python -m bench.transform_worker --targets twitter linkedin vk
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from openai import AsyncOpenAI
+
+from app.services.ai_service import AIService
+from app.services.db_service import DatabaseService
+from app.services.transform_worker import TransformWorker
+from bench.fake_openai import FakeOpenAIServer
+
+
+async def run(posts: int, concurrency: int, latency: float, rate_limit_ratio: float,
+              targets: list) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseService(os.path.join(tmp, "bench.db"))
+        db.save_posts([(-100, i, f"Post number {i}", time.time()) for i in range(posts)])
+
+        async with FakeOpenAIServer(latency=latency, rate_limit_ratio=rate_limit_ratio) as server:
+            client = AsyncOpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+            worker = TransformWorker(db, AIService(client=client), target_platforms=targets,
+                                     concurrency=concurrency,
+                                     poll_interval=0.05, base_backoff=0.05)
+            started = time.perf_counter()
+            task = asyncio.create_task(worker.run())
+            while worker.processed + worker.failed < posts:
+                await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - started
+            await worker.stop()
+            await task
+            await client.close()
+
+        db.close()
+        return {
+            "concurrency": concurrency,
+            "posts_per_sec": posts / elapsed,
+            "max_in_flight": server.max_in_flight,
+            "rate_limited": server.rate_limited,
+            "failed": worker.failed,
+            "requests_per_post": server.requests / posts,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.05)
+    parser.add_argument("--targets", nargs="+", default=["twitter"])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    for concurrency in args.concurrency:
+        result = asyncio.run(run(args.posts, concurrency, args.latency, args.rate_limit_ratio,
+                                 args.targets))
+        print(f"concurrency={result['concurrency']:>3}: {result['posts_per_sec']:8.1f} posts/sec "
+              f"(max in flight {result['max_in_flight']}, 429s {result['rate_limited']}, "
+              f"failed {result['failed']}, {result['requests_per_post']:.2f} LLM requests/post)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Пропускная способность и задержка приема постов в режиме webhook.
+
+Поднимает app.main:app в процессе (через httpx.ASGITransport) с включенным
+webhook и рядом бота в режиме webhook (bot.main.run_webhook_mode), который
+забирает обновления из outbox. Бот направляется на локальную имитацию
+Bot API, синтетические channel_post отправляются так же, как это делает
+Telegram. Измеряет задержку ответа webhook и время до записи всех постов
+в БД.
+
+Запуск (из каталога backend):
+    python -m bench.webhook_ingest --updates 5000 --concurrency 32
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench.fake_telegram import FakeTelegramServer
+
+CHANNEL_ID = -1001234567890
+SECRET = "bench-secret"
+
+
+def make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "channel_post": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": CHANNEL_ID, "type": "channel", "title": "Bench"},
+            "text": f"Synthetic post {update_id}",
+        },
+    }
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(updates: int, concurrency: int) -> None:
+    async with FakeTelegramServer() as telegram:
+        os.environ.update(
+            TELEGRAM_BOT_TOKEN="123456:BENCH",
+            TELEGRAM_API_BASE_URL=telegram.base_url,
+            TELEGRAM_WEBHOOK_URL="https://bench.invalid/api/telegram/webhook",
+            TELEGRAM_WEBHOOK_SECRET=SECRET,
+        )
+        from app import main as api
+        from bot import main as bot
+        logging.disable(logging.INFO)
+
+        async with api.app.router.lifespan_context(api.app):
+            api.db.db.save_channel_binding(1, CHANNEL_ID, "Bench")
+            bot_stopping = asyncio.Event()
+            bot_task = asyncio.create_task(bot.run_webhook_mode(
+                os.environ["TELEGRAM_BOT_TOKEN"], os.environ["TELEGRAM_WEBHOOK_URL"], bot_stopping
+            ))
+
+            latencies = []
+            semaphore = asyncio.Semaphore(concurrency)
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+                async def post(update_id: int) -> None:
+                    async with semaphore:
+                        started = time.perf_counter()
+                        response = await client.post(
+                            "/api/telegram/webhook",
+                            json=make_update(update_id),
+                            headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+                        )
+                        latencies.append(time.perf_counter() - started)
+                        response.raise_for_status()
+
+                started = time.perf_counter()
+                await asyncio.gather(*(post(i) for i in range(1, updates + 1)))
+                acked = time.perf_counter() - started
+
+                while True:
+                    with api.db.db.get_db() as conn:
+                        stored = conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+                    if stored >= updates:
+                        break
+                    await asyncio.sleep(0.01)
+                ingested = time.perf_counter() - started
+            bot_stopping.set()
+            await bot_task
+
+    print(f"webhook ack: {updates / acked:10.1f} updates/sec, "
+          f"p50={statistics.median(latencies) * 1000:.2f}ms p99={percentile(latencies, 99) * 1000:.2f}ms")
+    print(f"ingested:    {updates / ingested:10.1f} posts/sec end-to-end ({ingested:.2f}s)")
+    print(f"Bot API calls: {dict(telegram.calls)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    # app.main пишет БД и логи относительно текущего каталога
+    backend_dir = os.getcwd()
+    sys.path.insert(0, backend_dir)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            asyncio.run(run(args.updates, args.concurrency))
+        finally:
+            os.chdir(backend_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,69 @@
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+import asyncio
 import os
+import signal
 import sys
 import logging
 from datetime import datetime
+from typing import Optional
 import logging.config
 
-# Load logging configuration at the start
-logging.config.fileConfig('logging.conf')
-
-# Disable httpx logs which contain the bot token
-logging.getLogger("httpx").setLevel(logging.WARNING)
-
 # Добавляем путь к backend/app в PYTHONPATH
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from app.services.env import load_local_env
 from app.services.db_service import DatabaseService
-
-# Настройка логирования
-os.makedirs('logs/bot', exist_ok=True)
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('logs/bot/bot.log'),
-        logging.StreamHandler()
-    ]
+from app.services.async_db_service import AsyncDatabaseService
+from app.services.channel_index import ChannelIndex
+from app.services.post_buffer import PostBuffer
+from app.services.transform_worker import TransformWorker, DEFAULT_CONCURRENCY
+from app.services.near_duplicates import NearDuplicateIndex, DEFAULT_MAX_DISTANCE, DEFAULT_WINDOW
+from app.services.update_processor import ShardedUpdateProcessor, DEFAULT_SHARDS
+from app.services.scheduler import AutoPostScheduler, DEFAULT_PUBLISH_WORKERS
+from app.services.metrics import REGISTRY, start_metrics_server
+from app.services.outbox import Outbox, OutboxWorker
+from app.services.telegram_webhook import (
+    DEFAULT_NOTIFY_ADDRESS, DEFAULT_POLL_INTERVAL, UpdateConsumer, webhook_secret,
 )
+from app.services.storage import is_postgres_url
+
 logger = logging.getLogger(__name__)
 
-db = DatabaseService()
+# Переменные из .env нужны до чтения настроек ниже
+load_local_env()
+
+# Типы обновлений, которые нужны обработчикам: команды в личке и посты каналов
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CHANNEL_POST, Update.EDITED_CHANNEL_POST]
+
+# Схема БД проверяется в post_init, а не при импорте: импорт модуля не
+# должен обращаться к диску (см. bench/startup.py)
+db = DatabaseService(initialize=False)
+channel_index = ChannelIndex(db)
+post_buffer = PostBuffer(db)
+outbox = Outbox(db)
+transform_worker = None
+scheduler = None
+# Воркеры публикации по темам outbox (publish.<платформа>)
+publish_workers = {}
+# Платформы, для которых делаются трансформации и публикации
+TARGET_PLATFORMS = os.getenv("TRANSFORM_TARGETS", "twitter").split(",")
+
+# Метрики процесса бота отдаются на отдельном порту (0 — не запускать)
+METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "9101"))
+
+channel_posts = REGISTRY.counter(
+    "bot_channel_posts_total", "Channel post updates by outcome (queued, not_linked, no_text)", ("result",)
+)
+REGISTRY.gauge("bot_post_buffer_pending", "Posts waiting in the post buffer").set_function(
+    lambda: {(): len(post_buffer)}
+)
+
+# Как часто писать в лог глубину очередей обработки обновлений, секунд
+UPDATE_STATS_INTERVAL = float(os.getenv("UPDATE_STATS_INTERVAL", "60"))
+# Режим webhook: адрес, на котором бот ждет уведомлений API о новых
+# обновлениях (пустой — только опрос), и интервал опроса outbox, секунд
+WEBHOOK_NOTIFY_ADDRESS = os.getenv("TELEGRAM_WEBHOOK_NOTIFY_ADDRESS", DEFAULT_NOTIFY_ADDRESS)
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", DEFAULT_POLL_INTERVAL))
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработка команды /start"""
@@ -50,7 +85,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def handle_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработка новых постов в каналах"""
-    logger.info("Received channel post update")
+    logger.debug("Received channel post update")
     message = update.channel_post or update.edited_channel_post
     if not message:
         logger.warning("No message in update")
@@ -58,54 +93,178 @@ async def handle_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     channel_id = message.chat_id
     message_id = message.message_id
-    chat_type = message.chat.type
+
+    # Проверяем, является ли канал одним из привязанных (без запросов к БД,
+    # пока множество каналов не изменилось)
+    if channel_id not in channel_index:
+        logger.debug(f"Ignoring post from non-linked channel: {channel_id}")
+        channel_posts.inc("not_linked")
+        return
 
     logger.info(f"""
     Received post:
     Channel ID: {channel_id}
     Message ID: {message_id}
-    Chat Type: {chat_type}
+    Chat Type: {message.chat.type}
     Text: {message.text or message.caption or 'No text'}
     """)
 
-    # Проверяем, является ли канал одним из привязанных
-    channel_ids = db.get_channel_ids()
-    logger.info(f"Linked channels: {channel_ids}")
-
-    if channel_id not in channel_ids:
-        logger.info(f"Ignoring post from non-linked channel: {channel_id}")
-        return
-
     # Получаем контент поста
     content = message.text or message.caption or ""
     if not content:
         logger.info(f"Ignoring post without text content: channel={channel_id}, message={message_id}")
+        channel_posts.inc("no_text")
         return
 
-    # Сохраняем пост
+    # Ставим пост в буфер, запись в БД выполняется пакетами
     try:
-        db.save_post(channel_id, message_id, content)
-        logger.info(f"Successfully saved post: channel={channel_id}, message={message_id}")
+        await post_buffer.put(channel_id, message_id, content)
+        channel_posts.inc("queued")
+        logger.info(f"Post queued for saving: channel={channel_id}, message={message_id}")
     except Exception as e:
         logger.error(f"Error saving post: {str(e)}")
         raise
 
+async def publish_channel(channel_id: int) -> None:
+    """Постановка следующего трансформированного поста канала в outbox по расписанию"""
+    post = await asyncio.to_thread(db.queue_post_for_publishing, channel_id)
+    if not post:
+        logger.debug(f"No transformed posts to publish for channel {channel_id}")
+        return
+    logger.info(f"Queued post {post['post_id']} from channel {channel_id} "
+                f"for {', '.join(post['transforms']) or 'no platforms'}")
+    for platform in post["transforms"]:
+        worker = publish_workers.get(f"publish.{platform}")
+        if worker:
+            worker.notify()
+
+async def publish_to_platform(message: dict) -> None:
+    """Публикация варианта поста на целевой платформе"""
+    # Клиентов целевых платформ пока нет: публикация выводится в лог
+    logger.info(f"Publishing post {message['post_id']} from channel {message['channel_id']} "
+                f"to {message['platform']}")
+
+async def post_init(application: Application) -> None:
+    """Запуск фоновых задач после инициализации приложения"""
+    global transform_worker, scheduler
+    await asyncio.to_thread(db.init_db)
+    post_buffer.start()
+    if METRICS_PORT:
+        application.bot_data["metrics_server"] = await start_metrics_server(
+            os.getenv("BOT_METRICS_HOST", "0.0.0.0"), METRICS_PORT
+        )
+    application.bot_data["update_stats_task"] = asyncio.create_task(
+        log_update_stats(application.update_processor)
+    )
+    scheduler = AutoPostScheduler(
+        db,
+        publish_channel,
+        workers=int(os.getenv("AUTO_POSTING_WORKERS", DEFAULT_PUBLISH_WORKERS)),
+    )
+    application.bot_data["scheduler_task"] = asyncio.create_task(scheduler.run())
+    for platform in TARGET_PLATFORMS:
+        worker = OutboxWorker(outbox, f"publish.{platform}", publish_to_platform)
+        publish_workers[worker.topic] = worker
+        application.bot_data[f"{worker.topic}_task"] = asyncio.create_task(worker.run())
+
+    if not os.getenv("OPENAI_API_KEY"):
+        logger.warning("No OpenAI API key provided, transform worker is disabled")
+        return
+
+    from app.services.ai_service import AIService
+    from app.services.transform_cache import TransformCache
+    # Отрицательное расстояние отключает поиск почти-дубликатов
+    max_distance = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", DEFAULT_MAX_DISTANCE))
+    near_duplicates = None
+    if max_distance >= 0:
+        near_duplicates = NearDuplicateIndex(
+            db, max_distance=max_distance,
+            window=float(os.getenv("NEAR_DUPLICATE_WINDOW_HOURS", DEFAULT_WINDOW / 3600)) * 3600,
+        )
+    transform_worker = TransformWorker(
+        db,
+        AIService(cache=TransformCache(AsyncDatabaseService(db))),
+        target_platforms=TARGET_PLATFORMS,
+        concurrency=int(os.getenv("TRANSFORM_CONCURRENCY", DEFAULT_CONCURRENCY)),
+        near_duplicates=near_duplicates,
+    )
+    application.bot_data["transform_task"] = asyncio.create_task(transform_worker.run())
+
+async def post_shutdown(application: Application) -> None:
+    """Остановка планировщика, сброс буфера постов и остановка воркера при остановке бота"""
+    application.bot_data["update_stats_task"].cancel()
+    metrics_server = application.bot_data.get("metrics_server")
+    if metrics_server:
+        metrics_server.close()
+    await scheduler.stop()
+    await application.bot_data["scheduler_task"]
+    for topic, worker in publish_workers.items():
+        await worker.stop()
+        await application.bot_data[f"{topic}_task"]
+    await post_buffer.close()
+    if transform_worker:
+        await transform_worker.stop()
+        await application.bot_data["transform_task"]
+
+async def log_update_stats(processor: ShardedUpdateProcessor) -> None:
+    """Периодический вывод глубины очередей по шардам"""
+    while True:
+        await asyncio.sleep(UPDATE_STATS_INTERVAL)
+        stats = processor.stats()
+        if any(shard["processed"] or shard["depth"] for shard in stats):
+            logger.info("Update shards: " + ", ".join(
+                f"#{shard['shard']} depth={shard['depth']} max={shard['max_depth']} "
+                f"processed={shard['processed']}"
+                for shard in stats
+            ))
+
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработка ошибок"""
     logger.error(f"Exception while handling an update: {context.error}")
 
-def main() -> None:
-    """Запуск бота"""
-    # Получаем токен из переменной окружения
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not token:
-        logger.error("No bot token provided")
-        return
+def configure_logging() -> None:
+    """Настройка логирования процесса бота"""
+    # Load logging configuration at the start
+    logging.config.fileConfig('logging.conf')
 
-    logger.info("Starting bot...")
+    # Disable httpx logs which contain the bot token
+    logging.getLogger("httpx").setLevel(logging.WARNING)
 
-    # Создаем приложение
-    application = Application.builder().token(token).build()
+    # Настройка логирования
+    os.makedirs('logs/bot', exist_ok=True)
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        handlers=[
+            logging.FileHandler('logs/bot/bot.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+def build_application(token: str, webhook: bool = False) -> Application:
+    """Создание приложения бота со всеми обработчиками.
+
+    В режиме webhook приложение создается без Updater: обновления, принятые
+    API (см. app.services.telegram_webhook), в application.update_queue
+    кладет run_webhook_mode.
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Каналы обрабатываются параллельно, обновления одного чата - по порядку
+        .concurrent_updates(ShardedUpdateProcessor(
+            shards=int(os.getenv("UPDATE_SHARDS", DEFAULT_SHARDS)),
+        ))
+    )
+    # Позволяет направить бота на локальную имитацию Bot API
+    base_url = os.getenv("TELEGRAM_API_BASE_URL")
+    if base_url:
+        builder = builder.base_url(f"{base_url.rstrip('/')}/bot")
+    if webhook:
+        builder = builder.updater(None)
+    application = builder.build()
 
     # Добавляем обработчики
     application.add_handler(CommandHandler("start", start))
@@ -124,13 +283,86 @@ def main() -> None:
 
     # Добавляем обработчик ошибок
     application.add_error_handler(error_handler)
+    return application
+
+async def run_webhook_mode(token: str, url: str, stopping: Optional[asyncio.Event] = None) -> None:
+    """Работа бота в режиме webhook до stopping (по умолчанию — до SIGINT/SIGTERM).
+
+    Обновления принимает API и кладет в outbox, здесь UpdateConsumer
+    забирает их по порядку (по уведомлению API) и передает в
+    application.update_queue. Фоновые задачи (post_init) работают только в
+    этом процессе. Обновления подтверждаются после передачи в очередь
+    приложения, как и offset в режиме polling.
+    """
+    application = build_application(token, webhook=True)
+    await application.initialize()
+    # post_init вызывается только run_polling/run_webhook, здесь — вручную
+    await post_init(application)
+    await application.start()
+    await application.bot.set_webhook(
+        url=url,
+        allowed_updates=ALLOWED_UPDATES,
+        secret_token=webhook_secret(token, os.getenv("TELEGRAM_WEBHOOK_SECRET")),
+    )
+    logger.info(f"Telegram webhook registered: {url}")
+
+    async def feed_update(payload: dict) -> None:
+        await application.update_queue.put(Update.de_json(payload, application.bot))
+
+    updates_worker = UpdateConsumer(db, feed_update, notify_address=WEBHOOK_NOTIFY_ADDRESS,
+                                    poll_interval=WEBHOOK_POLL_INTERVAL)
+    if stopping is None:
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+    updates_task = asyncio.create_task(updates_worker.run())
+    try:
+        await stopping.wait()
+    finally:
+        # Webhook не удаляем: при перезапуске обновления дождутся в outbox
+        await updates_worker.stop()
+        await updates_task
+        await application.stop()
+        await post_shutdown(application)
+        await application.shutdown()
+
+def main() -> None:
+    """Запуск бота"""
+    configure_logging()
+
+    # Получаем токен из переменной окружения
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not token:
+        logger.error("No bot token provided")
+        return
+
+    # Бот хранит каналы, посты и outbox в SQLite: с PostgreSQL у API
+    # привязки каналов оказались бы в другой БД
+    if is_postgres_url(os.getenv("DATABASE_URL")):
+        logger.error("PostgreSQL DATABASE_URL is not supported by the bot yet")
+        return
+
+    webhook_url = os.getenv("TELEGRAM_WEBHOOK_URL")
+    if webhook_url:
+        # Обновления принимает API (POST /api/telegram/webhook), polling
+        # конфликтовал бы с установленным webhook
+        logger.info("Starting bot in webhook mode...")
+        asyncio.run(run_webhook_mode(token, webhook_url))
+        logger.info("Bot stopped")
+        return
+
+    logger.info("Starting bot...")
+
+    # Создаем приложение
+    application = build_application(token)
 
     logger.info("Bot is ready to start polling")
 
     # Запускаем бота
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
     logger.info("Bot stopped")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,11 @@
+import pytest
+
+from app.services.db_service import DatabaseService
+
+
+@pytest.fixture
+def db(tmp_path):
+    """DatabaseService над пустым файлом SQLite"""
+    db = DatabaseService(str(tmp_path / "test.db"))
+    yield db
+    db.close()
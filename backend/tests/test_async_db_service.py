@@ -0,0 +1,94 @@
+"""AsyncDatabaseService не блокирует event loop на медленных записях.
+
+Медленный fsync имитируется задержкой в save_token. Читатели приходят с
+фиксированным шагом, задержка считается от запланированного прихода,
+поэтому учитывает время, пока event loop стоял.
+"""
+import asyncio
+import time
+
+from app.services.async_db_service import AsyncDatabaseService
+from app.services.db_service import DatabaseService
+
+WRITE_DELAY = 0.05
+REQUESTS = 100
+INTERVAL = 0.002
+WRITERS = 2
+
+
+class SlowWriteDatabaseService(DatabaseService):
+    def save_token(self, token: str, admin_id: int) -> None:
+        time.sleep(WRITE_DELAY)
+        super().save_token(token, admin_id)
+
+
+class BlockingAdapter:
+    """Синхронные вызовы внутри корутин, как было до AsyncDatabaseService"""
+
+    def __init__(self, db: DatabaseService):
+        self.db = db
+
+    async def save_token(self, token: str, admin_id: int) -> None:
+        self.db.save_token(token, admin_id)
+
+    async def get_telegram_user_by_admin(self, admin_id: int):
+        return self.db.get_telegram_user_by_admin(admin_id)
+
+
+def p99(values: list) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(0.99 * (len(ordered) - 1))))]
+
+
+async def read_latencies(db, requests: int = REQUESTS) -> list:
+    loop = asyncio.get_running_loop()
+    latencies = []
+    stop = asyncio.Event()
+
+    async def writer(n: int) -> None:
+        i = 0
+        while not stop.is_set():
+            await db.save_token(f"token-{n}-{i}", 1)
+            i += 1
+            # Даем event loop переключиться на читателей
+            await asyncio.sleep(0)
+
+    async def reader(scheduled_at: float) -> None:
+        await db.get_telegram_user_by_admin(1)
+        latencies.append(loop.time() - scheduled_at)
+
+    writer_tasks = [asyncio.create_task(writer(n)) for n in range(WRITERS)]
+    reader_tasks = []
+    started = loop.time()
+    for i in range(requests):
+        scheduled_at = started + i * INTERVAL
+        await asyncio.sleep(max(0.0, scheduled_at - loop.time()))
+        reader_tasks.append(asyncio.create_task(reader(scheduled_at)))
+    await asyncio.gather(*reader_tasks)
+    stop.set()
+    await asyncio.gather(*writer_tasks)
+    return latencies
+
+
+def test_blocking_calls_stall_readers(tmp_path):
+    # Проверка самого сценария: синхронные записи задерживают чтения.
+    # Каждое чтение здесь ждет записи, поэтому запросов меньше
+    db = SlowWriteDatabaseService(str(tmp_path / "test.db"))
+    try:
+        latencies = asyncio.run(read_latencies(BlockingAdapter(db), requests=10))
+    finally:
+        db.close()
+    assert p99(latencies) >= WRITE_DELAY
+
+
+def test_slow_writes_do_not_delay_reads(tmp_path):
+    storage = AsyncDatabaseService(SlowWriteDatabaseService(str(tmp_path / "test.db")))
+
+    async def run() -> list:
+        try:
+            return await read_latencies(storage)
+        finally:
+            await storage.close()
+
+    latencies = asyncio.run(run())
+    assert p99(latencies) < WRITE_DELAY / 2
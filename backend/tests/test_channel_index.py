@@ -0,0 +1,74 @@
+from app.services.channel_index import ChannelIndex
+from app.services.db_service import DatabaseService
+
+
+class CountingDatabaseService(DatabaseService):
+    loads = 0
+    revision_checks = 0
+
+    def get_channel_ids(self):
+        self.loads += 1
+        return super().get_channel_ids()
+
+    @property
+    def channels_revision(self) -> int:
+        self.revision_checks += 1
+        return super().channels_revision
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_index_reloads_only_on_channel_changes(tmp_path):
+    db = CountingDatabaseService(str(tmp_path / "test.db"))
+    # Привязки каналов пишет процесс API через свое соединение
+    api_db = DatabaseService(str(tmp_path / "test.db"))
+    clock = FakeClock()
+    try:
+        index = ChannelIndex(db, poll_interval=1.0, clock=clock)
+        assert -100 not in index
+        assert db.loads == 1
+
+        # Другие записи не заставляют перечитывать каналы
+        api_db.save_post(-200, 1, "post")
+        api_db.save_token("token", 1)
+        clock.now += 1
+        assert -100 not in index
+        assert db.loads == 1
+
+        api_db.save_channel_binding(1, -100, "channel")
+        clock.now += 1
+        assert -100 in index
+        assert db.loads == 2
+
+        api_db.remove_channel_binding(1)
+        clock.now += 1
+        assert -100 not in index
+        assert db.loads == 3
+    finally:
+        api_db.close()
+        db.close()
+
+
+def test_posts_between_checks_cost_no_queries(tmp_path):
+    db = CountingDatabaseService(str(tmp_path / "test.db"))
+    clock = FakeClock()
+    try:
+        index = ChannelIndex(db, poll_interval=1.0, clock=clock)
+        for _ in range(100):
+            assert -100 not in index
+        assert db.revision_checks == 1
+
+        # Новая привязка видна после следующей сверки ревизии
+        db.save_channel_binding(1, -100, "channel")
+        assert -100 not in index
+        clock.now += 1
+        assert -100 in index
+        assert db.revision_checks == 2
+    finally:
+        db.close()
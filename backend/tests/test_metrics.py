@@ -0,0 +1,18 @@
+import pytest
+
+from app.services.metrics import Counter
+
+
+def test_counter_increments_by_amount():
+    counter = Counter("test_events_total", "Test events", ("result",))
+    counter.inc("ok")
+    counter.inc("ok", amount=2)
+    assert counter.get("ok") == 3
+    assert counter.render()[-1] == 'test_events_total{result="ok"} 3'
+
+
+def test_counter_rejects_negative_amount():
+    counter = Counter("test_events_total", "Test events")
+    with pytest.raises(ValueError):
+        counter.inc(amount=-1)
+    assert counter.get() == 0
@@ -0,0 +1,67 @@
+import time
+
+from app.services.near_duplicates import NearDuplicateIndex, patch_transform
+
+SOURCE = (
+    "Join our python meetup on May 5 at 10:00. Three talks about async code, testing and packaging, "
+    "then pizza, coffee and networking with the community. Bring your laptop, questions and friends, "
+    "seats are limited so register early. Free entry for students. Details via the link in bio."
+)
+
+
+def test_save_posts_counts_posts_not_index_rows(db):
+    now = time.time()
+    assert db.save_posts([(-100, 1, SOURCE, now), (-100, 2, "another post", now)]) == 2
+    edited = SOURCE.replace("May", "June")
+    assert db.save_posts([(-100, 1, edited, now), (-100, 2, "another post", now)]) == 1
+    assert db.save_posts([(-100, 1, edited, now)]) == 0
+
+
+def test_patch_transform_replaces_changed_words():
+    target = SOURCE.replace("May", "June")
+    assert patch_transform(SOURCE, target, "Python meetup, May 5, 10:00!") == "Python meetup, June 5, 10:00!"
+
+
+def test_patch_transform_fails_when_edit_is_ambiguous():
+    target = SOURCE.replace("May", "June")
+    # Старого варианта нет в трансформации
+    assert patch_transform(SOURCE, target, "Python meetup next week") is None
+    # Старый вариант встречается дважды
+    assert patch_transform(SOURCE, target, "May 5! See you May 5") is None
+
+
+def test_patch_transform_fails_on_inserted_or_deleted_words():
+    transform = "Seats are limited, free entry for students"
+    # Вставленное отрицание меняет смысл: трансформацию нельзя переиспользовать
+    assert patch_transform(SOURCE, SOURCE.replace("are limited", "are not limited"), transform) is None
+    assert patch_transform(SOURCE, SOURCE.replace("Free entry", "No free entry"), transform) is None
+    assert patch_transform(SOURCE, SOURCE.replace("Free entry for students. ", ""), transform) is None
+
+
+def transformed_duplicate(db, transform: str) -> dict:
+    """Трансформированный пост SOURCE и его правка, ожидающая трансформации"""
+    db.save_post(-100, 1, SOURCE)
+    original = db.claim_pending_posts(1)[0]
+    db.complete_post(original["post_id"], {"twitter": transform}, original["revision"])
+    db.save_post(-100, 2, SOURCE.replace("May", "June"))
+    return db.claim_pending_posts(1)[0]
+
+
+def test_duplicate_transforms_are_patched(db):
+    post = transformed_duplicate(db, "Python meetup on May 5")
+    duplicate = NearDuplicateIndex(db).find_duplicate(post, ["twitter"])
+    assert duplicate["transforms"] == {"twitter": "Python meetup on June 5"}
+
+
+def test_duplicate_with_inserted_negation_goes_to_model(db):
+    db.save_post(-100, 1, SOURCE)
+    original = db.claim_pending_posts(1)[0]
+    db.complete_post(original["post_id"], {"twitter": "Seats are limited!"}, original["revision"])
+    db.save_post(-100, 2, SOURCE.replace("are limited", "are not limited"))
+    post = db.claim_pending_posts(1)[0]
+    assert NearDuplicateIndex(db).find_duplicate(post, ["twitter"]) is None
+
+
+def test_unpatchable_duplicate_goes_to_model(db):
+    post = transformed_duplicate(db, "Python meetup next week")
+    assert NearDuplicateIndex(db).find_duplicate(post, ["twitter"]) is None
@@ -0,0 +1,62 @@
+import asyncio
+
+from app.services.outbox import Outbox, OutboxWorker
+
+
+def test_expired_leases_count_as_attempts(db):
+    outbox = Outbox(db, max_attempts=2)
+
+    async def run():
+        message_id = await outbox.enqueue("publish.twitter", {"post_id": 1})
+        # Воркер захватывает сообщение и падает, не вызвав nack: аренда истекает
+        for attempt in (1, 2):
+            messages = await outbox.claim_batch("publish.twitter", lease_seconds=0)
+            assert [(m["id"], m["attempts"]) for m in messages] == [(message_id, attempt)]
+        assert await outbox.claim_batch("publish.twitter", lease_seconds=0) == []
+        return message_id, await outbox.dead_letters("publish.twitter")
+
+    message_id, dead = asyncio.run(run())
+    assert [(m["id"], m["attempts"]) for m in dead] == [(message_id, 2)]
+    assert "Lease expired" in dead[0]["last_error"]
+
+
+def test_nack_retries_until_max_attempts(db):
+    outbox = Outbox(db, max_attempts=2, base_backoff=0)
+
+    async def run():
+        await outbox.enqueue("publish.twitter", {"post_id": 1})
+        for _ in range(2):
+            message, = await outbox.claim_batch("publish.twitter")
+            assert await outbox.nack(message, "error")
+        return await outbox.pending("publish.twitter"), await outbox.dead_letters("publish.twitter")
+
+    pending, dead = asyncio.run(run())
+    assert pending == []
+    assert [(m["attempts"], m["last_error"]) for m in dead] == [(2, "error")]
+
+
+def test_worker_processes_and_retries_messages(db):
+    outbox = Outbox(db, base_backoff=0)
+    handled = []
+
+    async def handler(payload: dict) -> None:
+        handled.append(payload["post_id"])
+        if handled.count(payload["post_id"]) == 1 and payload["post_id"] == 2:
+            raise RuntimeError("temporary error")
+
+    async def run():
+        worker = OutboxWorker(outbox, "publish.twitter", handler, concurrency=2, poll_interval=0.01)
+        task = asyncio.create_task(worker.run())
+        for post_id in (1, 2, 3):
+            await outbox.enqueue("publish.twitter", {"post_id": post_id})
+        worker.notify()
+        while worker.processed < 3:
+            await asyncio.sleep(0.01)
+        await worker.stop()
+        await task
+        return worker
+
+    worker = asyncio.run(run())
+    assert sorted(handled) == [1, 2, 2, 3]
+    assert (worker.processed, worker.failed) == (3, 1)
+    assert db.get_outbox_messages("publish.twitter") == []
@@ -0,0 +1,100 @@
+"""Планы запросов DatabaseService: ни один горячий запрос не должен
+выполняться полным сканированием таблицы (SCAN).
+
+Тест вызывает методы DatabaseService на временной БД, перехватывает
+выполненные SQL-запросы и проверяет их через EXPLAIN QUERY PLAN.
+"""
+from app.services.db_service import DatabaseService
+
+# Запросы, которым полный проход по таблице нужен по смыслу
+ALLOWED_SCANS = (
+    "SELECT channel_id FROM telegram_channels",  # get_channel_ids: загрузка всего списка
+    "DELETE FROM transform_cache WHERE cache_key IN",  # фоновое вытеснение по индексу last_used_at
+)
+
+
+def exercise(db: DatabaseService) -> None:
+    """Вызов всех методов, участвующих в обработке запросов API и бота"""
+    db.save_token("token", 1)
+    db.get_token_data("token")
+    db.delete_token("token")
+    db.cleanup_expired_tokens()
+    db.save_telegram_binding(42, 1)
+    db.get_admin_id_by_telegram(42)
+    db.get_telegram_user_by_admin(1)
+    db.save_channel_binding(1, -100, "channel")
+    db.get_channel_by_id(-100)
+    db.is_channel_linked(-100)
+    db.has_linked_channel(42)
+    db.get_user_channels(42)
+    db.has_channel_by_admin_id(1)
+    db.get_admin_state(1)
+    db.save_post(-100, 1, "post")
+    db.save_post(-100, 1, "edited post")
+    posts = db.claim_pending_posts(10)
+    db.complete_post(posts[0]["post_id"], {"twitter": "post"}, posts[0]["revision"])
+    db.fail_post(posts[0]["post_id"], "error", posts[0]["revision"], retry_at=0)
+    db.get_post_transforms(posts[0]["post_id"])
+    db.find_similar_posts(posts[0]["post_id"], posts[0]["simhash"], 0)
+    db.release_stale_posts(600)
+    db.save_channel_settings(-100, True, 3600)
+    db.get_channel_settings_changes(0)
+    db.queue_post_for_publishing(-100)
+    db.enqueue_outbox([("publish.twitter", {"post_id": 1})])
+    messages = db.claim_outbox("publish.twitter", 10, 60, "lease", max_attempts=5)
+    db.nack_outbox(messages[0]["id"], "lease", "error", retry_at=0)
+    messages = db.claim_outbox("publish.twitter", 10, 60, "lease")
+    db.nack_outbox(messages[0]["id"], "lease", "error")
+    db.get_outbox_messages("publish.twitter", "dead")
+    db.requeue_dead_outbox("publish.twitter")
+    messages = db.claim_outbox("publish.twitter", 10, 60, "lease")
+    db.ack_outbox(messages[0]["id"], "lease")
+    db.delete_outbox_message(1)
+    db.save_cached_transform("key", "content")
+    db.get_cached_transform("key", 0)
+    db.evict_cached_transforms(100, 0)
+    db.get_channel_ids()
+    db.channels_revision
+    db.create_user("user", "setup", 0)
+    db.create_user("other", "other-setup", 0)
+    db.get_user("id", "user")
+    db.get_user("setup_token", "setup")
+    db.get_user("telegram_id", 42)
+    db.link_user_telegram("other-setup", 42)
+    db.link_user_telegram("setup", 42)
+    db.save_user_channel("user", -100, "channel")
+    db.get_user_channel_ids("user")
+    db.save_channel_verification(-100, 42, "CODE")
+    db.get_channel_verification(-100)
+    db.publish_cache_invalidations("users", ["id:user"])
+    db.get_cache_invalidations("users", 0)
+    db.get_last_cache_invalidation_id()
+    db.prune_cache_invalidations(0)
+    db.remove_channel_binding(1)
+    db.remove_telegram_binding(1)
+    db.remove_all_telegram_bindings(1)
+
+
+def table_scans(conn, sql: str) -> list:
+    """Шаги плана запроса, читающие таблицу целиком"""
+    plan = [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    # Проход по строке-константе или по подзапросу (SELECT ? AS ...) не
+    # читает таблиц
+    subqueries = {step.split(" ", 1)[1] for step in plan if step.startswith("CO-ROUTINE")}
+    return [step for step in plan if step.startswith("SCAN")
+            and step != "SCAN CONSTANT ROW" and step[len("SCAN "):] not in subqueries]
+
+
+def test_hot_queries_use_indexes(db):
+    statements = []
+    with db.get_db() as conn:
+        conn.set_trace_callback(statements.append)
+    exercise(db)
+    with db.get_db() as conn:
+        conn.set_trace_callback(None)
+        queries = {" ".join(sql.split()) for sql in statements}
+        queries = sorted(sql for sql in queries if sql.upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")))
+        scans = {sql: table_scans(conn, sql) for sql in queries if not sql.startswith(ALLOWED_SCANS)}
+
+    assert len(queries) > 50, "trace callback did not capture the exercised queries"
+    assert {sql: steps for sql, steps in scans.items() if steps} == {}
@@ -0,0 +1,106 @@
+import asyncio
+
+from app.services import db_service
+from app.services.scheduler import AutoPostScheduler
+
+
+async def publish(channel_id: int) -> None:
+    pass
+
+
+def test_refresh_picks_up_changes_committed_out_of_time_order(db, monkeypatch):
+    scheduler = AutoPostScheduler(db, publish, clock=lambda: 1000.0)
+
+    monkeypatch.setattr(db_service.time, "time", lambda: 200.0)
+    db.save_channel_settings(-100, True, 3600)
+    assert asyncio.run(scheduler.refresh()) == 1
+
+    # Транзакция, начатая раньше, коммитится позже: ее время меньше уже прочитанного
+    monkeypatch.setattr(db_service.time, "time", lambda: 100.0)
+    db.save_channel_settings(-200, True, 3600)
+    assert asyncio.run(scheduler.refresh()) == 1
+    assert len(scheduler) == 2
+
+    assert asyncio.run(scheduler.refresh()) == 0
+
+
+def test_disabled_channels_are_unscheduled(db):
+    scheduler = AutoPostScheduler(db, publish, clock=lambda: 1000.0)
+    db.save_channel_settings(-100, True, 3600)
+    asyncio.run(scheduler.refresh())
+    db.save_channel_settings(-100, False, 3600)
+    asyncio.run(scheduler.refresh())
+    assert len(scheduler) == 0
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def settings(channel_id: int, interval: int, auto_posting: bool = True) -> dict:
+    return {"channel_id": channel_id, "auto_posting": auto_posting, "post_interval": interval}
+
+
+def test_pop_due_follows_deadlines(db):
+    clock = FakeClock()
+    scheduler = AutoPostScheduler(db, publish, clock=clock)
+    # Первая публикация сдвинута на channel_id % interval: 10, 30 и 5
+    scheduler.apply_settings([settings(10, 100), settings(30, 100), settings(5, 60)])
+    assert scheduler.next_deadline() == 5
+
+    clock.now = 4
+    assert scheduler.pop_due() == []
+    clock.now = 10
+    assert scheduler.pop_due() == [5, 10]
+    assert scheduler.next_deadline() == 30
+    clock.now = 65
+    assert scheduler.pop_due() == [30, 5]
+    assert scheduler.next_deadline() == 110
+    clock.now = 125
+    assert scheduler.pop_due() == [10, 5]
+    assert scheduler.next_deadline() == 130
+
+
+def test_pop_due_does_not_catch_up_after_downtime(db):
+    clock = FakeClock()
+    scheduler = AutoPostScheduler(db, publish, clock=clock)
+    scheduler.apply_settings([settings(10, 100)])
+    clock.now = 1000
+    assert scheduler.pop_due() == [10]
+    assert scheduler.pop_due() == []
+    assert scheduler.next_deadline() == 1100
+
+
+def test_interval_change_reschedules_and_skips_stale_entries(db):
+    clock = FakeClock()
+    scheduler = AutoPostScheduler(db, publish, clock=clock)
+    db.save_channel_settings(-100, True, 3600)
+    asyncio.run(scheduler.refresh())
+    assert scheduler.next_deadline() == -100 % 3600
+
+    clock.now = 100
+    db.save_channel_settings(-100, True, 600)
+    assert asyncio.run(scheduler.refresh()) == 1
+    assert scheduler.next_deadline() == 700
+
+    fired = []
+    for now in (700, 1300, 3500, 4100):
+        clock.now = now
+        fired.append(scheduler.pop_due())
+    # Запись кучи со старым сроком 3500 устарела и не дает лишней публикации
+    assert fired == [[-100], [-100], [-100], [-100]]
+    assert scheduler.next_deadline() == 4700
+
+
+def test_disabled_channel_entries_are_skipped(db):
+    clock = FakeClock()
+    scheduler = AutoPostScheduler(db, publish, clock=clock)
+    scheduler.apply_settings([settings(10, 100), settings(20, 100)])
+    scheduler.apply_settings([settings(10, 100, auto_posting=False)])
+    assert scheduler.next_deadline() == 20
+    clock.now = 500
+    assert scheduler.pop_due() == [20]
@@ -0,0 +1,282 @@
+"""Контракт Storage: одинаковое поведение SQLite и PostgreSQL.
+
+Один набор проверок (токены, привязки, каналы, состояние админа, посты,
+кэш трансформаций) прогоняется на AsyncDatabaseService с временным
+файлом SQLite и на PostgresStorage. Для PostgreSQL поднимается временный
+кластер через initdb/pg_ctl (из PG_BIN или PATH) на свободном порту, так
+что внешний сервер не нужен; проверки пропускаются, только если этих
+программ нет. DATABASE_URL с postgresql:// использует уже запущенный
+сервер. Каждая проверка создает отдельную схему и удаляет ее после себя,
+данные приложения в этой БД не затрагиваются.
+
+initdb не запускается от root: тогда кластер работает от пользователя
+PG_TEST_USER (по умолчанию postgres).
+"""
+import asyncio
+import os
+import pwd
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import uuid
+from typing import Awaitable, Callable, Iterator, List
+
+import pytest
+
+from app.services.async_db_service import AsyncDatabaseService
+from app.services.db_service import DatabaseService
+from app.services.storage import Storage, create_storage
+
+ADMIN_ID = 1
+OTHER_ADMIN_ID = 2
+USER_ID = 100
+CHANNEL_ID = -1001234567890
+
+
+async def check_tokens(storage: Storage) -> None:
+    await storage.save_token("token-a", ADMIN_ID)
+    data = await storage.get_token_data("token-a")
+    assert data is not None and data[1] == ADMIN_ID, f"get_token_data returned {data}"
+    assert abs(data[0] - time.time()) < 60, f"token timestamp is not current: {data[0]}"
+    assert await storage.get_token_data("missing") is None, "missing token has data"
+
+    consumed = await storage.consume_token("token-a")
+    assert consumed == data, f"consume_token returned {consumed}, expected {data}"
+    assert await storage.consume_token("token-a") is None, "token consumed twice"
+
+    await storage.save_token("token-b", ADMIN_ID)
+    await storage.delete_token("token-b")
+    assert await storage.get_token_data("token-b") is None, "deleted token still exists"
+
+    await storage.save_token("token-c", ADMIN_ID)
+    await storage.cleanup_expired_tokens(3600)
+    assert await storage.get_token_data("token-c") is not None, "fresh token was cleaned up"
+    await storage.cleanup_expired_tokens(-60)
+    assert await storage.get_token_data("token-c") is None, "expired token was not cleaned up"
+
+    with pytest.raises(ValueError):
+        await storage.save_token("token-d", 0)
+
+
+async def check_bindings(storage: Storage) -> None:
+    assert await storage.get_admin_id_by_telegram(USER_ID) is None, "unbound user has admin_id"
+    assert await storage.get_telegram_user_by_admin(ADMIN_ID) is None, "admin without binding has user"
+
+    await storage.save_telegram_binding(USER_ID, ADMIN_ID)
+    assert await storage.get_admin_id_by_telegram(USER_ID) == ADMIN_ID, "binding not saved"
+    assert await storage.get_telegram_user_by_admin(ADMIN_ID) == USER_ID, "binding not found by admin"
+
+    # Повторная привязка того же аккаунта заменяет админа
+    await storage.save_telegram_binding(USER_ID, OTHER_ADMIN_ID)
+    assert await storage.get_admin_id_by_telegram(USER_ID) == OTHER_ADMIN_ID, "rebinding did not replace admin"
+    assert await storage.get_telegram_user_by_admin(ADMIN_ID) is None, "old admin still bound"
+
+    await storage.remove_telegram_binding(OTHER_ADMIN_ID)
+    assert await storage.get_admin_id_by_telegram(USER_ID) is None, "binding not removed"
+
+
+async def check_channels(storage: Storage) -> None:
+    assert not await storage.is_channel_linked(CHANNEL_ID), "unknown channel is linked"
+    assert await storage.get_channel_by_id(CHANNEL_ID) is None, "unknown channel found"
+    assert await storage.get_channel_ids() == [], "channel list is not empty"
+
+    await storage.save_telegram_binding(USER_ID, ADMIN_ID)
+    assert not await storage.has_linked_channel(USER_ID), "user without channel has one"
+    assert await storage.get_user_channels(USER_ID) == [], "user without channel has channels"
+
+    await storage.save_channel_binding(ADMIN_ID, CHANNEL_ID, "Channel")
+    channel = await storage.get_channel_by_id(CHANNEL_ID)
+    assert channel is not None, "linked channel not found"
+    assert set(channel) == {"channel_id", "admin_id", "channel_title", "created_at"}, f"wrong channel keys: {channel}"
+    assert ((channel["channel_id"], channel["admin_id"], channel["channel_title"])
+            == (CHANNEL_ID, ADMIN_ID, "Channel")), f"wrong channel: {channel}"
+    assert await storage.is_channel_linked(CHANNEL_ID), "channel is not linked"
+    assert await storage.has_linked_channel(USER_ID), "user has no linked channel"
+    assert await storage.has_channel_by_admin_id(ADMIN_ID), "admin has no channel"
+    assert not await storage.has_channel_by_admin_id(OTHER_ADMIN_ID), "other admin has a channel"
+    assert await storage.get_channel_ids() == [CHANNEL_ID], "channel list is wrong"
+
+    # Повторная привязка обновляет название, а не дублирует канал
+    await storage.save_channel_binding(ADMIN_ID, CHANNEL_ID, "Renamed")
+    channels = await storage.get_user_channels(USER_ID)
+    assert (len(channels) == 1 and channels[0]["channel_title"] == "Renamed"
+            and set(channels[0]) == {"channel_id", "channel_title", "created_at"}), \
+        f"get_user_channels returned {channels}"
+
+    await storage.remove_channel_binding(ADMIN_ID)
+    assert not await storage.is_channel_linked(CHANNEL_ID), "channel not removed"
+    assert await storage.get_admin_id_by_telegram(USER_ID) == ADMIN_ID, "account removed with channel"
+
+    await storage.save_channel_binding(ADMIN_ID, CHANNEL_ID, "Channel")
+    await storage.remove_all_telegram_bindings(ADMIN_ID)
+    assert not await storage.is_channel_linked(CHANNEL_ID), "channel not removed by remove_all"
+    assert await storage.get_admin_id_by_telegram(USER_ID) is None, "account not removed by remove_all"
+
+
+async def check_admin_state(storage: Storage) -> None:
+    empty = {"telegram_user_id": None, "channel_id": None, "channel_title": None}
+    state = await storage.get_admin_state(ADMIN_ID)
+    assert state == empty, f"empty admin state is {state}"
+
+    await storage.save_telegram_binding(USER_ID, ADMIN_ID)
+    state = await storage.get_admin_state(ADMIN_ID)
+    assert state == {**empty, "telegram_user_id": USER_ID}, f"state with binding is {state}"
+
+    await storage.save_channel_binding(ADMIN_ID, CHANNEL_ID, "Channel")
+    state = await storage.get_admin_state(ADMIN_ID)
+    assert state == {"telegram_user_id": USER_ID, "channel_id": CHANNEL_ID, "channel_title": "Channel"}, \
+        f"full admin state is {state}"
+    await storage.remove_all_telegram_bindings(ADMIN_ID)
+
+
+async def check_posts(storage: Storage) -> None:
+    # Повтор и правка одного сообщения не должны падать на уникальном ключе
+    await storage.save_post(CHANNEL_ID, 1, "post")
+    await storage.save_post(CHANNEL_ID, 1, "post")
+    await storage.save_post(CHANNEL_ID, 1, "edited post")
+    await storage.save_post(CHANNEL_ID, 2, "another post")
+
+
+async def check_transform_cache(storage: Storage) -> None:
+    now = time.time()
+    assert await storage.get_cached_transform("missing", 0) is None, "missing cache entry found"
+
+    await storage.save_cached_transform("key-1", "first")
+    assert await storage.get_cached_transform("key-1", now - 60) == "first", "cache entry not found"
+    assert await storage.get_cached_transform("key-1", now + 60) is None, "stale cache entry returned"
+    await storage.save_cached_transform("key-1", "replaced")
+    assert await storage.get_cached_transform("key-1", now - 60) == "replaced", "cache entry not replaced"
+
+    await storage.save_cached_transform("key-2", "second")
+    await storage.save_cached_transform("key-3", "third")
+    await asyncio.sleep(0.01)
+    # key-1 использован последним и должен пережить вытеснение
+    await storage.get_cached_transform("key-1", 0)
+    evicted = await storage.evict_cached_transforms(1, 0)
+    assert evicted == 2, f"evict_cached_transforms removed {evicted} entries, expected 2"
+    assert await storage.get_cached_transform("key-1", 0) == "replaced", "recently used entry evicted"
+    assert await storage.get_cached_transform("key-2", 0) is None, "excess entry kept"
+
+    evicted = await storage.evict_cached_transforms(10, time.time() + 60)
+    assert evicted == 1, f"expired entries evicted: {evicted}, expected 1"
+
+
+CHECKS: List[Callable[[Storage], Awaitable[None]]] = [
+    check_tokens,
+    check_bindings,
+    check_channels,
+    check_admin_state,
+    check_posts,
+    check_transform_cache,
+]
+
+
+def with_search_path(url: str, schema: str) -> str:
+    # asyncpg передает неизвестные параметры URL как настройки сервера
+    return f"{url}{'&' if '?' in url else '?'}search_path={schema}"
+
+
+async def execute_postgres(url: str, sql: str) -> None:
+    import asyncpg
+    conn = await asyncpg.connect(url)
+    try:
+        await conn.execute(sql)
+    finally:
+        await conn.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def postgres_url() -> Iterator[str]:
+    """URL сервера PostgreSQL: DATABASE_URL или временный кластер"""
+    pytest.importorskip("asyncpg")
+    url = os.getenv("DATABASE_URL", "")
+    if url.startswith(("postgres://", "postgresql://")):
+        yield url
+        return
+
+    pg_bin = os.getenv("PG_BIN")
+    initdb = os.path.join(pg_bin, "initdb") if pg_bin else shutil.which("initdb")
+    pg_ctl = os.path.join(pg_bin, "pg_ctl") if pg_bin else shutil.which("pg_ctl")
+    if not (initdb and pg_ctl and os.path.exists(initdb) and os.path.exists(pg_ctl)):
+        pytest.skip("initdb/pg_ctl not found (add PostgreSQL binaries to PATH or set PG_BIN)")
+
+    run_as = []
+    # Каталог во /tmp, а не tmp_path: он должен быть доступен пользователю кластера
+    tmp = tempfile.mkdtemp(prefix="storage-contract-")
+    if os.geteuid() == 0:
+        user = os.getenv("PG_TEST_USER", "postgres")
+        try:
+            entry = pwd.getpwnam(user)
+        except KeyError:
+            shutil.rmtree(tmp)
+            pytest.skip(f"initdb cannot run as root and user {user} does not exist (set PG_TEST_USER)")
+        os.chown(tmp, entry.pw_uid, entry.pw_gid)
+        run_as = ["runuser", "-u", user, "--"]
+
+    data = os.path.join(tmp, "data")
+    port = free_port()
+    try:
+        subprocess.run(run_as + [initdb, "-D", data, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+                       check=True, capture_output=True)
+        subprocess.run(
+            run_as + [pg_ctl, "-D", data, "-l", os.path.join(tmp, "postgres.log"), "-w",
+                      "-o", f"-p {port} -k {tmp} -c listen_addresses=127.0.0.1", "start"],
+            check=True, capture_output=True,
+        )
+        try:
+            yield f"postgresql://postgres@127.0.0.1:{port}/postgres"
+        finally:
+            subprocess.run(run_as + [pg_ctl, "-D", data, "-m", "fast", "-w", "stop"], capture_output=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def make_storage(request, tmp_path) -> Callable[[], Awaitable[Storage]]:
+    """Фабрика запущенного хранилища над пустой БД"""
+    if request.param == "sqlite":
+        async def make() -> Storage:
+            storage = AsyncDatabaseService(DatabaseService(str(tmp_path / "contract.db")))
+            await storage.start()
+            return storage
+        return make
+
+    url = request.getfixturevalue("postgres_url")
+    from app.services.postgres_storage import PostgresStorage
+
+    schema = f"storage_contract_{uuid.uuid4().hex[:12]}"
+    asyncio.run(execute_postgres(url, f"CREATE SCHEMA {schema}"))
+    request.addfinalizer(lambda: asyncio.run(execute_postgres(url, f"DROP SCHEMA {schema} CASCADE")))
+
+    async def make() -> Storage:
+        storage = PostgresStorage(with_search_path(url, schema), min_size=1, max_size=4)
+        await storage.start()
+        return storage
+    return make
+
+
+@pytest.mark.parametrize("check", CHECKS, ids=lambda check: check.__name__[len("check_"):])
+def test_storage_contract(make_storage, check):
+    async def run() -> None:
+        storage = await make_storage()
+        try:
+            await check(storage)
+        finally:
+            await storage.close()
+
+    asyncio.run(run())
+
+
+def test_create_storage_rejects_postgres(monkeypatch):
+    # Бот работает только с SQLite: API не должен писать привязки в другую БД
+    monkeypatch.setenv("DATABASE_URL", "postgresql://postgres@127.0.0.1/postgres")
+    with pytest.raises(ValueError):
+        create_storage()
@@ -0,0 +1,28 @@
+import asyncio
+
+from app.services.metrics import REGISTRY
+from app.services.telegram_sender import TelegramSender
+
+
+def sample(name: str) -> float:
+    for line in REGISTRY.render().splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    return 0.0
+
+
+def test_queue_latency_is_exported():
+    sent = []
+
+    async def send_message(**kwargs):
+        sent.append(kwargs["text"])
+
+    async def run():
+        sender = TelegramSender(send_message, global_rate=1000, chat_rate=1000)
+        await asyncio.gather(*(sender.send(1, f"message {i}") for i in range(3)))
+        await sender.close()
+
+    before = sample("telegram_send_queue_seconds_count")
+    asyncio.run(run())
+    assert sent == ["message 0", "message 1", "message 2"]
+    assert sample("telegram_send_queue_seconds_count") == before + 3
@@ -0,0 +1,104 @@
+import asyncio
+import socket
+
+import httpx
+
+from app.services.db_service import DatabaseService
+from app.services.outbox import Outbox
+from app.services.telegram_webhook import UPDATES_TOPIC, TelegramWebhook, UpdateConsumer, webhook_secret
+
+TOKEN = "123456:TEST"
+UPDATE = {
+    "update_id": 1,
+    "channel_post": {"message_id": 1, "date": 0, "chat": {"id": -100, "type": "channel"}, "text": "post"},
+}
+
+
+def test_webhook_only_queues_updates_for_the_bot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", TOKEN)
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_URL", "https://example.invalid/api/telegram/webhook")
+    monkeypatch.delenv("TELEGRAM_WEBHOOK_SECRET", raising=False)
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_NOTIFY_ADDRESS", "")
+    from app import main as api
+
+    async def run():
+        async with api.app.router.lifespan_context(api.app):
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+                statuses = []
+                for secret in ("wrong", webhook_secret(TOKEN)):
+                    response = await client.post("/api/telegram/webhook", json=UPDATE,
+                                                 headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+                    statuses.append(response.status_code)
+        return statuses
+
+    assert asyncio.run(run()) == [403, 200]
+    # Ни обработчики, ни фоновые воркеры бота в API не запускались
+    db = DatabaseService("db/app.db")
+    try:
+        assert [message["payload"] for message in db.get_outbox_messages(UPDATES_TOPIC)] == [UPDATE]
+        with db.get_db() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0] == 0
+    finally:
+        db.close()
+
+
+def make_update(update_id: int) -> dict:
+    return dict(UPDATE, update_id=update_id)
+
+
+def test_consumer_feeds_updates_in_order_without_retries(db):
+    fed = []
+
+    async def feed(payload: dict) -> None:
+        if payload["update_id"] == 3:
+            raise ValueError("bad update")
+        fed.append(payload["update_id"])
+
+    async def run():
+        outbox = Outbox(db)
+        for update_id in range(1, 6):
+            await outbox.enqueue(UPDATES_TOPIC, make_update(update_id))
+        # Прежний процесс бота захватил первые обновления и упал
+        await outbox.claim_batch(UPDATES_TOPIC, limit=2)
+
+        consumer = UpdateConsumer(db, feed, notify_address=None, batch_size=2, poll_interval=0.01)
+        task = asyncio.create_task(consumer.run())
+        while consumer.processed + consumer.failed < 5:
+            await asyncio.sleep(0.01)
+        await consumer.stop()
+        await task
+        return await outbox.pending(UPDATES_TOPIC), await outbox.dead_letters(UPDATES_TOPIC)
+
+    pending, dead = asyncio.run(run())
+    # Обновление с ошибкой не повторяется позже остальных, а сразу уходит в dead
+    assert fed == [1, 2, 4, 5]
+    assert pending == []
+    assert [message["payload"]["update_id"] for message in dead] == [3]
+
+
+def test_api_notification_wakes_consumer(db):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        address = f"127.0.0.1:{sock.getsockname()[1]}"
+    fed = asyncio.Queue()
+
+    async def run():
+        webhook = TelegramWebhook(TOKEN, db=db, notify_address=address)
+        # Опрос outbox не успел бы сработать: обновление забирается по уведомлению
+        consumer = UpdateConsumer(db, fed.put, notify_address=address, poll_interval=60)
+        task = asyncio.create_task(consumer.run())
+        # Первый опрос проходит сразу после старта, уведомление ждет следующий
+        while consumer._transport is None:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        await webhook.enqueue(UPDATE)
+        payload = await asyncio.wait_for(fed.get(), timeout=5)
+        await consumer.stop()
+        await task
+        await webhook.stop()
+        return payload
+
+    assert asyncio.run(run()) == UPDATE
@@ -21,6 +21,33 @@ const PlatformSetupModal = ({ platform, isOpen, onClose }) => {
     }
   }, [isOpen, platform]);
 
+  // Статус подключения приходит с сервера потоком (SSE) сразу после
+  // изменения, без периодических запросов check-connection/check-channel
+  useEffect(() => {
+    if (!isOpen || platform.id !== 'telegram') return;
+
+    const source = new EventSource(
+      `http://localhost:8000/api/telegram/status/stream?token=${encodeURIComponent(setupToken)}`
+    );
+    source.addEventListener('status', (event) => {
+      const status = JSON.parse(event.data);
+      console.log('Received connection status:', status);
+      setIsConnected(status.connected);
+      setStepStatuses(prev => ({
+        ...prev,
+        connection: status.connected ? 'success' : (prev.connection === 'success' ? 'pending' : prev.connection),
+        channelId: status.hasChannel ? 'success' : (prev.channelId === 'success' ? 'pending' : prev.channelId),
+        permissions: status.hasChannel ? prev.permissions : 'pending'
+      }));
+    });
+    source.onerror = (error) => {
+      // EventSource переподключается сам
+      console.error('Connection status stream error:', error);
+    };
+
+    return () => source.close();
+  }, [isOpen, platform, setupToken]);
+
   const checkAllSteps = async () => {
     try {
       // Проверяем подключение аккаунта
@@ -166,10 +193,6 @@ const PlatformSetupModal = ({ platform, isOpen, onClose }) => {
                   target="_blank" 
                   rel="noopener noreferrer" 
                   className="primary-button"
-                  onClick={() => handleCheck({
-                    id: 'connection',
-                    checkStatus: checkTelegramConnection
-                  })}
                 >
                   Connect Telegram
                 </a>